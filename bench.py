@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+XeloraCloud benchmarks
+
+Runs bot.py internals against a throwaway database, a fake `lxc` binary
+and a fake LXD REST socket (both with configurable latency) and a stubbed
+Discord gateway, so performance can be tracked without a real host.
+
+Usage:
+    python bench.py                                   # everything
+    python bench.py deploy monitor --containers 100 1000
+    python bench.py records --rows 10000 100000
+    python bench.py --lxc-latency 50 --api-latency 5  # milliseconds
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import stat
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+WORKDIR = tempfile.mkdtemp(prefix='xeloracloud-bench-')
+
+# Fake lxc: sleeps FAKE_LXC_LATENCY seconds; `lxc list` prints FAKE_LXC_STATE
+FAKE_LXC = """#!/bin/sh
+sleep "${FAKE_LXC_LATENCY:-0}"
+if [ "$1" = list ]; then
+    cat "$FAKE_LXC_STATE" 2>/dev/null || echo '[]'
+fi
+"""
+
+def prepare_environment():
+    """Point bot.py at a temp database, fake lxc and fake LXD socket so it can be imported"""
+    bin_dir = os.path.join(WORKDIR, 'bin')
+    os.makedirs(bin_dir)
+    fake_lxc = os.path.join(bin_dir, 'lxc')
+    with open(fake_lxc, 'w') as f:
+        f.write(FAKE_LXC)
+    os.chmod(fake_lxc, os.stat(fake_lxc).st_mode | stat.S_IEXEC)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    os.environ['FAKE_LXC_STATE'] = os.path.join(WORKDIR, 'lxc-state.json')
+    os.environ['DB_PATH'] = os.path.join(WORKDIR, 'bench.db')
+    os.environ['LXD_SOCKET'] = os.path.join(WORKDIR, 'lxd.socket')
+    os.environ['LOG_CHANNEL_ID'] = '0'
+    os.environ.setdefault('WARM_POOL_IMAGES', 'ubuntu:24.04')
+    os.chdir(WORKDIR)  # bot.py writes xeloracloud.log to the working directory
+
+prepare_environment()
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bot  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+bot.load_state()
+
+logging.getLogger('XeloraCloud').setLevel(logging.ERROR)
+logging.getLogger('discord').setLevel(logging.ERROR)
+
+def report(name: str, **metrics):
+    print(f"{name:<32}" + "  ".join(f"{key}={value}" for key, value in metrics.items()), flush=True)
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
+
+def latency_summary(samples: list) -> dict:
+    samples = sorted(samples)
+    return {'p50': ms(statistics.median(samples)), 'p95': ms(samples[int(len(samples) * 0.95) - 1 or 0]),
+            'max': ms(samples[-1])}
+
+# ==================== FIXTURES ====================
+def seed_vps_rows(count: int):
+    """Replace the vps table with `count` realistic rows"""
+    def write(conn: sqlite3.Connection):
+        conn.execute('DELETE FROM vps')
+        conn.executemany(
+            f'INSERT INTO vps ({", ".join(bot.VPS_COLUMNS)}) VALUES ({", ".join("?" * len(bot.VPS_COLUMNS))})',
+            [(str(1000 + i % (count // 3 + 1)), f"xc-bench-{i}", '4GB', '2', '40GB', 'Unlimited',
+              '4GB RAM / 2 CPU / 40GB Disk', 'ubuntu:24.04', 'running' if i % 4 else 'stopped', 0, i % 50 == 0,
+              '2025-01-01T00:00:00', '2025-06-01T00:00:00', i * 60,
+              json.dumps([str(2000 + i)] if i % 10 == 0 else []),
+              json.dumps([{'reason': 'cpu', 'time': '2025-05-01T00:00:00'}] * (i % 3)),
+              json.dumps(['web'] if i % 5 == 0 else []), '', bot.LOCAL_NODE)
+             for i in range(count)])
+    bot.db.submit(write, label='bench_seed').result()
+
+class FakeLXD:
+    """Minimal LXD REST API on a unix socket: instances, state, exec, files, profiles, images, resources"""
+
+    def __init__(self, socket_path: str, latency: float = 0.0, ram_gb: int = 256, cpu: int = 64,
+                 storage_gb: int = 4096):
+        self.socket_path = socket_path
+        self.latency = latency
+        self.totals = {'ram': ram_gb * 1024 ** 3, 'cpu': cpu, 'storage': storage_gb * 1024 ** 3}
+        self.instances = {}
+        self.requests = 0
+        self.operation_error = None  # when set, operations finish with this error (400)
+        self._runner = None
+
+    def seed(self, names, status='Running'):
+        for name in names:
+            self.instances[name] = {'status': status, 'config': {}, 'cpu': 0}
+
+    def _instance(self, name: str, state: bool) -> dict:
+        instance = self.instances[name]
+        body = {'name': name, 'status': instance['status'], 'config': instance['config'],
+                'expanded_config': instance['config']}
+        if state:
+            body['state'] = self._state(name)
+        return body
+
+    def _state(self, name: str) -> dict:
+        instance = self.instances[name]
+        instance['cpu'] += 1_500_000_000
+        return {
+            'status': instance['status'],
+            'cpu': {'usage': instance['cpu']},
+            'memory': {'usage': 512 * 1024 ** 2, 'total': 4 * 1024 ** 3},
+            'disk': {'root': {'usage': 8 * 1024 ** 3, 'total': 40 * 1024 ** 3}},
+            'network': {'eth0': {'counters': {'bytes_received': 10 ** 6, 'bytes_sent': 10 ** 5}}},
+        }
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            return await handler(request)
+        except KeyError:
+            return web.json_response({'type': 'error', 'error': 'Instance not found', 'error_code': 404},
+                                     status=404)
+
+    @staticmethod
+    def _sync(metadata=None):
+        return web.json_response({'type': 'sync', 'metadata': metadata if metadata is not None else {}})
+
+    @staticmethod
+    def _async():
+        return web.json_response({'type': 'async', 'metadata': {'id': 'op'}})
+
+    async def list_instances(self, request):
+        recursion = request.query.get('recursion', '0')
+        if recursion == '0':
+            return self._sync([f"/1.0/instances/{name}" for name in self.instances])
+        return self._sync([self._instance(name, recursion == '2') for name in self.instances])
+
+    async def create_instance(self, request):
+        body = await request.json()
+        self.instances[body['name']] = {'status': 'Stopped', 'config': dict(body.get('config') or {}), 'cpu': 0}
+        return self._async()
+
+    async def instance(self, request):
+        name = request.match_info['name']
+        if request.method == 'GET':
+            return self._sync(self._instance(name, False))
+        if request.method == 'DELETE':
+            del self.instances[name]
+            return self._async()
+        body = await request.json()
+        if request.method == 'POST':  # rename
+            self.instances[body['name']] = self.instances.pop(name)
+            return self._async()
+        self.instances[name]['config'].update(body.get('config') or {})  # PATCH
+        return self._sync()
+
+    async def instance_state(self, request):
+        name = request.match_info['name']
+        if request.method == 'GET':
+            return self._sync(self._state(name))
+        body = await request.json()
+        self.instances[name]['status'] = 'Running' if body['action'] in ('start', 'restart') else 'Stopped'
+        return self._async()
+
+    async def instance_exec(self, request):
+        self.instances[request.match_info['name']]
+        return self._async()
+
+    async def wait_operation(self, request):
+        if self.operation_error:
+            return self._sync({'status_code': 400, 'status': 'Failure', 'err': self.operation_error})
+        return self._sync({'status_code': 200, 'metadata': {'return': 0, 'output': {}}})
+
+    async def ok(self, request):
+        return self._sync()
+
+    async def resources(self, request):
+        return self._sync({'memory': {'total': self.totals['ram'], 'used': 0}, 'cpu': {'total': self.totals['cpu']}})
+
+    async def pool_resources(self, request):
+        return self._sync({'space': {'total': self.totals['storage'], 'used': 0}})
+
+    async def start(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get('/1.0/instances', self.list_instances)
+        app.router.add_post('/1.0/instances', self.create_instance)
+        app.router.add_route('*', '/1.0/instances/{name}', self.instance)
+        app.router.add_route('*', '/1.0/instances/{name}/state', self.instance_state)
+        app.router.add_post('/1.0/instances/{name}/exec', self.instance_exec)
+        app.router.add_post('/1.0/instances/{name}/files', self.ok)
+        app.router.add_get('/1.0/operations/{id}/wait', self.wait_operation)
+        app.router.add_route('*', '/1.0/profiles/{name}', self.ok)
+        app.router.add_route('*', '/1.0/images', self.ok)
+        app.router.add_route('*', '/1.0/images/aliases', self.ok)
+        app.router.add_get('/1.0/resources', self.resources)
+        app.router.add_get('/1.0/storage-pools/{pool}/resources', self.pool_resources)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.UnixSite(self._runner, self.socket_path).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+class FakeMessage(SimpleNamespace):
+    async def edit(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class FakeContext:
+    """Stands in for commands.Context: records what a command sends"""
+
+    def __init__(self, user_id: int):
+        self.author = SimpleNamespace(id=user_id, mention=f"<@{user_id}>", name='bench')
+        self.channel = SimpleNamespace(id=1)
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(id=len(self.sent) + 1, channel=self.channel, content=content, **kwargs)
+        self.sent.append(message)
+        return message
+
+def stub_discord():
+    """Pretend the gateway is connected without opening a websocket"""
+    bot.bot.ws = SimpleNamespace(latency=0.042)
+
+def seed_fleet(count: int, fake_lxd: FakeLXD):
+    """Seed SQLite, the in-memory registry, fake LXD and fake lxc with `count` containers"""
+    seed_vps_rows(count)
+    bot.vps_registry = bot.VPSRegistry()
+    bot.vps_registry.load(bot.get_vps_data())
+    bot.vps_data = bot.vps_registry.owners
+    bot.dirty_vps.clear()
+    bot._last_cpu_usage.clear()
+    names = [vps['container_name'] for vps in bot.vps_registry]
+    fake_lxd.instances.clear()
+    fake_lxd.seed(names)
+    with open(os.environ['FAKE_LXC_STATE'], 'w') as f:
+        json.dump([fake_lxd._instance(name, True) for name in names], f)
+    bot.fleet_snapshot.invalidate()
+
+
+def load_as_dicts():
+    """The pre-VPSRecord loader: a dict per row with every JSON column decoded"""
+    data = {}
+    for row in bot.db.read('SELECT * FROM vps'):
+        vps = dict(row)
+        vps['shared_with'] = json.loads(vps['shared_with'])
+        vps['suspension_history'] = json.loads(vps['suspension_history'])
+        vps['tags'] = json.loads(vps['tags'])
+        vps['suspended'] = bool(vps['suspended'])
+        vps['whitelisted'] = bool(vps['whitelisted'])
+        data.setdefault(vps['user_id'], []).append(vps)
+    return data
+
+def measure_load(loader):
+    """(seconds, resident bytes, peak bytes); timed without tracemalloc, which skews it"""
+    gc.collect()
+    started = time.perf_counter()
+    data = loader()
+    elapsed = time.perf_counter() - started
+    del data
+    gc.collect()
+    tracemalloc.start()
+    data = loader()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return elapsed, current, peak
+
+def bench_records(rows: int):
+    """Load time and resident size of the fleet: plain dicts vs slotted VPSRecords"""
+    seed_vps_rows(rows)
+    for name, loader in (('dict', load_as_dicts), ('VPSRecord', bot.get_vps_data)):
+        elapsed, current, peak = measure_load(loader)
+        report(f"records[{rows}] {name}", load=f"{elapsed * 1000:.0f}ms",
+               resident=f"{current / 1024 ** 2:.1f}MB", peak=f"{peak / 1024 ** 2:.1f}MB")
+
+async def bench_client(containers: int, fake_lxd: FakeLXD, calls: int = 200):
+    """LXDClient against the fake socket: sync reads, async operation waits, error mapping, then latency"""
+    client = bot.LXDClient(fake_lxd.socket_path, cli_fallback=False)
+    try:
+        name = next(iter(fake_lxd.instances))
+        assert (await client.get_instance(name))['name'] == name, "sync request"
+        await client.change_state(name, 'stop')
+        assert fake_lxd.instances[name]['status'] == 'Stopped', "async operation wait"
+        await client.change_state(name, 'start')
+        try:
+            await client.get_instance('bench-missing')
+            raise AssertionError("404 was not raised")
+        except bot.LXDError as e:
+            assert e.status_code == 404, f"error mapping: {e.status_code}"
+        fake_lxd.operation_error = 'disk full'
+        try:
+            await client.change_state(name, 'restart')
+            raise AssertionError("failed operation was not raised")
+        except bot.LXDError as e:
+            assert str(e) == 'disk full' and e.status_code == 400, f"operation error mapping: {e}"
+        finally:
+            fake_lxd.operation_error = None
+
+        samples = []
+        for i in range(calls):
+            started = time.perf_counter()
+            await client.get_instance_state(name)
+            samples.append(time.perf_counter() - started)
+        report(f"client[{containers}]", checks='ok', calls=calls, **latency_summary(samples))
+    finally:
+        await client.close()
+
+async def bench_deploy(containers: int, fake_lxd: FakeLXD, runs: int = 10):
+    """Deploy latency from a cold image and from the warm pool"""
+    cold = []
+    bot.warm_pool.size = 0
+    for i in range(runs):
+        started = time.perf_counter()
+        await bot.deploy_container(f"bench-cold-{containers}-{i}", 'ubuntu:24.04', 2, 1, 10)
+        cold.append(time.perf_counter() - started)
+    report(f"deploy[{containers}] cold", **latency_summary(cold))
+
+    bot.warm_pool.size = runs
+    bot.warm_pool.discovered = False
+    await bot.warm_pool.discover()
+    while await bot.warm_pool.refill_one():
+        pass
+    warm = []
+    for i in range(runs):
+        started = time.perf_counter()
+        result = await bot.deploy_container(f"bench-warm-{containers}-{i}", 'ubuntu:24.04', 2, 1, 10)
+        warm.append(time.perf_counter() - started)
+    report(f"deploy[{containers}] warm pool", source=result['source'], **latency_summary(warm))
+    bot.warm_pool.size = 0
+
+async def bench_execute_lxc(containers: int, fake_lxd: FakeLXD, calls: int = 200, concurrency: int = 20):
+    """Throughput of the subprocess path used whenever the REST API is unavailable"""
+    semaphore = asyncio.Semaphore(concurrency)
+    names = list(fake_lxd.instances)[:calls] or ['bench']
+
+    async def one(name):
+        async with semaphore:
+            await bot.execute_lxc(f"lxc info {name}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(names[i % len(names)]) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    report(f"execute_lxc[{containers}]", calls=calls, concurrency=concurrency,
+           throughput=f"{calls / elapsed:.0f}/s", per_call=ms(elapsed / calls))
+
+async def bench_monitor(containers: int, fake_lxd: FakeLXD, cycles: int = 3):
+    """Resource monitor cycle time (first cycle only primes CPU baselines)"""
+    durations = []
+    for _ in range(cycles):
+        await bot.resource_monitor_task.coro()
+        durations.append(bot.monitor_stats['last_duration'])
+    report(f"monitor[{containers}]", sampled=bot.monitor_stats['last_sampled'],
+           skipped=bot.monitor_stats['last_skipped'], first=ms(durations[0]),
+           steady=ms(statistics.median(durations[1:] or durations)))
+
+async def bench_save(containers: int, fake_lxd: FakeLXD):
+    """save_vps_data cost for a 10% dirty fleet and for a full rewrite"""
+    records = list(bot.vps_registry)
+    for vps in records[::10]:
+        vps['total_uptime'] = vps['total_uptime'] + 60
+    started = time.perf_counter()
+    written = await asyncio.wrap_future(bot.save_vps_data())
+    incremental = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await asyncio.wrap_future(bot.save_vps_data(full=True))
+    full = time.perf_counter() - started
+    report(f"save_vps_data[{containers}]", dirty_rows=written, incremental=ms(incremental), full=ms(full))
+
+async def bench_dashboard(containers: int, fake_lxd: FakeLXD, calls: int = 20):
+    """End-to-end latency of the dashboard command against the stubbed gateway"""
+    ctx = FakeContext(bot.MAIN_ADMIN_ID)
+    await bot.host_metrics.collect()
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await bot.dashboard.callback(ctx)
+        samples.append(time.perf_counter() - started)
+    report(f"dashboard[{containers}]", **latency_summary(samples))
+
+async def bench_suspend(containers: int, fake_lxd: FakeLXD, runs: int = 5):
+    """Auto-suspend evaluation over a full usage window (every 7th container runs hot)"""
+    suspender = bot.auto_suspender
+    now = int(time.time())
+    rows = [(vps['container_name'], now - age * bot.MONITOR_INTERVAL, 97.0 if i % 7 == 0 else 40.0 + age,
+             50.0, 30.0, 0, 0)
+            for i, vps in enumerate(bot.vps_registry) for age in range(suspender.samples)]
+    await asyncio.wrap_future(bot.save_usage_samples(rows))
+
+    loads, evaluations, found = [], [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        names, window = bot.load_usage_window(suspender.samples, now)
+        loaded = time.perf_counter()
+        bot.evaluate_breaches(window, suspender.thresholds(), suspender.breaches, suspender.alpha)
+        loads.append(loaded - started)
+        evaluations.append(time.perf_counter() - loaded)
+        found = await suspender.find(now)
+    report(f"suspend[{containers}]", rows=len(rows), flagged=len(found), load=ms(statistics.median(loads)),
+           evaluate=ms(statistics.median(evaluations)), numpy='yes' if bot.np is not None else 'no')
+    await asyncio.wrap_future(bot.db.execute('DELETE FROM usage_stats'))
+
+async def bench_placement(containers: int, fake_lxd: FakeLXD, deploys: int = 40):
+    """Best-fit placement and per-node routing with three extra fake LXD nodes of different sizes"""
+    extra = {f"bench-{ram}g": FakeLXD(os.path.join(WORKDIR, f"node-{ram}.sock"), fake_lxd.latency, ram_gb=ram,
+                                      cpu=16, storage_gb=1024)
+             for ram in (32, 64, 128)}
+    for name, node in extra.items():
+        await node.start()
+        await bot.nodes.add(name, f"unix://{node.socket_path}")
+    fakes = {bot.LOCAL_NODE: fake_lxd, **extra}
+    bot.warm_pool.size = 0
+
+    names, samples = [], []
+    for i in range(deploys):
+        name = f"bench-place-{containers}-{i}"
+        started = time.perf_counter()
+        result = await bot.deploy_container(name, 'ubuntu:24.04', 4, 2, 20)
+        samples.append(time.perf_counter() - started)
+        bot.add_vps('1', {'container_name': name, 'ram': '4GB', 'cpu': '2', 'storage': '20GB',
+                          'config': '4GB RAM / 2 CPU / 20GB Disk', 'status': 'running', 'node': result['node']})
+        names.append(name)
+    placed = {node: len([n for n in names if bot.vps_registry.get(n)['node'] == node]) for node in fakes}
+    misrouted = sum(1 for n in names if n not in fakes[bot.vps_registry.get(n)['node']].instances)
+    report(f"placement[{containers}]", **placed, misrouted=misrouted, **latency_summary(samples))
+
+    for name in names:
+        bot.remove_vps(name)
+    for name, node in extra.items():
+        await bot.nodes.remove(name)
+        await node.stop()
+
+async def bench_startup(containers: int, fake_lxd: FakeLXD, runs: int = 3):
+    """State load plus one reconcile pass with drift injected (every 10th stopped, orphans, missing)"""
+    loads = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        bot.VPSRegistry().load(bot.get_vps_data())
+        loads.append(time.perf_counter() - started)
+
+    names = [vps['container_name'] for vps in bot.vps_registry]
+    for name in names[::10]:
+        fake_lxd.instances[name]['status'] = 'Stopped'
+    removed = {name: fake_lxd.instances.pop(name) for name in names[5::max(containers // 3, 1)][:3]}
+    orphans = [f"bench-orphan-{i}" for i in range(5)]
+    fake_lxd.seed(orphans)
+    fake_lxd.instances['bench-pool-0'] = {'status': 'Stopped', 'config': {bot.POOL_CONFIG_KEY: 'ubuntu:24.04'},
+                                          'cpu': 0}
+
+    started = time.perf_counter()
+    first = await bot.reconciler.run()
+    elapsed = time.perf_counter() - started
+    again = await bot.reconciler.run()
+    report(f"startup[{containers}]", load=ms(statistics.median(loads)), reconcile=ms(elapsed), **first,
+           rerun_fixed=again['fixed'])
+
+    for name in orphans + ['bench-pool-0']:
+        del fake_lxd.instances[name]
+    fake_lxd.instances.update(removed)
+    for name in names:
+        fake_lxd.instances[name]['status'] = 'Running'
+    await bot.reconciler.run()
+
+FLEET_BENCHMARKS = {
+    'client': bench_client,
+    'deploy': bench_deploy,
+    'execute_lxc': bench_execute_lxc,
+    'monitor': bench_monitor,
+    'save': bench_save,
+    'dashboard': bench_dashboard,
+    'suspend': bench_suspend,
+    'placement': bench_placement,
+    'startup': bench_startup,
+}
+
+async def run_fleet_benchmarks(names: list, sizes: list, api_latency: float):
+    fake_lxd = FakeLXD(os.environ['LXD_SOCKET'], latency=api_latency)
+    await fake_lxd.start()
+    stub_discord()
+    try:
+        for containers in sizes:
+            seed_fleet(containers, fake_lxd)
+            for name in names:
+                await FLEET_BENCHMARKS[name](containers, fake_lxd)
+    finally:
+        await bot.nodes.close()
+        await fake_lxd.stop()
+
+BENCHMARKS = {
+    'records': bench_records,
+    **FLEET_BENCHMARKS,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="XeloraCloud benchmarks")
+    parser.add_argument('benchmarks', nargs='*', help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--containers', nargs='+', type=int, default=[100, 1_000, 10_000],
+                        help="fleet sizes for the deploy/execute_lxc/monitor/save/dashboard benchmarks")
+    parser.add_argument('--rows', nargs='+', type=int, default=[10_000, 100_000],
+                        help="table sizes for the records benchmark")
+    parser.add_argument('--lxc-latency', type=float, default=20, help="fake lxc startup delay in ms")
+    parser.add_argument('--api-latency', type=float, default=1, help="fake LXD API delay per request in ms")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+    selected = args.benchmarks or list(BENCHMARKS)
+    os.environ['FAKE_LXC_LATENCY'] = str(args.lxc_latency / 1000)
+    try:
+        if 'records' in selected:
+            for rows in args.rows:
+                bench_records(rows)
+        fleet = [name for name in selected if name in FLEET_BENCHMARKS]
+        if fleet:
+            asyncio.run(run_fleet_benchmarks(fleet, args.containers, args.api_latency / 1000))
+    finally:
+        bot.db.close()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -6,17 +6,43 @@ import subprocess
 import json
 from datetime import datetime, timedelta
 import shlex
+import hashlib
+import zlib
+import tempfile
+import ssl
+from urllib.parse import urlsplit
+import re
+import functools
 import logging
 import shutil
 import os
 from typing import Optional, List, Dict, Any
 import threading
+import atexit
+import queue
+import heapq
+import concurrent.futures
 import time
 import sqlite3
 import random
+import uuid
+import math
 import psutil
 import aiohttp
-from collections import defaultdict
+from aiohttp import web
+from collections import OrderedDict, defaultdict, deque
+from itertools import groupby
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PROCESS_STARTED = time.monotonic()  # startup timings are measured from here
 
 # ==================== CONFIGURATION ====================
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN', 'YOUR_TOKEN_HERE')
@@ -27,6 +53,63 @@ MAIN_ADMIN_ID = int(os.getenv('MAIN_ADMIN_ID', '0'))
 VPS_USER_ROLE_ID = int(os.getenv('VPS_USER_ROLE_ID', '0'))
 DEFAULT_STORAGE_POOL = os.getenv('DEFAULT_STORAGE_POOL', 'default')
 LOG_CHANNEL_ID = int(os.getenv('LOG_CHANNEL_ID', '0'))
+DB_PATH = os.getenv('DB_PATH', 'xeloracloud.db')
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '100'))
+VPS_SAVE_DEBOUNCE = float(os.getenv('VPS_SAVE_DEBOUNCE', '2'))
+VPS_SAVE_MAX_DELAY = float(os.getenv('VPS_SAVE_MAX_DELAY', '10'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '2'))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '2048'))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '3600'))
+USER_NEGATIVE_TTL = int(os.getenv('USER_NEGATIVE_TTL', '300'))
+USER_FETCH_CONCURRENCY = int(os.getenv('USER_FETCH_CONCURRENCY', '4'))
+LOG_QUEUE_MAX = int(os.getenv('LOG_QUEUE_MAX', '500'))
+GUEST_READY_TIMEOUT = float(os.getenv('GUEST_READY_TIMEOUT', '60'))
+WARM_POOL_SIZE = int(os.getenv('WARM_POOL_SIZE', '1'))
+WARM_POOL_REFILL_INTERVAL = int(os.getenv('WARM_POOL_REFILL_INTERVAL', '60'))
+IMAGE_REFRESH_HOURS = float(os.getenv('IMAGE_REFRESH_HOURS', '6'))
+JOB_MAX_CONCURRENT = int(os.getenv('JOB_MAX_CONCURRENT', '4'))
+JOB_MAX_PER_USER = int(os.getenv('JOB_MAX_PER_USER', '1'))
+JOB_KIND_LIMITS = os.getenv('JOB_KIND_LIMITS', 'launch=2,export=2,restore=1,delete=2')
+JOB_TIMEOUTS = os.getenv('JOB_TIMEOUTS', '')
+LXD_SOCKET = os.getenv('LXD_SOCKET', '/var/lib/lxd/unix.socket')
+LXD_POOL_SIZE = int(os.getenv('LXD_POOL_SIZE', '20'))
+LXD_CLIENT_CERT = os.getenv('LXD_CLIENT_CERT', '')  # TLS client certificate trusted by remote nodes
+LXD_CLIENT_KEY = os.getenv('LXD_CLIENT_KEY', '')
+LOCAL_NODE = os.getenv('LOCAL_NODE', 'local')
+NODE_CPU_OVERCOMMIT = float(os.getenv('NODE_CPU_OVERCOMMIT', '4'))
+NODE_RAM_OVERCOMMIT = float(os.getenv('NODE_RAM_OVERCOMMIT', '1'))
+NODE_HEALTH_INTERVAL = int(os.getenv('NODE_HEALTH_INTERVAL', '60'))
+STATUS_CACHE_TTL = float(os.getenv('STATUS_CACHE_TTL', '15'))
+MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', '300'))
+MONITOR_CONCURRENCY = int(os.getenv('MONITOR_CONCURRENCY', '50'))
+MONITOR_SAMPLE_TIMEOUT = float(os.getenv('MONITOR_SAMPLE_TIMEOUT', '10'))
+HOST_SAMPLE_INTERVAL = int(os.getenv('HOST_SAMPLE_INTERVAL', '5'))
+HOST_SAMPLE_WINDOW = 15 * 60  # seconds of host history kept for trends
+PORT_RANGE_START = int(os.getenv('PORT_RANGE_START', '20000'))
+PORT_RANGE_END = int(os.getenv('PORT_RANGE_END', '50000'))
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_IO_LIMIT_MB = float(os.getenv('BACKUP_IO_LIMIT_MB', '100'))  # MB/s across all backups, 0 = unlimited
+BACKUP_TIMEOUT = int(os.getenv('BACKUP_TIMEOUT', '3600'))
+BACKUP_ZSTD_LEVEL = int(os.getenv('BACKUP_ZSTD_LEVEL', '3'))
+BACKUP_RETENTION_DAYS = int(os.getenv('BACKUP_RETENTION_DAYS', '30'))
+BACKUP_TIME = os.getenv('BACKUP_TIME', '03:00')  # UTC
+AUTO_BACKUP_ENABLED = os.getenv('AUTO_BACKUP_ENABLED', 'false').lower() == 'true'
+SUSPEND_WINDOW = int(os.getenv('SUSPEND_WINDOW', '6'))  # monitor samples considered per container
+SUSPEND_BREACHES = int(os.getenv('SUSPEND_BREACHES', '4'))  # samples over a threshold needed to suspend
+SUSPEND_EWMA_ALPHA = float(os.getenv('SUSPEND_EWMA_ALPHA', '0.5'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))
+STARTUP_COMMAND_WAIT = float(os.getenv('STARTUP_COMMAND_WAIT', '60'))  # seconds a command waits for state to load
+
+# Usage history retention per tier, in hours (raw samples, then 1m/1h/1d rollups)
+USAGE_RETENTION_RAW = int(os.getenv('USAGE_RETENTION_RAW', '6'))
+USAGE_TIERS = [
+    ('1m', 60, int(os.getenv('USAGE_RETENTION_1M', '24'))),
+    ('1h', 3600, int(os.getenv('USAGE_RETENTION_1H', str(24 * 14)))),
+    ('1d', 86400, int(os.getenv('USAGE_RETENTION_1D', str(24 * 365)))),
+]
+USAGE_QUERY_MAX_POINTS = int(os.getenv('USAGE_QUERY_MAX_POINTS', '500'))
 
 # Parse additional admins from comma-separated string
 ADDITIONAL_ADMINS = os.getenv('ADDITIONAL_ADMINS', '')
@@ -46,6 +129,10 @@ OS_OPTIONS = [
     {"label": "Rocky Linux 9", "value": "images:rockylinux/9", "emoji": "💚"},
 ]
 
+# Images kept pre-created in the warm pool (defaults to the first OS option only; each image is a download)
+WARM_POOL_IMAGES = [image.strip() for image in os.getenv('WARM_POOL_IMAGES', '').split(',') if image.strip()] \
+    or [OS_OPTIONS[0]['value']]
+
 # Enhanced logging
 logging.basicConfig(
     level=logging.INFO,
@@ -62,14 +149,585 @@ if not shutil.which("lxc"):
     logger.error("LXC command not found. Please install LXD/LXC first.")
     raise SystemExit("LXC not found. Run the install.sh script first!")
 
+# ==================== METRICS ====================
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    """Base for labelled metrics rendered in the Prometheus text format"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()  # DB metrics are recorded from the writer thread
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key: tuple, value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = 'le="%g"' % bound
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Holds metrics plus collectors that read existing counters at scrape time"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._metrics: List[Metric] = []
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labels: tuple = (), register: bool = True) -> Counter:
+        return self._add(Counter(f"{self.prefix}_{name}", documentation, labels), register)
+
+    def gauge(self, name: str, documentation: str, labels: tuple = (), register: bool = True) -> Gauge:
+        return self._add(Gauge(f"{self.prefix}_{name}", documentation, labels), register)
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{self.prefix}_{name}", documentation, labels, buckets))
+
+    def _add(self, metric: Metric, register: bool = True) -> Metric:
+        if register:
+            self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register fn() -> [Metric] evaluated on every scrape (build them with register=False)"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                for metric in collect():
+                    lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"Metrics collector {collect.__name__} failed: {e}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry('xeloracloud')
+lxc_command_seconds = metrics.histogram('lxc_command_seconds', 'lxc CLI call latency by subcommand',
+                                        ('subcommand', 'outcome'))
+lxd_api_seconds = metrics.histogram('lxd_api_request_seconds', 'LXD REST API latency', ('method', 'endpoint'))
+command_seconds = metrics.histogram('command_seconds', 'Discord command handling latency', ('command', 'outcome'))
+task_cycle_seconds = metrics.histogram('task_cycle_seconds', 'Background task cycle duration', ('task',))
+task_overruns = metrics.counter('task_overruns_total', 'Task cycles that took over half their interval', ('task',))
+loop_lag_seconds = metrics.histogram('event_loop_lag_seconds', 'Event loop scheduling delay',
+                                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+loop_lag_last = metrics.gauge('event_loop_lag_last_seconds', 'Most recent event loop scheduling delay')
+
+def timed_task(name: str, interval: float):
+    """Record cycle time and overruns of a tasks.loop body"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                duration = time.monotonic() - started
+                task_cycle_seconds.observe(duration, task=name)
+                if duration > interval * 0.5:
+                    task_overruns.inc(task=name)
+        return wrapper
+    return decorator
+
+async def measure_loop_lag(interval: float = 0.5):
+    """Sleep for `interval` and record how late the loop woke us up"""
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        lag = max(time.monotonic() - started - interval, 0.0)
+        loop_lag_seconds.observe(lag)
+        loop_lag_last.set(lag)
+
+_metrics_runner: Optional[web.AppRunner] = None
+_loop_lag_task: Optional[asyncio.Task] = None
+
+async def start_metrics_server():
+    """Serve /metrics for Prometheus on METRICS_HOST:METRICS_PORT (0 disables it)"""
+    global _metrics_runner, _loop_lag_task
+    if METRICS_PORT <= 0 or _metrics_runner is not None:
+        return
+
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Prometheus-Version': '0.0.4'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    _metrics_runner = web.AppRunner(app, access_log=None)
+    await _metrics_runner.setup()
+    await web.TCPSite(_metrics_runner, METRICS_HOST, METRICS_PORT).start()
+    _loop_lag_task = asyncio.create_task(measure_loop_lag())
+    logger.info(f"📈 Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+# ==================== LXD API CLIENT ====================
+class LXDError(Exception):
+    """Error returned by the LXD REST API"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class LXDClient:
+    """Pooled async client for the LXD REST API.
+
+    `endpoint` is a unix socket path (optionally unix://...) or an https://host:8443
+    URL of a remote LXD, authenticated with the LXD_CLIENT_CERT/LXD_CLIENT_KEY pair
+    and verified against `server_cert` (a PEM certificate or a path to one), which
+    remote endpoints must have. Only the local host's socket has the `lxc` CLI as
+    a fallback (cli_fallback).
+    """
+
+    def __init__(self, endpoint: str, pool_size: int = 20, timeout: int = 120, server_cert: str = None,
+                 cli_fallback: bool = True):
+        self.endpoint = endpoint
+        self.remote = endpoint.startswith('https://')
+        self.cli_fallback = cli_fallback and not self.remote
+        self.socket_path = None if self.remote else endpoint.replace('unix://', '', 1)
+        self.base_url = endpoint.rstrip('/') if self.remote else 'http://lxd'
+        self.server_cert = server_cert
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def available(self) -> bool:
+        """Whether to use the API; when False callers fall back to execute_lxc"""
+        return not self.cli_fallback or os.path.exists(self.socket_path)
+
+    def _ssl_context(self) -> ssl.SSLContext:
+        if not self.server_cert:
+            # Never hand our trusted client certificate to an unverified host
+            raise LXDError(f"No pinned server certificate for {self.endpoint}")
+        if self.server_cert.lstrip().startswith('-----BEGIN'):
+            context = ssl.create_default_context(cadata=self.server_cert)
+        else:
+            context = ssl.create_default_context(cafile=self.server_cert)
+        # LXD serves a self-signed certificate: trust exactly that certificate, whatever name it carries
+        context.check_hostname = False
+        context.verify_flags |= ssl.VERIFY_X509_PARTIAL_CHAIN
+        if LXD_CLIENT_CERT:
+            context.load_cert_chain(LXD_CLIENT_CERT, LXD_CLIENT_KEY or None)
+        return context
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            if self.remote:
+                connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=self._ssl_context())
+            else:
+                connector = aiohttp.UnixConnector(path=self.socket_path, limit=self.pool_size)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def fetch_server_cert(self) -> str:
+        """PEM certificate a remote endpoint presents right now, for pinning on first use"""
+        url = urlsplit(self.endpoint)
+        return await asyncio.to_thread(ssl.get_server_certificate, (url.hostname, url.port or 8443), timeout=15)
+
+    async def request(self, method: str, path: str, *, json_body: Any = None, params: dict = None,
+                      data: Any = None, headers: dict = None, wait: bool = True,
+                      timeout: Optional[int] = None) -> Any:
+        """Perform an API call and return its metadata, waiting on async operations"""
+        timeout = timeout or self.timeout
+        session = self._get_session()
+        started = time.monotonic()
+        try:
+            async with session.request(method, f"{self.base_url}{path}", json=json_body, params=params,
+                                       data=data, headers=headers,
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                text = await resp.text()
+        except asyncio.TimeoutError:
+            logger.error(f"LXD API timeout: {method} {path}")
+            raise asyncio.TimeoutError(f"⏱️ LXD request timed out after {timeout}s")
+        finally:
+            lxd_api_seconds.observe(time.monotonic() - started, method=method, endpoint=self._endpoint(path))
+        try:
+            body = json.loads(text) if text else {}
+        except ValueError:
+            raise LXDError(f"HTTP {resp.status}: {text[:200]}", resp.status)
+
+        if body.get('type') == 'error' or resp.status >= 400:
+            raise LXDError(body.get('error') or f"HTTP {resp.status}", body.get('error_code', resp.status))
+
+        if body.get('type') == 'async' and wait:
+            return await self.wait_operation(body['metadata']['id'], timeout)
+        return body.get('metadata')
+
+    @staticmethod
+    def _endpoint(path: str) -> str:
+        """Collapse instance/operation names so metrics keep a bounded label set"""
+        return re.sub(r'^(/1\.0/(?:instances|operations|profiles|images/aliases))/[^/]+', r'\1/{name}', path)
+
+    async def download(self, path: str, chunk_size: int = 4 * 1024 * 1024):
+        """Stream a large binary resource (e.g. a backup export) without buffering it"""
+        session = self._get_session()
+        async with session.get(f"{self.base_url}{path}", timeout=aiohttp.ClientTimeout(total=None,
+                                                                                 sock_read=self.timeout)) as resp:
+            if resp.status >= 400:
+                raise LXDError(f"HTTP {resp.status} for {path}", resp.status)
+            async for data in resp.content.iter_chunked(chunk_size):
+                yield data
+
+    async def request_raw(self, method: str, path: str, *, params: dict = None) -> bytes:
+        """Fetch a non-JSON resource such as a file or exec output log"""
+        session = self._get_session()
+        async with session.request(method, f"{self.base_url}{path}", params=params,
+                                   timeout=aiohttp.ClientTimeout(total=self.timeout)) as resp:
+            if resp.status >= 400:
+                raise LXDError(f"HTTP {resp.status} for {path}", resp.status)
+            return await resp.read()
+
+    async def wait_operation(self, operation_id: str, timeout: Optional[int] = None) -> dict:
+        """Block on a background operation and raise if it failed"""
+        timeout = timeout or self.timeout
+        op = await self.request('GET', f"/1.0/operations/{operation_id}/wait",
+                                params={'timeout': str(timeout)}, timeout=timeout + 5)
+        if op.get('status_code', 200) >= 400:
+            raise LXDError(op.get('err') or op.get('status', 'Operation failed'), op.get('status_code'))
+        return op
+
+    async def events(self, types: str = 'lifecycle'):
+        """Yield None once subscribed, then each /1.0/events message until the socket closes"""
+        session = self._get_session()
+        async with session.ws_connect(f"{self.base_url}/1.0/events?type={types}", heartbeat=30) as ws:
+            yield None
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    yield json.loads(msg.data)
+                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+
+    # Convenience wrappers
+    async def list_instances(self, recursion: int = 1) -> Any:
+        return await self.request('GET', '/1.0/instances', params={'recursion': str(recursion)})
+
+    async def get_instance(self, name: str) -> dict:
+        return await self.request('GET', f"/1.0/instances/{name}")
+
+    async def get_instance_state(self, name: str) -> dict:
+        return await self.request('GET', f"/1.0/instances/{name}/state")
+
+    async def patch_instance(self, name: str, changes: dict) -> Any:
+        return await self.request('PATCH', f"/1.0/instances/{name}", json_body=changes)
+
+    async def change_state(self, name: str, action: str, force: bool = False, timeout: int = 30) -> dict:
+        return await self.request('PUT', f"/1.0/instances/{name}/state",
+                                  json_body={'action': action, 'force': force, 'timeout': timeout})
+
+    async def exec(self, name: str, command: List[str], environment: dict = None,
+                   timeout: Optional[int] = None) -> tuple:
+        """Run a command in an instance and return (exit code, stdout, stderr)"""
+        op = await self.request('POST', f"/1.0/instances/{name}/exec", json_body={
+            'command': command,
+            'environment': environment or {},
+            'wait-for-websocket': False,
+            'interactive': False,
+            'record-output': True,
+        }, timeout=timeout)
+        meta = op.get('metadata') or {}
+        output = meta.get('output') or {}
+        stdout = await self.request_raw('GET', output['1']) if '1' in output else b''
+        stderr = await self.request_raw('GET', output['2']) if '2' in output else b''
+        return meta.get('return', -1), stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+    async def push_file(self, name: str, path: str, content: bytes, mode: str = '0644',
+                        uid: int = 0, gid: int = 0) -> Any:
+        return await self.request('POST', f"/1.0/instances/{name}/files", params={'path': path},
+                                  data=content, headers={
+                                      'Content-Type': 'application/octet-stream',
+                                      'X-LXD-type': 'file',
+                                      'X-LXD-mode': mode,
+                                      'X-LXD-uid': str(uid),
+                                      'X-LXD-gid': str(gid),
+                                      'X-LXD-write': 'overwrite',
+                                  })
+
+# Snap installs keep the socket under /var/snap
+if not os.path.exists(LXD_SOCKET) and os.path.exists('/var/snap/lxd/common/lxd/unix.socket'):
+    LXD_SOCKET = '/var/snap/lxd/common/lxd/unix.socket'
+
+lxd = LXDClient(LXD_SOCKET, pool_size=LXD_POOL_SIZE)
+
 # ==================== DATABASE SETUP ====================
-def get_db():
-    conn = sqlite3.connect('xeloracloud.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+class Database:
+    """Long-lived SQLite connections in WAL mode with writes serialized on a dedicated thread.
+
+    Reads use a shared read connection (WAL readers never wait on the writer);
+    writes are queued to the writer thread, which commits everything queued so far
+    in one transaction with a savepoint per job, so a failing job only rolls back itself.
+    """
+
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA busy_timeout=5000',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA cache_size=-20000',
+        'PRAGMA mmap_size=268435456',
+    )
+    MAX_BATCH = 256
+
+    def __init__(self, path: str, slow_query_ms: float = 100):
+        self.path = path
+        self.slow_query_ms = slow_query_ms
+        self.query_stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[threading.Thread] = None
+        self._submit_lock = threading.Lock()
+        self._stopped = True
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def open(self):
+        if self._writer and self._writer.is_alive():
+            return
+        self._reader = self._connect()
+        self._writer = threading.Thread(target=self._writer_loop, args=(self._connect(),),
+                                        name='db-writer', daemon=True)
+        self._stopped = False
+        self._writer.start()
+
+    def close(self):
+        """Commit everything queued, then stop the writer thread"""
+        with self._submit_lock:
+            stopping, self._stopped = not self._stopped, True
+            if stopping:
+                self._queue.put(None)
+        if self._writer and self._writer.is_alive():
+            self._writer.join()
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    @staticmethod
+    def _label(sql: str) -> str:
+        return ' '.join(sql.split())[:60]
+
+    def _record(self, label: str, elapsed: float, waited: float = 0.0):
+        elapsed_ms = elapsed * 1000
+        with self._stats_lock:
+            stat = self.query_stats.setdefault(label, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'wait_ms': 0.0})
+            stat['count'] += 1
+            stat['total_ms'] += elapsed_ms
+            stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+            stat['wait_ms'] += waited * 1000
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(f"🐢 Slow query [{label}]: {elapsed_ms:.1f}ms")
+
+    # Reads (any thread, never blocked by the writer)
+    def read(self, sql: str, params: tuple = (), label: str = None) -> List[sqlite3.Row]:
+        started = time.perf_counter()
+        with self._read_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+        self._record(label or self._label(sql), time.perf_counter() - started)
+        return rows
+
+    def read_one(self, sql: str, params: tuple = (), label: str = None) -> Optional[sqlite3.Row]:
+        rows = self.read(sql, params, label)
+        return rows[0] if rows else None
+
+    # Writes (queued to the writer thread)
+    def submit(self, fn, label: str = None) -> concurrent.futures.Future:
+        """Queue fn(conn) for the writer thread; the future resolves after commit"""
+        future = concurrent.futures.Future()
+        job = (fn, label or getattr(fn, '__name__', 'write'), future, time.perf_counter())
+        with self._submit_lock:
+            if not self._stopped:
+                self._queue.put(job)
+                return future
+        # The writer has shut down (e.g. writes made during exit): commit on the caller's thread
+        conn = self._connect()
+        try:
+            self._run_batch(conn, [job])
+        finally:
+            conn.close()
+        return future
+
+    def execute(self, sql: str, params: tuple = (), label: str = None) -> concurrent.futures.Future:
+        return self.submit(lambda conn: conn.execute(sql, params).lastrowid, label or self._label(sql))
+
+    def executemany(self, sql: str, seq_of_params, label: str = None) -> concurrent.futures.Future:
+        rows = list(seq_of_params)
+        return self.submit(lambda conn: conn.executemany(sql, rows).rowcount, label or self._label(sql))
+
+    async def run(self, fn, label: str = None) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, label))
+
+    def flush(self, timeout: Optional[float] = None):
+        if self._stopped:
+            return  # writes after close() are committed as they are submitted
+        self.submit(lambda conn: None, 'flush').result(timeout)
+
+    def _writer_loop(self, conn: sqlite3.Connection):
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._run_batch(conn, batch)
+        conn.close()
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: list):
+        outcomes = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, label, future, queued_at in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                started = time.perf_counter()
+                conn.execute('SAVEPOINT job')
+                try:
+                    outcomes.append((future, fn(conn), None))
+                    conn.execute('RELEASE job')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    conn.execute('RELEASE job')
+                    logger.error(f"DB write failed [{label}]: {e}")
+                    outcomes.append((future, None, e))
+                self._record(label, time.perf_counter() - started, started - queued_at)
+            conn.execute('COMMIT')
+        except Exception as e:
+            logger.error(f"DB batch commit failed: {e}")
+            try:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+            except sqlite3.Error as rollback_error:
+                logger.error(f"DB batch rollback failed: {rollback_error}")
+            # Nothing in the batch was committed, including jobs BEGIN never got to
+            outcomes = [(future, None, e) for _, _, future, _ in batch if not future.done()]
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+db = Database(DB_PATH, slow_query_ms=DB_SLOW_QUERY_MS)
+
+@metrics.collector
+def collect_db_metrics() -> List[Metric]:
+    count = metrics.counter('db_queries_total', 'Database queries and write jobs', ('label',), register=False)
+    seconds = metrics.counter('db_query_seconds_total', 'Time spent running queries', ('label',), register=False)
+    waited = metrics.counter('db_lock_wait_seconds_total', 'Time write jobs waited for the writer',
+                             ('label',), register=False)
+    slowest = metrics.gauge('db_query_max_seconds', 'Slowest single query', ('label',), register=False)
+    depth = metrics.gauge('db_write_queue_depth', 'Write jobs waiting for the writer thread', register=False)
+    with db._stats_lock:
+        stats = [(label, dict(stat)) for label, stat in db.query_stats.items()]
+    for label, stat in stats:
+        count.inc(stat['count'], label=label)
+        seconds.inc(stat['total_ms'] / 1000, label=label)
+        waited.inc(stat['wait_ms'] / 1000, label=label)
+        slowest.set(stat['max_ms'] / 1000, label=label)
+    depth.set(db.pending)
+    return [count, seconds, waited, slowest, depth]
 
 def init_db():
-    conn = get_db()
+    db.submit(create_schema, label='init_db').result()
+
+def create_schema(conn: sqlite3.Connection):
+    """Create and migrate tables (runs on the writer thread)"""
     cur = conn.cursor()
     
     # Admins table
@@ -110,7 +768,27 @@ def init_db():
         shared_with TEXT DEFAULT '[]',
         suspension_history TEXT DEFAULT '[]',
         tags TEXT DEFAULT '[]',
-        notes TEXT DEFAULT ''
+        notes TEXT DEFAULT '',
+        node TEXT
+    )''')
+    cur.execute("PRAGMA table_info(vps)")
+    if 'node' not in {row['name'] for row in cur.fetchall()}:
+        cur.execute('ALTER TABLE vps ADD COLUMN node TEXT')
+    cur.execute('UPDATE vps SET node = ? WHERE node IS NULL', (LOCAL_NODE,))
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_vps_node ON vps (node)')
+
+    # Additional LXD hosts; the local socket is always the LOCAL_NODE node. Zero capacity = use live totals
+    cur.execute('''CREATE TABLE IF NOT EXISTS nodes (
+        name TEXT PRIMARY KEY,
+        endpoint TEXT NOT NULL,
+        storage_pool TEXT DEFAULT 'default',
+        public_ip TEXT,
+        ram_gb REAL DEFAULT 0,
+        cpu_cores REAL DEFAULT 0,
+        storage_gb REAL DEFAULT 0,
+        server_cert TEXT,
+        enabled INTEGER DEFAULT 1,
+        created_at TEXT NOT NULL
     )''')
     
     # Settings table
@@ -129,6 +807,7 @@ def init_db():
         ('default_ram', '2'),
         ('default_cpu', '2'),
         ('default_storage', '20'),
+        ('default_port_quota', '5'),
     ]
     
     for key, value in settings_init:
@@ -152,6 +831,31 @@ def init_db():
         created_at TEXT NOT NULL,
         last_used TEXT
     )''')
+    # One forward per host port; drop colliding rows left by older versions before enforcing it
+    duplicates = cur.execute('SELECT COUNT(*) - COUNT(DISTINCT host_port) FROM port_forwards').fetchone()[0]
+    if duplicates:
+        logger.warning(f"Removing {duplicates} port forwards that reuse a host port")
+        cur.execute('DELETE FROM port_forwards WHERE id NOT IN (SELECT MIN(id) FROM port_forwards GROUP BY host_port)')
+    cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_port_forwards_host_port ON port_forwards (host_port)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_port_forwards_container ON port_forwards (vps_container)')
+    
+    # Long-running LXD jobs
+    cur.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        priority INTEGER DEFAULT 5,
+        state TEXT NOT NULL DEFAULT 'queued',
+        payload TEXT DEFAULT '{}',
+        channel_id INTEGER,
+        message_id INTEGER,
+        progress TEXT,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT
+    )''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, priority, id)')
     
     # Backups table
     cur.execute('''CREATE TABLE IF NOT EXISTS backups (
@@ -162,6 +866,13 @@ def init_db():
         created_at TEXT NOT NULL,
         created_by TEXT NOT NULL
     )''')
+    cur.execute("PRAGMA table_info(backups)")
+    backup_columns = {row['name'] for row in cur.fetchall()}
+    for column, kind in (('size_bytes', 'INTEGER'), ('stored_bytes', 'INTEGER'), ('chunk_count', 'INTEGER'),
+                         ('new_chunks', 'INTEGER'), ('dedup_ratio', 'REAL'), ('duration_seconds', 'REAL')):
+        if column not in backup_columns:
+            cur.execute(f'ALTER TABLE backups ADD COLUMN {column} {kind}')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_backups_container ON backups (container_name, id)')
     
     # Audit log
     cur.execute('''CREATE TABLE IF NOT EXISTS audit_log (
@@ -173,139 +884,901 @@ def init_db():
         details TEXT,
         success INTEGER DEFAULT 1
     )''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log (user_id, id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_action ON audit_log (action, id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_target ON audit_log (target, id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log (timestamp)')
     
-    # Usage statistics
+    # Usage statistics (raw samples, epoch timestamps)
+    cur.execute("PRAGMA table_info(usage_stats)")
+    columns = {row['name']: row['type'] for row in cur.fetchall()}
+    legacy_usage = columns.get('timestamp', '').upper() == 'TEXT'
+    if legacy_usage:
+        # Migrate ISO-text timestamps (local time) to integer epochs
+        cur.execute('ALTER TABLE usage_stats RENAME TO usage_stats_legacy')
+        logger.info("Migrating usage_stats timestamps to epoch seconds")
+
     cur.execute('''CREATE TABLE IF NOT EXISTS usage_stats (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         container_name TEXT NOT NULL,
-        timestamp TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
         cpu_usage REAL,
         ram_usage REAL,
         disk_usage REAL,
         network_rx INTEGER,
         network_tx INTEGER
     )''')
-    
-    conn.commit()
-    conn.close()
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_usage_stats_container_ts ON usage_stats (container_name, timestamp)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_usage_stats_ts ON usage_stats (timestamp)')
+
+    if legacy_usage:
+        cur.execute('''INSERT INTO usage_stats (container_name, timestamp, cpu_usage, ram_usage, disk_usage,
+                       network_rx, network_tx)
+                       SELECT container_name, CAST(strftime('%s', timestamp, 'utc') AS INTEGER), cpu_usage,
+                              ram_usage, disk_usage, network_rx, network_tx
+                       FROM usage_stats_legacy WHERE strftime('%s', timestamp, 'utc') IS NOT NULL''')
+        cur.execute('DROP TABLE usage_stats_legacy')
+
+    # Usage rollup tiers (min/avg/max/p95 per metric and bucket)
+    for tier, _, _ in USAGE_TIERS:
+        cur.execute(f'''CREATE TABLE IF NOT EXISTS usage_rollup_{tier} (
+            container_name TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            cpu_min REAL, cpu_avg REAL, cpu_max REAL, cpu_p95 REAL,
+            ram_min REAL, ram_avg REAL, ram_max REAL, ram_p95 REAL,
+            disk_min REAL, disk_avg REAL, disk_max REAL, disk_p95 REAL,
+            network_rx INTEGER,
+            network_tx INTEGER,
+            PRIMARY KEY (container_name, bucket)
+        ) WITHOUT ROWID''')
+        cur.execute(f'CREATE INDEX IF NOT EXISTS idx_usage_rollup_{tier}_bucket ON usage_rollup_{tier} (bucket)')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS usage_rollup_state (
+        tier TEXT PRIMARY KEY,
+        watermark INTEGER NOT NULL
+    )''')
+
+class AuditLog:
+    """In-memory audit queue written to audit_log in batches (by size or after a short delay)"""
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, row: tuple):
+        with self._lock:
+            self._buffer.append(row)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            try:
+                self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                # No event loop (startup/shutdown) - write straight away
+                self.flush()
+
+    def flush(self) -> Optional[concurrent.futures.Future]:
+        """Hand everything buffered to the DB writer; returns None if there was nothing to write"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return None
+        self.written += len(rows)
+        return db.executemany('''INSERT INTO audit_log (timestamp, user_id, action, target, details, success)
+                                 VALUES (?, ?, ?, ?, ?, ?)''', rows, label='audit_flush')
+
+audit_log = AuditLog(AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL)
+
+@atexit.register
+def _flush_on_exit():
+    """Never lose buffered audit events, even if the bot exits without close()"""
+    audit_log.flush()
+    db.flush()  # drains the writer if close() never ran; writes directly once it has
 
 def log_audit(user_id: str, action: str, target: str = None, details: str = None, success: bool = True):
     """Log actions for audit trail"""
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('''INSERT INTO audit_log (timestamp, user_id, action, target, details, success)
-                       VALUES (?, ?, ?, ?, ?, ?)''',
-                    (datetime.now().isoformat(), user_id, action, target, details, 1 if success else 0))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Failed to log audit: {e}")
+    audit_log.add((datetime.now().isoformat(), str(user_id), action, target, details, 1 if success else 0))
 
-async def send_log_to_discord(title: str, description: str, color: str = 'info', fields: dict = None):
-    """Send log message to Discord log channel"""
-    if LOG_CHANNEL_ID == 0:
-        return
-    
+def _audit_first_id(moment: datetime) -> Optional[int]:
+    """Lowest audit_log id logged at or after `moment` (naive local time, like the stored timestamps).
+
+    Timestamps repeat an hour when DST ends but ids keep increasing, so a row logged before the
+    first one in timestamp order can still be at or after `moment`; it is at most an hour later.
+    """
+    row = db.read_one('SELECT timestamp FROM audit_log WHERE timestamp >= ? ORDER BY timestamp LIMIT 1',
+                      (moment.isoformat(),), label='audit_time_bound')
+    if row is None:
+        return None
+    repeated_until = (datetime.fromisoformat(row['timestamp']) + timedelta(hours=1)).isoformat()
+    return db.read_one('SELECT MIN(id) AS id FROM audit_log WHERE timestamp >= ? AND timestamp < ?',
+                       (row['timestamp'], repeated_until), label='audit_time_bound')['id']
+
+def query_audit_log(user_id: str = None, action: str = None, target: str = None, since: datetime = None,
+                    until: datetime = None, before_id: int = None, limit: int = 25) -> List[sqlite3.Row]:
+    """Search the audit log newest-first with keyset pagination on id.
+
+    Rows are inserted in event order, so a time range is first translated into
+    an id range through the timestamp index; the remaining filters then walk
+    their (column, id) index without scanning older rows.
+    """
+    if any(bound is not None and bound.tzinfo is not None for bound in (since, until)):
+        raise ValueError("since/until must be naive local times, like the stored timestamps")
+    clauses, params = [], []
+    if since:
+        first_id = _audit_first_id(since)
+        if first_id is None:
+            return []
+        clauses.append('id >= ?')
+        params.append(first_id)
+    if until:
+        first_id = _audit_first_id(until)
+        if first_id is not None:
+            clauses.append('id < ?')
+            params.append(first_id)
+    if before_id:
+        clauses.append('id < ?')
+        params.append(before_id)
+    for column, value in (('user_id', user_id), ('action', action), ('target', target)):
+        if value:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    return db.read(f'SELECT * FROM audit_log {where} ORDER BY id DESC LIMIT ?', tuple(params) + (limit,),
+                   label='audit_query')
+
+def save_usage_samples(rows: List[tuple]) -> concurrent.futures.Future:
+    """Insert a batch of resource samples in a single transaction"""
+    return db.executemany('''INSERT INTO usage_stats (container_name, timestamp, cpu_usage, ram_usage,
+                             disk_usage, network_rx, network_tx) VALUES (?, ?, ?, ?, ?, ?, ?)''', rows,
+                          label='save_usage_samples')
+
+# ==================== SETTINGS ====================
+SETTING_TYPES = {
+    'cpu_threshold': int,
+    'ram_threshold': int,
+    'disk_threshold': int,
+    'auto_suspend_enabled': bool,
+    'max_vps_per_user': int,
+    'default_ram': int,
+    'default_cpu': int,
+    'default_storage': int,
+    'default_port_quota': int,
+}
+
+# Inclusive (min, max) for numeric settings; thresholds are percentages
+SETTING_BOUNDS = {
+    'cpu_threshold': (1, 100),
+    'ram_threshold': (1, 100),
+    'disk_threshold': (1, 100),
+}
+
+def parse_setting(key: str, value: Any) -> Any:
+    """Convert a stored or user-supplied value to the setting's type"""
+    kind = SETTING_TYPES.get(key, str)
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in ('true', '1', 'yes', 'on'):
+            return True
+        if text in ('false', '0', 'no', 'off'):
+            return False
+        raise ValueError(f"{key} must be true or false")
     try:
-        channel = bot.get_channel(LOG_CHANNEL_ID)
-        if channel:
-            embed = create_embed(title, description, color)
-            
-            if fields:
-                for name, value in fields.items():
-                    add_field(embed, name, value, True)
-            
-            await channel.send(embed=embed)
-    except Exception as e:
-        logger.error(f"Failed to send log to Discord: {e}")
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a{'n' if kind is int else ''} {kind.__name__}")
+    if key in SETTING_BOUNDS:
+        low, high = SETTING_BOUNDS[key]
+        if not low <= value <= high:
+            raise ValueError(f"{key} must be between {low} and {high}")
+    return value
+
+def encode_setting(value: Any) -> str:
+    return ('true' if value else 'false') if isinstance(value, bool) else str(value)
+
+class SettingsStore:
+    """The settings table held in memory; writes go through to the DB and notify subscribers"""
+
+    def __init__(self):
+        self._values: Dict[str, str] = {}
+        self._subscribers: Dict[str, List] = defaultdict(list)
+
+    def load(self):
+        rows = db.read('SELECT key, value FROM settings', label='load_settings')
+        self._values = {row['key']: row['value'] for row in rows}
+
+    def get_raw(self, key: str, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Typed value of a setting (see SETTING_TYPES)"""
+        if key not in self._values:
+            return default
+        try:
+            return parse_setting(key, self._values[key])
+        except ValueError:
+            logger.warning(f"Invalid stored value for setting {key}: {self._values[key]!r}")
+            return default
+
+    def set(self, key: str, value: Any) -> concurrent.futures.Future:
+        """Validate, cache and persist a setting, then notify its subscribers"""
+        typed = parse_setting(key, value)
+        self._values[key] = encode_setting(typed)
+        future = db.execute('INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, ?)',
+                            (key, self._values[key], datetime.now().isoformat()), label='set_setting')
+        for callback in self._subscribers.get(key, []):
+            try:
+                callback(key, typed)
+            except Exception as e:
+                logger.error(f"Settings subscriber for {key} failed: {e}")
+        return future
+
+    def subscribe(self, key: str, callback):
+        """Call callback(key, value) whenever the setting changes"""
+        self._subscribers[key].append(callback)
+
+settings = SettingsStore()
 
 def get_setting(key: str, default: Any = None):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT value FROM settings WHERE key = ?', (key,))
-    row = cur.fetchone()
-    conn.close()
-    return row[0] if row else default
+    return settings.get_raw(key, default)
 
-def set_setting(key: str, value: str):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, ?)', 
-                (key, value, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+def set_setting(key: str, value: str) -> concurrent.futures.Future:
+    return settings.set(key, value)
+
+# ==================== USAGE ROLLUPS ====================
+USAGE_METRICS = ('cpu', 'ram', 'disk')
+
+def percentile(values: List[float], pct: float, weights: List[int] = None) -> Optional[float]:
+    """Nearest-rank percentile, optionally weighted by sample counts"""
+    if not values:
+        return None
+    if weights is None:
+        ordered = sorted(values)
+        return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+    pairs = sorted(zip(values, weights))
+    target = pct / 100 * sum(weights)
+    seen = 0
+    for value, weight in pairs:
+        seen += weight
+        if seen >= target:
+            return value
+    return pairs[-1][0]
+
+def aggregate_raw(rows: List[sqlite3.Row]) -> tuple:
+    """Summarize raw usage_stats rows of one container bucket"""
+    result = [len(rows)]
+    for metric in USAGE_METRICS:
+        values = [row[f'{metric}_usage'] for row in rows if row[f'{metric}_usage'] is not None]
+        if values:
+            result += [min(values), sum(values) / len(values), max(values), percentile(values, 95)]
+        else:
+            result += [None, None, None, None]
+    result += [max((row['network_rx'] or 0) for row in rows), max((row['network_tx'] or 0) for row in rows)]
+    return tuple(result)
+
+def aggregate_rollup(rows: List[sqlite3.Row]) -> tuple:
+    """Merge finer rollup buckets; p95 is the sample-weighted p95 of the finer p95s"""
+    samples = sum(row['samples'] for row in rows)
+    result = [samples]
+    for metric in USAGE_METRICS:
+        present = [row for row in rows if row[f'{metric}_avg'] is not None]
+        if present:
+            weight = sum(row['samples'] for row in present)
+            result += [
+                min(row[f'{metric}_min'] for row in present),
+                sum(row[f'{metric}_avg'] * row['samples'] for row in present) / weight,
+                max(row[f'{metric}_max'] for row in present),
+                percentile([row[f'{metric}_p95'] for row in present], 95, [row['samples'] for row in present]),
+            ]
+        else:
+            result += [None, None, None, None]
+    result += [max((row['network_rx'] or 0) for row in rows), max((row['network_tx'] or 0) for row in rows)]
+    return tuple(result)
+
+def _rollup_tier(conn, tier: str, size: int, source: str, now: int) -> int:
+    """Roll complete buckets of `source` into usage_rollup_<tier>; returns buckets written"""
+    ts_column = 'timestamp' if source == 'usage_stats' else 'bucket'
+    aggregate = aggregate_raw if source == 'usage_stats' else aggregate_rollup
+    end = now // size * size
+
+    row = conn.execute('SELECT watermark FROM usage_rollup_state WHERE tier = ?', (tier,)).fetchone()
+    if row:
+        watermark = row['watermark']
+    else:
+        first = conn.execute(f'SELECT MIN({ts_column}) FROM {source}').fetchone()[0]
+        if first is None:
+            conn.execute('INSERT INTO usage_rollup_state (tier, watermark) VALUES (?, ?)', (tier, end))
+            return 0
+        watermark = first // size * size
+
+    written = 0
+    step = max(size, 3600)
+    while watermark < end:
+        window_end = min(watermark + step, end)
+        rows = conn.execute(f'SELECT * FROM {source} WHERE {ts_column} >= ? AND {ts_column} < ? '
+                            f'ORDER BY container_name, {ts_column}', (watermark, window_end)).fetchall()
+        batch = []
+        for (name, bucket), group in groupby(rows, key=lambda r: (r['container_name'], r[ts_column] // size * size)):
+            batch.append((name, bucket) + aggregate(list(group)))
+        conn.executemany(f'INSERT OR REPLACE INTO usage_rollup_{tier} VALUES ({", ".join("?" * 17)})', batch)
+        conn.execute('INSERT OR REPLACE INTO usage_rollup_state (tier, watermark) VALUES (?, ?)',
+                     (tier, window_end))
+        written += len(batch)
+        watermark = window_end
+    return written
+
+def run_usage_rollups(conn: sqlite3.Connection, now: Optional[int] = None) -> Dict[str, int]:
+    """Compact usage samples into the rollup tiers and enforce per-tier retention (writer job)"""
+    now = int(now if now is not None else time.time())
+    written = {}
+    source = 'usage_stats'
+    for tier, size, _ in USAGE_TIERS:
+        written[tier] = _rollup_tier(conn, tier, size, source, now)
+        source = f'usage_rollup_{tier}'
+
+    # Never expire rows the next tier has not consumed yet
+    watermarks = dict(conn.execute('SELECT tier, watermark FROM usage_rollup_state').fetchall())
+    tables = [('usage_stats', 'timestamp', USAGE_RETENTION_RAW)] + \
+             [(f'usage_rollup_{tier}', 'bucket', retention) for tier, _, retention in USAGE_TIERS]
+    consumers = [tier for tier, _, _ in USAGE_TIERS] + [None]
+    for (table, column, retention), consumer in zip(tables, consumers):
+        cutoff = now - retention * 3600
+        if consumer is not None:
+            cutoff = min(cutoff, watermarks.get(consumer, 0))
+        conn.execute(f'DELETE FROM {table} WHERE {column} < ?', (cutoff,))
+    return written
+
+def query_usage(container_name: str, start: int, end: Optional[int] = None,
+                max_points: int = USAGE_QUERY_MAX_POINTS) -> tuple:
+    """Return (tier, rows) for a container's usage between two epochs.
+
+    Picks the finest tier whose retention still covers `start` and that returns at
+    most `max_points` buckets, falling back to the coarsest tier covering the range.
+    """
+    now = int(time.time())
+    end = end or now
+    tiers = [('raw', MONITOR_INTERVAL, USAGE_RETENTION_RAW)] + USAGE_TIERS
+    covering = [t for t in tiers if now - t[2] * 3600 <= start] or [tiers[-1]]
+    tier, size, _ = next((t for t in covering if (end - start) / t[1] <= max_points), covering[-1])
+
+    if tier == 'raw':
+        columns = ', '.join(f'{m}_usage AS {m}_{agg}' for m in USAGE_METRICS for agg in ('min', 'avg', 'max', 'p95'))
+        sql = (f'SELECT timestamp AS bucket, 1 AS samples, {columns}, network_rx, network_tx FROM usage_stats '
+               f'WHERE container_name = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp')
+    else:
+        sql = (f'SELECT * FROM usage_rollup_{tier} WHERE container_name = ? AND bucket >= ? AND bucket < ? '
+               f'ORDER BY bucket')
+    rows = [dict(row) for row in db.read(sql, (container_name, start, end), label=f'query_usage_{tier}')]
+    return tier, rows
 
 # ==================== DATA LOADING ====================
-def get_vps_data() -> Dict[str, List[Dict[str, Any]]]:
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM vps')
-    rows = cur.fetchall()
-    conn.close()
+VPS_JSON_FIELDS = ('shared_with', 'suspension_history', 'tags')
+VPS_BOOL_FIELDS = ('suspended', 'whitelisted')
+VPS_COLUMNS = ('user_id', 'container_name', 'ram', 'cpu', 'storage', 'bandwidth', 'config', 'os_version',
+               'status', 'suspended', 'whitelisted', 'created_at', 'last_started', 'total_uptime',
+               'shared_with', 'suspension_history', 'tags', 'notes', 'node')
+VPS_DEFAULTS = {
+    'bandwidth': 'Unlimited',
+    'os_version': 'ubuntu:24.04',
+    'status': 'stopped',
+    'suspended': False,
+    'whitelisted': False,
+    'last_started': None,
+    'total_uptime': 0,
+    'notes': '',
+    'node': LOCAL_NODE,
+}
+
+# id(record) -> record for every VPS with unsaved changes
+dirty_vps: Dict[int, 'VPSRecord'] = {}
+_vps_dirty_generation = 0
+
+class TrackedList(list):
+    """List that marks its owning VPS field dirty whenever it is mutated"""
+
+    def __init__(self, items=(), owner: 'VPSRecord' = None, field: str = None):
+        super().__init__(items)
+        self._owner = owner
+        self._field = field
+
+    def _touch(self):
+        if self._owner is not None:
+            self._owner.mark_dirty(self._field)
+
+def _tracked(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._touch()
+        return result
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse',
+              '__setitem__', '__delitem__', '__iadd__'):
+    setattr(TrackedList, _name, _tracked(_name))
+
+VPS_FIELDS = ('id',) + VPS_COLUMNS
+_VPS_FIELD_SET = frozenset(VPS_FIELDS)
+_EMPTY_JSON_LIST = '[]'
+
+class VPSRecord:
+    """VPS row that remembers which columns changed since it was last saved.
+
+    Slotted, mapping-style record (vps['status'], vps.get(...)). JSON columns
+    are kept as the raw column text until first read, so loading the fleet
+    doesn't pay json.loads for fields most commands never touch.
+    """
+
+    __slots__ = VPS_FIELDS + ('dirty', 'inserting', 'registry', '_extra')
+
+    id: Optional[int]
+    user_id: str
+    container_name: str
+    ram: str
+    cpu: str
+    storage: str
+    bandwidth: str
+    config: str
+    os_version: str
+    status: str
+    suspended: bool
+    whitelisted: bool
+    created_at: Optional[str]
+    last_started: Optional[str]
+    total_uptime: int
+    shared_with: Any  # raw JSON text until first access, then a TrackedList
+    suspension_history: Any
+    tags: Any
+    notes: str
+    node: str
+
+    def __init__(self, data=None, **kwargs):
+        self.dirty = set()
+        self.inserting = False
+        self.registry: Optional['VPSRegistry'] = None
+        self._extra: Optional[dict] = None
+        data = {**dict(data or {}), **kwargs}
+        for field in VPS_FIELDS:
+            value = data.pop(field, VPS_DEFAULTS.get(field))
+            if field in VPS_JSON_FIELDS:
+                if not isinstance(value, str):
+                    value = TrackedList(value or [], self, field)
+            elif field in VPS_BOOL_FIELDS:
+                value = bool(value)
+            object.__setattr__(self, field, value)
+        if data:
+            self._extra = data
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> 'VPSRecord':
+        """Build a record straight from a vps row, leaving JSON columns undecoded"""
+        record = cls.__new__(cls)
+        record.dirty = set()
+        record.inserting = False
+        record.registry = None
+        record._extra = None
+        for field, value in zip(row.keys(), row):
+            if field in VPS_BOOL_FIELDS:
+                value = bool(value)
+            elif field in VPS_JSON_FIELDS and value is None:
+                value = _EMPTY_JSON_LIST
+            object.__setattr__(record, field, value)
+        return record
+
+    def _decoded(self, field: str) -> 'TrackedList':
+        value = getattr(self, field)
+        if isinstance(value, str):
+            value = TrackedList(json.loads(value) or [], self, field)
+            object.__setattr__(self, field, value)
+        return value
+
+    def raw(self, field: str) -> Any:
+        """Column value as stored, without decoding JSON fields"""
+        return getattr(self, field)
+
+    def peek_list(self, field: str) -> Any:
+        """A JSON list field, skipping the decode when the column is empty"""
+        value = getattr(self, field)
+        if value == _EMPTY_JSON_LIST:
+            return ()
+        return self._decoded(field)
+
+    def __getitem__(self, key):
+        if key in VPS_JSON_FIELDS:
+            return self._decoded(key)
+        if key in _VPS_FIELD_SET:
+            return getattr(self, key)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key) -> bool:
+        return key in _VPS_FIELD_SET or (self._extra is not None and key in self._extra)
+
+    def keys(self):
+        return list(VPS_FIELDS) + list(self._extra or ())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(VPS_FIELDS) + len(self._extra or ())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"VPSRecord({self.to_dict()!r})"
+
+    def set_raw(self, key, value):
+        """Set a field without marking it dirty (used by persistence itself)"""
+        if key in _VPS_FIELD_SET:
+            object.__setattr__(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __setitem__(self, key, value):
+        if key in VPS_JSON_FIELDS:
+            value = TrackedList(value, self, key)
+        elif key in VPS_BOOL_FIELDS:
+            value = bool(value)
+        self.set_raw(key, value)
+        self.mark_dirty(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def mark_dirty(self, *fields):
+        global _vps_dirty_generation
+        if self.registry is not None and not VPS_INDEXED_FIELDS.isdisjoint(fields):
+            self.registry.reindex(self)
+        self.dirty.update(field for field in fields if field in VPS_COLUMNS)
+        if self.dirty or self.id is None:
+            dirty_vps[id(self)] = self
+            _vps_dirty_generation += 1
+            schedule_save_vps_data()
+
+VPS_INDEXED_FIELDS = frozenset(('user_id', 'container_name', 'status', 'shared_with', 'tags', 'node'))
+
+class VPSRegistry:
+    """In-memory VPS store indexed by name, owner, shared-with user, tag, status and node.
+
+    Records report their own changes (see VPSRecord.mark_dirty), so indexes
+    and counters stay current without rescanning the fleet. `owners` is the
+    user_id -> [records] map the rest of the bot knows as vps_data; add and
+    remove records through the registry rather than editing it directly.
+    """
+
+    def __init__(self):
+        self.owners: Dict[str, List[VPSRecord]] = {}
+        self.by_name: Dict[str, VPSRecord] = {}
+        self._shared: Dict[str, Dict[int, VPSRecord]] = defaultdict(dict)
+        self._tags: Dict[str, Dict[int, VPSRecord]] = defaultdict(dict)
+        self._status: Dict[str, Dict[int, VPSRecord]] = defaultdict(dict)
+        self._node: Dict[str, Dict[int, VPSRecord]] = defaultdict(dict)
+        self._keys: Dict[int, tuple] = {}  # id(record) -> index keys it is filed under
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self):
+        for vps_list in self.owners.values():
+            yield from vps_list
+
+    def __contains__(self, container_name: str) -> bool:
+        return container_name in self.by_name
+
+    @property
+    def user_count(self) -> int:
+        return len(self.owners)
+
+    def count(self, status: str) -> int:
+        return len(self._status.get(status, ()))
+
+    def load(self, data: Dict[str, List[VPSRecord]]):
+        for vps_list in data.values():
+            for record in vps_list:
+                self.add(record)
+
+    def get(self, container_name: str) -> Optional[VPSRecord]:
+        return self.by_name.get(container_name)
+
+    def owned_by(self, user_id: str) -> List[VPSRecord]:
+        return self.owners.get(str(user_id), [])
+
+    def shared_with(self, user_id: str) -> List[VPSRecord]:
+        return list(self._shared.get(str(user_id), {}).values())
+
+    def tagged(self, tag: str) -> List[VPSRecord]:
+        return list(self._tags.get(tag, {}).values())
+
+    def with_status(self, status: str) -> List[VPSRecord]:
+        return list(self._status.get(status, {}).values())
+
+    def on_node(self, node: str) -> List[VPSRecord]:
+        return list(self._node.get(node, {}).values())
+
+    def add(self, record: VPSRecord):
+        record.registry = self
+        self.owners.setdefault(record['user_id'], []).append(record)
+        self._file(record)
+
+    def remove(self, record: VPSRecord):
+        self._unfile(record)
+        vps_list = self.owners.get(record['user_id'], [])
+        if record in vps_list:
+            vps_list.remove(record)
+        if not vps_list:
+            self.owners.pop(record['user_id'], None)
+        record.registry = None
+
+    def reindex(self, record: VPSRecord):
+        """Refile a record after one of its indexed fields changed"""
+        keys = self._index_keys(record)
+        if id(record) not in self._keys:
+            self._file(record)
+            return
+        if self._keys[id(record)] == keys:
+            return
+        old_owner = self._keys[id(record)][0]
+        self._unfile(record)
+        if old_owner != record['user_id']:
+            vps_list = self.owners.get(old_owner, [])
+            vps_list.remove(record)
+            if not vps_list:
+                del self.owners[old_owner]
+            self.owners.setdefault(record['user_id'], []).append(record)
+        self._file(record)
+
+    @staticmethod
+    def _index_keys(record: VPSRecord) -> tuple:
+        return (record['user_id'], record['container_name'], record.get('status'),
+                frozenset(str(user) for user in record.peek_list('shared_with')),
+                frozenset(record.peek_list('tags')), record.get('node') or LOCAL_NODE)
+
+    def _file(self, record: VPSRecord):
+        keys = self._index_keys(record)
+        _, name, status, shared, tags, node = keys
+        self._keys[id(record)] = keys
+        self.by_name[name] = record
+        self._status[status][id(record)] = record
+        self._node[node][id(record)] = record
+        for user in shared:
+            self._shared[user][id(record)] = record
+        for tag in tags:
+            self._tags[tag][id(record)] = record
+
+    def _unfile(self, record: VPSRecord):
+        keys = self._keys.pop(id(record), None)
+        if keys is None:
+            return
+        _, name, status, shared, tags, node = keys
+        if self.by_name.get(name) is record:
+            del self.by_name[name]
+        for index, key_set in ((self._status, (status,)), (self._shared, shared), (self._tags, tags),
+                               (self._node, (node,))):
+            for key in key_set:
+                bucket = index.get(key)
+                if bucket is not None:
+                    bucket.pop(id(record), None)
+                    if not bucket:
+                        del index[key]
+
+vps_registry = VPSRegistry()
+
+def get_vps_data() -> Dict[str, List[VPSRecord]]:
+    rows = db.read('SELECT * FROM vps', label='get_vps_data')
     
     data = defaultdict(list)
     for row in rows:
-        user_id = row['user_id']
-        vps = dict(row)
-        vps['shared_with'] = json.loads(vps['shared_with'])
-        vps['suspension_history'] = json.loads(vps['suspension_history'])
-        vps['tags'] = json.loads(vps['tags'])
-        vps['suspended'] = bool(vps['suspended'])
-        vps['whitelisted'] = bool(vps['whitelisted'])
-        data[user_id].append(vps)
+        data[row['user_id']].append(VPSRecord.from_row(row))
     return dict(data)
 
 def get_admins() -> List[str]:
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT user_id FROM admins')
-    rows = cur.fetchall()
-    conn.close()
+    rows = db.read('SELECT user_id FROM admins', label='get_admins')
     return [row['user_id'] for row in rows]
 
-def save_vps_data():
-    conn = get_db()
-    cur = conn.cursor()
-    for user_id, vps_list in vps_data.items():
-        for vps in vps_list:
-            shared_json = json.dumps(vps['shared_with'])
-            history_json = json.dumps(vps['suspension_history'])
-            tags_json = json.dumps(vps.get('tags', []))
-            suspended_int = 1 if vps['suspended'] else 0
-            whitelisted_int = 1 if vps.get('whitelisted', False) else 0
-            
-            if 'id' not in vps or vps['id'] is None:
-                cur.execute('''INSERT INTO vps (user_id, container_name, ram, cpu, storage, bandwidth, config, 
-                               os_version, status, suspended, whitelisted, created_at, last_started, total_uptime,
-                               shared_with, suspension_history, tags, notes)
-                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                            (user_id, vps['container_name'], vps['ram'], vps['cpu'], vps['storage'],
-                             vps.get('bandwidth', 'Unlimited'), vps['config'], vps.get('os_version', 'ubuntu:24.04'),
-                             vps['status'], suspended_int, whitelisted_int, vps.get('created_at', datetime.now().isoformat()),
-                             vps.get('last_started'), vps.get('total_uptime', 0), shared_json, history_json,
-                             tags_json, vps.get('notes', '')))
-                vps['id'] = cur.lastrowid
-            else:
-                cur.execute('''UPDATE vps SET user_id=?, ram=?, cpu=?, storage=?, bandwidth=?, config=?, os_version=?, 
-                               status=?, suspended=?, whitelisted=?, last_started=?, total_uptime=?, shared_with=?, 
-                               suspension_history=?, tags=?, notes=? WHERE id=?''',
-                            (user_id, vps['ram'], vps['cpu'], vps['storage'], vps.get('bandwidth', 'Unlimited'),
-                             vps['config'], vps.get('os_version', 'ubuntu:24.04'), vps['status'], suspended_int,
-                             whitelisted_int, vps.get('last_started'), vps.get('total_uptime', 0),
-                             shared_json, history_json, tags_json, vps.get('notes', ''), vps['id']))
-    conn.commit()
-    conn.close()
-
-# Initialize
-init_db()
-vps_data = get_vps_data()
-admin_data = {'admins': get_admins()}
-
-# Global settings
-CPU_THRESHOLD = int(get_setting('cpu_threshold', 90))
-RAM_THRESHOLD = int(get_setting('ram_threshold', 90))
-DISK_THRESHOLD = int(get_setting('disk_threshold', 85))
+def add_vps(user_id: str, vps: dict) -> VPSRecord:
+    """Register a new VPS in vps_data; it is inserted on the next save"""
+    record = VPSRecord({**VPS_DEFAULTS, 'created_at': datetime.now().isoformat(), **vps, 'user_id': user_id, 'id': None})
+    vps_registry.add(record)
+    record.mark_dirty(*VPS_COLUMNS)
+    return record
+
+def remove_vps(container_name: str) -> bool:
+    """Drop a VPS from vps_data and delete its row"""
+    vps = vps_registry.get(container_name)
+    if vps is None:
+        return False
+    vps_registry.remove(vps)
+    dirty_vps.pop(id(vps), None)
+    db.execute('DELETE FROM vps WHERE container_name = ?', (container_name,), label='remove_vps')
+    return True
+
+def _vps_column_value(record: VPSRecord, column: str) -> Any:
+    if column in VPS_JSON_FIELDS:
+        value = record.raw(column)
+        # Undecoded fields are still the column text and are written back as-is
+        return value if isinstance(value, str) else json.dumps(list(value or []))
+    value = record.get(column, VPS_DEFAULTS.get(column))
+    if column in VPS_BOOL_FIELDS:
+        return 1 if value else 0
+    if column == 'created_at' and value is None:
+        return datetime.now().isoformat()
+    return value
+
+def save_vps_data(full: bool = False) -> concurrent.futures.Future:
+    """Persist changed VPS rows and columns in one transaction; full=True rewrites every row.
+
+    The returned future resolves once the write is committed.
+    """
+    if full:
+        for user_id, vps_list in vps_data.items():
+            for index, vps in enumerate(vps_list):
+                if not isinstance(vps, VPSRecord):
+                    vps_list[index] = vps = VPSRecord(vps)
+                    vps.registry = vps_registry
+                vps.set_raw('user_id', user_id)
+                vps.mark_dirty(*VPS_COLUMNS)
+
+    records = list(dirty_vps.values())
+    dirty_vps.clear()
+
+    inserts = []
+    updates = defaultdict(list)  # changed columns -> [(record, values)]
+    for record in records:
+        columns = tuple(column for column in VPS_COLUMNS if column in record.dirty)
+        record.dirty = set()
+        if record.get('id') is None and not record.inserting:
+            record.inserting = True
+            inserts.append((record, tuple(_vps_column_value(record, column) for column in VPS_COLUMNS)))
+        elif columns:
+            # Records still being inserted get their id from the earlier job (the writer is FIFO)
+            updates[columns].append((record, tuple(_vps_column_value(record, column) for column in columns)))
+
+    if not inserts and not updates:
+        future = concurrent.futures.Future()
+        future.set_result(0)
+        return future
+
+    def requeue(future: concurrent.futures.Future):
+        # The transaction was rolled back: mark everything dirty again for the next save
+        if future.exception() is None:
+            return
+        for record, _ in inserts:
+            record.set_raw('id', None)
+            record.inserting = False
+            if record.registry is not None:  # not removed in the meantime
+                dirty_vps[id(record)] = record
+        for columns, rows in updates.items():
+            for record, _ in rows:
+                record.dirty.update(columns)
+                if record.registry is not None:
+                    dirty_vps[id(record)] = record
+
+    def write(conn: sqlite3.Connection) -> int:
+        for record, values in inserts:
+            cursor = conn.execute(f'INSERT INTO vps ({", ".join(VPS_COLUMNS)}) '
+                                  f'VALUES ({", ".join("?" * len(VPS_COLUMNS))})', values)
+            record.set_raw('id', cursor.lastrowid)
+            record.inserting = False
+        for columns, rows in updates.items():
+            conn.executemany(f'UPDATE vps SET {", ".join(f"{column}=?" for column in columns)} WHERE id=?',
+                             [values + (record['id'],) for record, values in rows])
+        return len(inserts) + sum(len(rows) for rows in updates.values())
+
+    future = db.submit(write, label='save_vps_data')
+    try:
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda done: loop.call_soon_threadsafe(requeue, done))
+    except RuntimeError:
+        future.add_done_callback(requeue)
+    return future
+
+_vps_save_task: Optional[asyncio.Task] = None
+
+def schedule_save_vps_data():
+    """Debounced save: a burst of changes is coalesced into one write"""
+    global _vps_save_task
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if _vps_save_task is None or _vps_save_task.done():
+        _vps_save_task = asyncio.create_task(_debounced_vps_save())
+
+async def _debounced_vps_save():
+    while True:
+        started = time.monotonic()
+        generation = _vps_dirty_generation
+        while True:
+            await asyncio.sleep(VPS_SAVE_DEBOUNCE)
+            if generation == _vps_dirty_generation or time.monotonic() - started >= VPS_SAVE_MAX_DELAY:
+                break
+            generation = _vps_dirty_generation
+        try:
+            await asyncio.wrap_future(save_vps_data())
+        except Exception as e:
+            logger.error(f"Failed to save VPS data: {e}")
+        # Changes made while the write was in flight (or put back after it failed) found this task
+        # still running and did not schedule another save
+        if not dirty_vps:
+            break
+
+# Initialize (state itself is read by load_state() once the bot is connecting)
+db.open()
+vps_data = vps_registry.owners
+admin_data = {'admins': []}
+
+# Global settings (defaults until the settings table is loaded)
+CPU_THRESHOLD = 90
+RAM_THRESHOLD = 90
+DISK_THRESHOLD = 85
+
+def _update_threshold(key: str, value: int):
+    """Keep the module-level thresholds in step with live setting changes"""
+    global CPU_THRESHOLD, RAM_THRESHOLD, DISK_THRESHOLD
+    if key == 'cpu_threshold':
+        CPU_THRESHOLD = value
+    elif key == 'ram_threshold':
+        RAM_THRESHOLD = value
+    elif key == 'disk_threshold':
+        DISK_THRESHOLD = value
+
+for _key in ('cpu_threshold', 'ram_threshold', 'disk_threshold'):
+    settings.subscribe(_key, _update_threshold)
+
+def load_state():
+    """Migrate the schema and read the fleet, admins, settings, nodes and port forwards into memory.
+
+    Blocking; Startup runs it on a worker thread so the gateway connection is not held up.
+    """
+    global CPU_THRESHOLD, RAM_THRESHOLD, DISK_THRESHOLD
+    init_db()
+    vps_registry.load(get_vps_data())
+    admin_data['admins'] = get_admins()
+    settings.load()
+    CPU_THRESHOLD = settings.get('cpu_threshold', 90)
+    RAM_THRESHOLD = settings.get('ram_threshold', 90)
+    DISK_THRESHOLD = settings.get('disk_threshold', 85)
+    nodes.load()
+    port_forwards.load()
 
 # ==================== BOT SETUP ====================
 intents = discord.Intents.default()
@@ -313,7 +1786,22 @@ intents.message_content = True
 intents.members = True
 intents.presences = True
 
-bot = commands.Bot(
+class XeloraBot(commands.Bot):
+    async def setup_hook(self):
+        # Runs before the gateway connects, so only schedule the state load here
+        startup.begin()
+
+    async def close(self):
+        await log_sender.drain()
+        await nodes.close()
+        if _vps_save_task and not _vps_save_task.done():
+            _vps_save_task.cancel()
+        save_vps_data()
+        audit_log.flush()
+        await super().close()
+        await asyncio.to_thread(db.close)
+
+bot = XeloraBot(
     command_prefix=PREFIX,
     intents=intents,
     help_command=None,
@@ -352,6 +1840,215 @@ def add_field(embed, name, value, inline=False):
     embed.add_field(name=f"▸ {name}", value=str(value)[:1024], inline=inline)
     return embed
 
+# ==================== DISCORD LOG CHANNEL ====================
+class RateLimitCounter(logging.Filter):
+    """Counts the 429 responses discord.py reports while retrying internally"""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def filter(self, record):
+        if '429' in str(record.msg):
+            self.count += 1
+        return True
+
+discord_429s = RateLimitCounter()
+logging.getLogger('discord.http').addFilter(discord_429s)
+
+class DiscordLogSender:
+    """Buffers log-channel embeds, packs up to 10 per message and paces sends below the channel rate limit.
+
+    Under overload, low-priority events are shed first and replaced by a
+    one-line summary embed; high-priority events are only dropped if the
+    queue is full of them.
+    """
+
+    MAX_EMBEDS = 10
+    MAX_EMBED_CHARS = 6000  # Discord's limit on the combined size of one message's embeds
+
+    def __init__(self, channel_id: int, rate: int = 5, per: float = 5.0, max_queue: int = 500,
+                 coalesce_delay: float = 1.0):
+        self.channel_id = channel_id
+        self.rate = rate
+        self.per = per
+        self.max_queue = max_queue
+        self.coalesce_delay = coalesce_delay
+        self.sent_messages = 0
+        self.sent_embeds = 0
+        self.dropped = 0
+        self.failed = 0
+        self._high: deque = deque()
+        self._low: deque = deque()
+        self._suppressed: Dict[str, int] = defaultdict(int)
+        self._suppressed_by_priority: Dict[str, int] = defaultdict(int)
+        self._send_times: deque = deque(maxlen=rate)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._high) + len(self._low)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': self.depth,
+            'sent_messages': self.sent_messages,
+            'sent_embeds': self.sent_embeds,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'rate_limited': discord_429s.count,
+        }
+
+    def enqueue(self, embed: discord.Embed, priority: str = 'low'):
+        if self.channel_id == 0:
+            return
+        if self.depth >= self.max_queue:
+            if priority == 'low':
+                victim, victim_priority = embed, 'low'
+            elif self._low:
+                victim, victim_priority = self._low.popleft(), 'low'
+            else:
+                victim, victim_priority = self._high.popleft(), 'high'
+            self._suppressed[(victim.title or 'Untitled').split(' | ', 1)[-1]] += 1
+            self._suppressed_by_priority[victim_priority] += 1
+            self.dropped += 1
+            if victim is embed:
+                self._start()
+                return
+        (self._high if priority == 'high' else self._low).append(embed)
+        self._start()
+
+    def _start(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _summary_embed(self) -> Optional[discord.Embed]:
+        if not self._suppressed:
+            return None
+        counts = ' and '.join(f"{self._suppressed_by_priority[priority]} {priority}-priority"
+                              for priority in ('high', 'low') if self._suppressed_by_priority[priority])
+        top = sorted(self._suppressed.items(), key=lambda item: item[1], reverse=True)[:10]
+        lines = "\n".join(f"• {title} ×{count}" for title, count in top)
+        self._suppressed.clear()
+        self._suppressed_by_priority.clear()
+        return create_embed("⚠️ Log Events Suppressed",
+                            f"{counts} events were dropped while the log channel was overloaded:\n{lines}",
+                            'warning')
+
+    async def _pace(self):
+        """Wait until sending one more message stays within `rate` messages per `per` seconds"""
+        if len(self._send_times) == self.rate:
+            wait = self.per - (time.monotonic() - self._send_times[0])
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def _run(self):
+        while True:
+            if not self.depth and not self._suppressed:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=60)
+                except asyncio.TimeoutError:
+                    return
+                continue
+
+            # Give a burst a moment to accumulate so it leaves as few messages as possible
+            await asyncio.sleep(self.coalesce_delay)
+            await self._send_next()
+
+    async def _send_next(self):
+        """Send one paced message with the summary and as many queued embeds as fit"""
+        # Resolve the channel before taking anything off the queue, so an unready cache loses nothing
+        channel = bot.get_channel(self.channel_id)
+        if channel is None:
+            try:
+                channel = await bot.fetch_channel(self.channel_id)
+            except Exception as e:
+                logger.warning(f"Log channel {self.channel_id} unavailable, keeping {self.depth} events queued: {e}")
+                await asyncio.sleep(self.per)
+                return
+        await self._pace()
+        embeds = []
+        summary = self._summary_embed()
+        if summary:
+            embeds.append(summary)
+        size = sum(len(embed) for embed in embeds)
+        for source in (self._high, self._low):
+            # An embed that would overflow the message waits for the next send
+            while source and len(embeds) < self.MAX_EMBEDS and \
+                    (not embeds or size + len(source[0]) <= self.MAX_EMBED_CHARS):
+                size += len(source[0])
+                embeds.append(source.popleft())
+            if source:
+                break  # don't let low-priority events overtake a high-priority one that didn't fit
+
+        try:
+            self._send_times.append(time.monotonic())
+            await channel.send(embeds=embeds)
+            self.sent_messages += 1
+            self.sent_embeds += len(embeds)
+        except Exception as e:
+            self.failed += len(embeds)
+            logger.error(f"Failed to send log to Discord: {e}")
+
+    async def drain(self, timeout: float = 15.0):
+        """Send everything still queued (on shutdown), giving up after `timeout` seconds"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+        async def send_all():
+            while self.depth or self._suppressed:
+                await self._send_next()
+
+        try:
+            await asyncio.wait_for(send_all(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Gave up sending {self.depth} queued log events on shutdown")
+
+log_sender = DiscordLogSender(LOG_CHANNEL_ID, max_queue=LOG_QUEUE_MAX)
+
+@metrics.collector
+def collect_discord_metrics() -> List[Metric]:
+    stats = log_sender.stats()
+    sends = metrics.counter('discord_log_messages_total', 'Log channel messages by result', ('result',),
+                            register=False)
+    sends.inc(stats['sent_messages'], result='sent')
+    sends.inc(stats['failed'], result='failed')
+    sends.inc(stats['dropped'], result='dropped')
+    embeds = metrics.counter('discord_log_embeds_total', 'Embeds delivered to the log channel', register=False)
+    embeds.inc(stats['sent_embeds'])
+    queued = metrics.gauge('discord_log_queue_depth', 'Log events waiting to be sent', register=False)
+    queued.set(stats['queued'])
+    rate_limited = metrics.counter('discord_rate_limited_total', '429 responses from the Discord API',
+                                   register=False)
+    rate_limited.inc(stats['rate_limited'])
+    latency = metrics.gauge('discord_gateway_latency_seconds', 'Gateway heartbeat latency', register=False)
+    if bot.latency == bot.latency:  # NaN until the gateway connects
+        latency.set(bot.latency)
+    return [sends, embeds, queued, rate_limited, latency]
+
+async def send_log_to_discord(title: str, description: str, color: str = 'info', fields: dict = None,
+                              priority: Optional[str] = None):
+    """Queue a log message for the Discord log channel"""
+    if LOG_CHANNEL_ID == 0:
+        return
+    
+    try:
+        embed = create_embed(title, description, color)
+        
+        if fields:
+            for name, value in fields.items():
+                add_field(embed, name, value, True)
+        
+        log_sender.enqueue(embed, priority or ('high' if color in ('error', 'warning') else 'low'))
+    except Exception as e:
+        logger.error(f"Failed to send log to Discord: {e}")
+
 # ==================== HELPER FUNCTIONS ====================
 def is_admin():
     async def predicate(ctx):
@@ -370,6 +2067,9 @@ def is_main_admin():
 
 async def execute_lxc(command, timeout=120):
     """Execute LXC commands with enhanced error handling"""
+    started = time.monotonic()
+    outcome = 'error'
+    cmd = []
     try:
         cmd = shlex.split(command)
         proc = await asyncio.create_subprocess_exec(
@@ -384,16 +2084,229 @@ async def execute_lxc(command, timeout=120):
             error = stderr.decode().strip() if stderr else "Command failed"
             raise Exception(error)
         
+        outcome = 'ok'
         return stdout.decode().strip() if stdout else True
     except asyncio.TimeoutError:
+        outcome = 'timeout'
         logger.error(f"LXC timeout: {command}")
         raise asyncio.TimeoutError(f"⏱️ Command timed out after {timeout}s")
     except Exception as e:
         logger.error(f"LXC error: {command} - {e}")
         raise
+    finally:
+        lxc_command_seconds.observe(time.monotonic() - started,
+                                    subcommand=cmd[1] if len(cmd) > 1 else 'unknown', outcome=outcome)
+
+# ==================== USER RESOLUTION ====================
+class UserResolver:
+    """Resolve Discord user IDs without a REST call per lookup.
+
+    Order: gateway cache (bot.get_user) -> TTL'd LRU -> REST fetch_user.
+    Unknown users are cached negatively for a shorter TTL, concurrent
+    lookups for the same ID share one request, and REST misses are
+    limited by a semaphore so bulk listings don't burn the global rate limit.
+    """
+
+    def __init__(self, size: int, ttl: int, negative_ttl: int, concurrency: int):
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.concurrency = concurrency
+        self.hits = 0
+        self.fetches = 0
+        self._cache: OrderedDict = OrderedDict()  # user_id -> (expires_at, user or None)
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _cached(self, user_id: int):
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return False, None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._cache[user_id]
+            return False, None
+        self._cache.move_to_end(user_id)
+        return True, user
+
+    def _store(self, user_id: int, user):
+        ttl = self.ttl if user is not None else self.negative_ttl
+        self._cache[user_id] = (time.monotonic() + ttl, user)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, user_id: int):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            self.fetches += 1
+            try:
+                user = await bot.fetch_user(user_id)
+            except discord.NotFound:
+                user = None
+        self._store(user_id, user)
+        return user
+
+    async def resolve(self, user_id) -> Optional[discord.User]:
+        """Return the user, or None if Discord doesn't know the ID"""
+        user_id = int(user_id)
+        user = bot.get_user(user_id)
+        if user is not None:
+            self.hits += 1
+            return user
+        found, user = self._cached(user_id)
+        if found:
+            self.hits += 1
+            return user
+        if user_id not in self._inflight:
+            task = asyncio.ensure_future(self._fetch(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await asyncio.shield(self._inflight[user_id])
+
+    async def resolve_many(self, user_ids) -> Dict[int, Optional[discord.User]]:
+        """Resolve several IDs concurrently; transient errors resolve to None"""
+        ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        results = await asyncio.gather(*(self.resolve(user_id) for user_id in ids), return_exceptions=True)
+        return {user_id: None if isinstance(result, Exception) else result
+                for user_id, result in zip(ids, results)}
+
+user_resolver = UserResolver(USER_CACHE_SIZE, USER_CACHE_TTL, USER_NEGATIVE_TTL, USER_FETCH_CONCURRENCY)
+
+# ==================== FLEET STATUS CACHE ====================
+def parse_instance_snapshot(instance: dict) -> Dict[str, Any]:
+    """Flatten an LXD instance (recursion=2 / `lxc list --format json`) into a status record"""
+    state = instance.get('state') or {}
+    memory = state.get('memory') or {}
+    root_disk = (state.get('disk') or {}).get('root') or {}
+    rx = tx = 0
+    for nic_name, nic in (state.get('network') or {}).items():
+        if nic_name == 'lo':
+            continue
+        counters = nic.get('counters') or {}
+        rx += counters.get('bytes_received', 0)
+        tx += counters.get('bytes_sent', 0)
+    return {
+        'name': instance.get('name'),
+        'status': (instance.get('status') or state.get('status') or 'unknown').lower(),
+        'cpu_usage_ns': (state.get('cpu') or {}).get('usage', 0),
+        'memory_usage': memory.get('usage', 0),
+        'memory_total': memory.get('total', 0),
+        'disk_usage': root_disk.get('usage', 0),
+        'disk_total': root_disk.get('total', 0),
+        'network_rx': rx,
+        'network_tx': tx,
+        'config': instance.get('expanded_config') or instance.get('config') or {},
+    }
+
+class FleetSnapshot:
+    """Shared TTL cache of every instance's state, refreshed by one bulk listing"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.fetched_at = 0.0
+        self.refreshes = 0
+        self.failed_nodes: set = set()  # nodes whose entries are carried over from an earlier listing
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Optional[asyncio.Future] = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at if self.fetched_at else float('inf')
+
+    def __len__(self):
+        return len(self._data)
+
+    def invalidate(self):
+        self.fetched_at = 0.0
+
+    async def get(self, max_age: Optional[float] = None, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Return the snapshot, refreshing it if stale; concurrent callers share one refresh"""
+        limit = self.ttl if max_age is None else max_age
+        if not force and self.age < limit:
+            return self._data
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh())
+        # Shield so a cancelled caller does not abort the refresh the others are waiting on
+        return await asyncio.shield(self._inflight)
+
+    def set_status(self, name: str, status: Optional[str]):
+        """Apply a status change reported by the events stream; None forgets the instance"""
+        if status is None:
+            self._data.pop(name, None)
+        elif name in self._data:
+            self._data[name]['status'] = status
+
+    async def get_instance(self, name: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        return (await self.get(max_age=max_age)).get(name)
+
+    def peek(self, name: str) -> Optional[Dict[str, Any]]:
+        """Last known entry for an instance, without refreshing"""
+        return self._data.get(name)
+
+    @staticmethod
+    async def _list(node: 'Node') -> List[dict]:
+        if node.client.available:
+            try:
+                return await node.client.list_instances(recursion=2)
+            except Exception as e:
+                if not node.client.cli_fallback:
+                    raise
+                logger.warning(f"LXD API listing failed, falling back to CLI: {e}")
+        return json.loads(await execute_lxc("lxc list --format json"))
+
+    async def _refresh(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            members = list(nodes)
+            listings = await asyncio.gather(*(self._list(node) for node in members), return_exceptions=True)
+            if all(isinstance(listing, Exception) for listing in listings):
+                raise listings[0]
+            data = {}
+            failed = set()
+            for node, listing in zip(members, listings):
+                if isinstance(listing, Exception):
+                    # Keep what we last knew about an unreachable node rather than reporting its VPSes gone
+                    logger.warning(f"Listing instances on {node.name} failed: {listing}")
+                    data.update((name, inst) for name, inst in self._data.items() if inst.get('node') == node.name)
+                    failed.add(node.name)
+                    continue
+                for inst in listing:
+                    data[inst['name']] = {**parse_instance_snapshot(inst), 'node': node.name}
+            self._data = data
+            self.failed_nodes = failed
+            self.fetched_at = time.monotonic()
+            self.refreshes += 1
+            return self._data
+        finally:
+            self._inflight = None
+
+fleet_snapshot = FleetSnapshot(STATUS_CACHE_TTL)
 
 async def get_container_status(container_name):
     """Get container status with caching"""
+    # While subscribed to LXD events the registry is kept current without polling
+    vps = vps_registry.get(container_name)
+    if vps is not None and nodes.node_of(container_name).events.connected:
+        return vps['status']
+    try:
+        instance = await fleet_snapshot.get_instance(container_name)
+        if instance:
+            return instance['status']
+    except Exception as e:
+        logger.warning(f"Fleet snapshot unavailable: {e}")
+    # Not in the snapshot yet (e.g. just created) - ask for this container directly
+    client = lxd_for(container_name)
+    if client.available:
+        try:
+            state = await client.get_instance_state(container_name)
+            return (state.get('status') or 'unknown').lower()
+        except Exception as e:
+            if not client.cli_fallback:
+                # The CLI talks to the local host, which doesn't have this container
+                logger.warning(f"LXD API status lookup failed for {container_name}: {e}")
+                return "unknown"
+            logger.warning(f"LXD API status lookup failed for {container_name}, falling back to CLI: {e}")
     try:
         result = await execute_lxc(f"lxc info {container_name}")
         for line in result.splitlines():
@@ -403,102 +2316,2138 @@ async def get_container_status(container_name):
     except:
         return "unknown"
 
-async def apply_lxc_config(container_name):
-    """Apply enhanced LXC configuration for Docker/Kubernetes support"""
-    try:
-        configs = [
-            f"lxc config set {container_name} security.nesting true",
-            f"lxc config set {container_name} security.privileged true",
-            f"lxc config set {container_name} security.syscalls.intercept.mknod true",
-            f"lxc config set {container_name} security.syscalls.intercept.setxattr true",
-            f"lxc config set {container_name} linux.kernel_modules overlay,loop,nf_nat,ip_tables,ip6_tables,netlink_diag,br_netfilter,iptable_nat,ip6table_nat",
-        ]
-        
-        for config in configs:
-            try:
-                await execute_lxc(config)
-            except:
-                pass
-        
-        # Add devices
+# ==================== LXD EVENTS ====================
+LIFECYCLE_STATUS = {
+    'instance-started': 'running',
+    'instance-resumed': 'running',
+    'instance-restarted': 'running',
+    'instance-stopped': 'stopped',
+    'instance-shutdown': 'stopped',
+    'instance-paused': 'frozen',
+}
+
+def apply_vps_status(vps: VPSRecord, status: str, restarted: bool = False):
+    """Move a VPS to `status`, keeping last_started and total_uptime (seconds) in step"""
+    now = datetime.now()
+    was_running = vps['status'] == 'running'
+    if was_running and (status != 'running' or restarted) and vps['last_started']:
         try:
-            await execute_lxc(f"lxc config device add {container_name} fuse unix-char path=/dev/fuse")
-        except:
+            elapsed = (now - datetime.fromisoformat(vps['last_started'])).total_seconds()
+            vps['total_uptime'] = int(vps['total_uptime'] or 0) + max(int(elapsed), 0)
+        except ValueError:
             pass
-        
-        # Raw LXC config for maximum compatibility
-        raw_lxc = """lxc.apparmor.profile = unconfined
+    if status == 'running' and (not was_running or restarted):
+        vps['last_started'] = now.isoformat()
+    if vps['status'] != status:
+        vps['status'] = status
+
+class LXDEventListener:
+    """Keeps VPS status current from LXD lifecycle events instead of polling.
+
+    Subscribes to /1.0/events (or `lxc monitor` without the API socket),
+    resyncs from a full listing after every (re)connect so nothing missed
+    while disconnected is lost, and relies on the debounced VPS save to
+    batch the resulting writes.
+    """
+
+    def __init__(self, node: str = LOCAL_NODE, client: Optional[LXDClient] = None):
+        self.node = node
+        self.client = client or lxd
+        self.connected = False
+        self.events = 0
+        self.reconnects = 0
+        self.last_event_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self.connected = False
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                async for event in self._stream():
+                    if event is None:
+                        # Subscribed: anything that happened before now comes from the listing
+                        await self.resync()
+                        self.connected = True
+                        delay = 1.0
+                        continue
+                    self.handle(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"LXD event stream error on {self.node}: {e}")
+            if self.connected:
+                logger.warning(f"📡 LXD event stream of {self.node} disconnected, reconnecting")
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, 60.0)
+
+    async def _stream(self):
+        """Yield None once subscribed, then each lifecycle event"""
+        if self.client.available:
+            async for event in self.client.events('lifecycle'):
+                yield event
+            return
+        proc = await asyncio.create_subprocess_exec(
+            'lxc', 'monitor', '--type=lifecycle', '--format=json',
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            yield None
+            async for line in proc.stdout:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+    async def resync(self):
+        """Reconcile every VPS on this node with a fresh listing"""
+        snapshot = await fleet_snapshot.get(force=True)
+        changed = 0
+        for vps in vps_registry.on_node(self.node):
+            instance = snapshot.get(vps['container_name'])
+            if instance and instance['status'] != vps['status']:
+                apply_vps_status(vps, instance['status'])
+                changed += 1
+        logger.info(f"📡 LXD events of {self.node} subscribed; resync updated {changed} VPS")
+
+    def handle(self, event: dict):
+        metadata = event.get('metadata') or {}
+        action = metadata.get('action', '')
+        name = (metadata.get('source') or '').split('?')[0].rsplit('/', 1)[-1]
+        if not action.startswith('instance-') or not name:
+            return
+        self.events += 1
+        self.last_event_at = datetime.now()
+        lxd_events_total.inc(action=action)
+
+        if action == 'instance-renamed':
+            old_name = (metadata.get('context') or {}).get('old_name')
+            fleet_snapshot.invalidate()
+            vps = vps_registry.get(old_name) if old_name else None
+            if vps is not None and vps['node'] == self.node:
+                vps['container_name'] = name
+                port_forwards.rename_container(old_name, name)
+            return
+        vps = vps_registry.get(name)
+        if vps is not None and vps['node'] != self.node:
+            return  # same name on another host, not ours
+        if action == 'instance-deleted':
+            fleet_snapshot.set_status(name, None)
+            if vps is not None:
+                apply_vps_status(vps, 'stopped')
+                asyncio.create_task(send_log_to_discord(
+                    "⚠️ Container Deleted Outside the Bot", f"`{name}` no longer exists in LXD", 'warning'))
+            return
+        status = LIFECYCLE_STATUS.get(action)
+        if status is None:
+            return
+        fleet_snapshot.set_status(name, status)
+        if vps is not None:
+            apply_vps_status(vps, status, restarted=action == 'instance-restarted')
+
+lxd_events_total = metrics.counter('lxd_events_total', 'LXD lifecycle events handled', ('action',))
+lxd_events = LXDEventListener(LOCAL_NODE, lxd)
+
+# ==================== NODES ====================
+class Node:
+    """An LXD host VPSes can be placed on, with its own connection pool and event stream.
+
+    Capacity columns left at zero fall back to the live totals LXD reports;
+    `enabled` only controls whether new VPSes may be placed here.
+    """
+
+    def __init__(self, name: str, endpoint: str, storage_pool: str = 'default', public_ip: str = None,
+                 ram_gb: float = 0, cpu_cores: float = 0, storage_gb: float = 0, server_cert: str = None,
+                 enabled: bool = True):
+        self.name = name
+        self.endpoint = endpoint
+        self.storage_pool = storage_pool or 'default'
+        self.public_ip = public_ip or YOUR_SERVER_IP
+        self.ram_gb = ram_gb or 0
+        self.cpu_cores = cpu_cores or 0
+        self.storage_gb = storage_gb or 0
+        self.enabled = enabled
+        if name == LOCAL_NODE:
+            self.client, self.events = lxd, lxd_events
+        else:
+            self.client = LXDClient(endpoint, pool_size=LXD_POOL_SIZE, server_cert=server_cert, cli_fallback=False)
+            self.events = LXDEventListener(name, self.client)
+        self.resources: Dict[str, float] = {}
+        self.online = True
+        self.error: Optional[str] = None
+        self.checked_at = 0.0
+
+    @property
+    def local(self) -> bool:
+        return self.name == LOCAL_NODE
+
+    def capacity(self) -> tuple:
+        """(RAM GB, CPU cores, storage GB) placements may allocate, overcommit included"""
+        return ((self.ram_gb or self.resources.get('ram_gb', 0)) * NODE_RAM_OVERCOMMIT,
+                (self.cpu_cores or self.resources.get('cpu_cores', 0)) * NODE_CPU_OVERCOMMIT,
+                self.storage_gb or self.resources.get('storage_gb', 0))
+
+    def allocated(self) -> tuple:
+        """(RAM GB, CPU cores, storage GB) promised to the VPSes on this node"""
+        ram = cpu = storage = 0.0
+        for vps in vps_registry.on_node(self.name):
+            ram += parse_size_gb(vps['ram'])
+            cpu += parse_size_gb(vps['cpu'], 1.0)
+            storage += parse_size_gb(vps['storage'])
+        return ram, cpu, storage
+
+    async def _lxd_totals(self) -> tuple:
+        resources, pool = await asyncio.gather(
+            self.client.request('GET', '/1.0/resources', timeout=15),
+            self.client.request('GET', f"/1.0/storage-pools/{self.storage_pool}/resources", timeout=15))
+        memory = resources.get('memory') or {}
+        space = (pool or {}).get('space') or {}
+        return (memory.get('total', 0), memory.get('used', 0), (resources.get('cpu') or {}).get('total', 0),
+                space.get('total', 0), space.get('used', 0))
+
+    async def refresh(self):
+        """Fetch live totals and free space from LXD; the local host falls back to psutil"""
+        try:
+            totals = None
+            if self.client.available:
+                try:
+                    totals = await self._lxd_totals()
+                except Exception as e:
+                    if not self.local:
+                        raise
+                    logger.debug(f"LXD resources unavailable locally, using psutil: {e}")
+            if totals is None:
+                memory, disk = psutil.virtual_memory(), psutil.disk_usage('/')
+                totals = (memory.total, memory.total - memory.available, psutil.cpu_count(), disk.total, disk.used)
+            ram_total, ram_used, cores, storage_total, storage_used = totals
+            self.resources = {
+                'ram_gb': ram_total / 1024 ** 3,
+                'ram_free_gb': (ram_total - ram_used) / 1024 ** 3,
+                'cpu_cores': float(cores or 0),
+                'storage_gb': storage_total / 1024 ** 3,
+                'storage_free_gb': (storage_total - storage_used) / 1024 ** 3,
+            }
+            if not self.online:
+                logger.info(f"🖥️ Node {self.name} is back online")
+            self.online, self.error = True, None
+        except Exception as e:
+            if self.online:
+                logger.warning(f"🖥️ Node {self.name} is unreachable: {e}")
+            self.online, self.error = False, str(e)[:200]
+        self.checked_at = time.monotonic()
+
+    def fit(self, ram_gb: float, cpu: float, storage_gb: float, pending: tuple = (0, 0, 0)) -> Optional[tuple]:
+        """(fits, slack) for placing a request here, or None if the node takes no new VPSes.
+
+        slack is the capacity share left over after placing it, summed over
+        RAM/CPU/storage: lower is a tighter fit, negative means overcommitted.
+        """
+        if not (self.enabled and self.online):
+            return None
+        fits = not self.resources or (self.resources['ram_free_gb'] >= ram_gb
+                                      and self.resources['storage_free_gb'] >= storage_gb)
+        slack = 0.0
+        for total, used, reserved, wanted in zip(self.capacity(), self.allocated(), pending, (ram_gb, cpu, storage_gb)):
+            if total <= 0:
+                continue  # unknown capacity in this dimension
+            left = total - used - reserved - wanted
+            fits = fits and left >= 0
+            slack += left / total
+        return fits, slack
+
+def cert_fingerprint(pem: str) -> str:
+    """SHA-256 fingerprint of a PEM certificate (or a path to one), as `lxc info` shows it"""
+    if not pem.lstrip().startswith('-----BEGIN'):
+        with open(pem) as f:
+            pem = f.read()
+    return hashlib.sha256(ssl.PEM_cert_to_DER_cert(pem)).hexdigest()
+
+class NodeRegistry:
+    """Known LXD hosts: best-fit placement of new VPSes and routing of calls to the owning node"""
+
+    def __init__(self):
+        self.nodes: Dict[str, Node] = {}
+        self._pending: Dict[str, tuple] = {}  # container_name -> (node, (ram, cpu, storage)) while deploying
+        self.placements: Dict[str, int] = defaultdict(int)
+
+    def __iter__(self):
+        return iter(list(self.nodes.values()))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get(self, name: str) -> Optional[Node]:
+        return self.nodes.get(name)
+
+    @property
+    def local(self) -> Node:
+        return self.nodes[LOCAL_NODE]
+
+    def load(self):
+        nodes = {LOCAL_NODE: self.nodes.get(LOCAL_NODE) or Node(LOCAL_NODE, LXD_SOCKET, DEFAULT_STORAGE_POOL)}
+        for row in db.read('SELECT * FROM nodes', label='load_nodes'):
+            if row['name'] != LOCAL_NODE:
+                nodes[row['name']] = Node(row['name'], row['endpoint'], row['storage_pool'], row['public_ip'],
+                                          row['ram_gb'], row['cpu_cores'], row['storage_gb'], row['server_cert'],
+                                          bool(row['enabled']))
+        self.nodes = nodes
+
+    async def add(self, name: str, endpoint: str, storage_pool: str = 'default', public_ip: str = None,
+                  ram_gb: float = 0, cpu_cores: float = 0, storage_gb: float = 0, server_cert: str = None) -> Node:
+        """Register a node after checking it answers; raises ValueError if it can't be used"""
+        if name in self.nodes:
+            raise ValueError(f"Node `{name}` already exists")
+        node = Node(name, endpoint, storage_pool, public_ip, ram_gb, cpu_cores, storage_gb, server_cert)
+        if node.client.remote and not server_cert:
+            try:
+                server_cert = node.client.server_cert = await node.client.fetch_server_cert()
+            except (OSError, ssl.SSLError) as e:
+                raise ValueError(f"Node `{name}` is unreachable: {e}")
+            logger.info(f"🔐 Pinned TLS certificate of node {name} ({cert_fingerprint(server_cert)})")
+        await node.refresh()
+        if not node.online:
+            await node.client.close()
+            raise ValueError(f"Node `{name}` is unreachable: {node.error}")
+        await asyncio.wrap_future(db.execute(
+            'INSERT INTO nodes (name, endpoint, storage_pool, public_ip, ram_gb, cpu_cores, storage_gb, server_cert, '
+            'enabled, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)',
+            (name, endpoint, storage_pool, public_ip, ram_gb, cpu_cores, storage_gb, server_cert,
+             datetime.now().isoformat()), label='add_node'))
+        self.nodes[name] = node
+        node.events.start()
+        return node
+
+    async def remove(self, name: str):
+        """Forget an empty node"""
+        node = self.nodes.get(name)
+        if node is None or node.local:
+            raise ValueError(f"Node `{name}` does not exist" if node is None else "The local node can't be removed")
+        if vps_registry.on_node(name):
+            raise ValueError(f"Node `{name}` still hosts {len(vps_registry.on_node(name))} VPS")
+        del self.nodes[name]
+        await asyncio.wrap_future(db.execute('DELETE FROM nodes WHERE name = ?', (name,), label='remove_node'))
+        await node.events.stop()
+        await node.client.close()
+
+    def set_enabled(self, name: str, enabled: bool):
+        """Allow or stop new placements on a node (existing VPSes are unaffected)"""
+        node = self.nodes.get(name)
+        if node is None:
+            raise ValueError(f"Node `{name}` does not exist")
+        node.enabled = enabled
+        if not node.local:
+            db.execute('UPDATE nodes SET enabled = ? WHERE name = ?', (int(enabled), name), label='set_node_enabled')
+
+    def is_placing(self, container_name: str) -> bool:
+        """Whether a container is mid-deploy (created in LXD but not yet registered)"""
+        return container_name in self._pending
+
+    def node_of(self, container_name: str) -> Node:
+        """The node hosting (or about to host) a container; unknown names are local"""
+        vps = vps_registry.get(container_name)
+        if vps is not None:
+            name = vps['node']
+        elif container_name in self._pending:
+            name = self._pending[container_name][0]
+        else:
+            name = (fleet_snapshot.peek(container_name) or {}).get('node')
+        return self.nodes.get(name) or self.local
+
+    def client_for(self, container_name: str) -> LXDClient:
+        return self.node_of(container_name).client
+
+    async def place(self, container_name: str, ram_gb: float, cpu: float, storage_gb: float) -> Node:
+        """Reserve a node for a new container until release().
+
+        Best fit: of the nodes with room, the one left with the least spare
+        capacity, so large requests still find an emptier node later. If none
+        has room the least loaded node is overcommitted rather than failing the
+        deploy; raises only when no node accepts new VPSes.
+        """
+        stale = [node for node in self if time.monotonic() - node.checked_at > NODE_HEALTH_INTERVAL]
+        if stale:
+            await asyncio.gather(*(node.refresh() for node in stale))
+        fitting, overcommitted = [], []
+        for node in self:
+            result = node.fit(ram_gb, cpu, storage_gb, self._reserved(node.name))
+            if result is not None:
+                fits, slack = result
+                (fitting if fits else overcommitted).append((slack, node.name, node))
+        if fitting:
+            node = min(fitting)[2]
+        elif overcommitted:
+            node = max(overcommitted, key=lambda entry: (entry[0], entry[1]))[2]
+            logger.warning(f"🖥️ No node has room for {container_name}; overcommitting {node.name}")
+        else:
+            raise RuntimeError("No online node accepts new VPSes")
+        self._pending[container_name] = (node.name, (ram_gb, cpu, storage_gb))
+        self.placements[node.name] += 1
+        logger.info(f"🖥️ Placed {container_name} on {node.name}")
+        return node
+
+    def _reserved(self, node_name: str) -> tuple:
+        """Resources held by deploys to `node_name` that are not registered VPSes yet"""
+        reserved = [0.0, 0.0, 0.0]
+        for name, request in self._pending.values():
+            if name == node_name:
+                reserved = [total + value for total, value in zip(reserved, request)]
+        return tuple(reserved)
+
+    def release(self, container_name: str):
+        """Drop a placement reservation once the VPS is registered (or its deploy failed)"""
+        self._pending.pop(container_name, None)
+
+    def start_events(self):
+        for node in self:
+            node.events.start()
+
+    async def close(self):
+        for node in self:
+            await node.events.stop()
+            await node.client.close()
+
+@metrics.collector
+def collect_node_metrics() -> List[Metric]:
+    online = metrics.gauge('node_online', 'Whether a node answered its last health check', ('node',), register=False)
+    hosted = metrics.gauge('node_vps', 'VPSes placed on a node', ('node',), register=False)
+    ratio = metrics.gauge('node_allocated_ratio', 'Allocated share of node capacity', ('node', 'resource'),
+                          register=False)
+    for node in nodes:
+        online.set(1 if node.online else 0, node=node.name)
+        hosted.set(len(vps_registry.on_node(node.name)), node=node.name)
+        for resource, total, used in zip(('ram', 'cpu', 'storage'), node.capacity(), node.allocated()):
+            if total > 0:
+                ratio.set(used / total, node=node.name, resource=resource)
+    return [online, hosted, ratio]
+
+def lxd_for(container_name: str) -> LXDClient:
+    """API client of the node that owns `container_name`"""
+    return nodes.client_for(container_name)
+
+nodes = NodeRegistry()
+
+# ==================== CONTAINER CONFIGURATION ====================
+XELORACLOUD_PROFILE = 'xeloracloud'
+
+# Docker/Kubernetes-friendly settings applied to every VPS
+CONTAINER_CONFIG = {
+    'security.nesting': 'true',
+    'security.privileged': 'true',
+    'security.syscalls.intercept.mknod': 'true',
+    'security.syscalls.intercept.setxattr': 'true',
+    'linux.kernel_modules': 'overlay,loop,nf_nat,ip_tables,ip6_tables,netlink_diag,br_netfilter,iptable_nat,ip6table_nat',
+    # Raw LXC config for maximum compatibility
+    'raw.lxc': """lxc.apparmor.profile = unconfined
 lxc.cgroup.devices.allow = a
 lxc.cap.drop =
-lxc.mount.auto = proc:rw sys:rw cgroup:rw"""
-        
-        await execute_lxc(f"lxc config set {container_name} raw.lxc '{raw_lxc}'")
-        logger.info(f"✅ Applied LXC config to {container_name}")
+lxc.mount.auto = proc:rw sys:rw cgroup:rw""",
+}
+CONTAINER_DEVICES = {
+    'fuse': {'type': 'unix-char', 'path': '/dev/fuse'},
+}
+
+IMAGE_REMOTES = {
+    'ubuntu': 'https://cloud-images.ubuntu.com/releases',
+    'images': 'https://images.lxd.canonical.com',
+}
+
+_profile_lock: Optional[asyncio.Lock] = None
+_profile_ready: set = set()  # nodes whose profile is up to date
+
+async def ensure_xeloracloud_profile(node: Optional[Node] = None):
+    """Create or update the managed profile holding CONTAINER_CONFIG and CONTAINER_DEVICES on a node"""
+    global _profile_lock
+    node = node or nodes.local
+    if node.name in _profile_ready:
+        return
+    if _profile_lock is None:
+        _profile_lock = asyncio.Lock()
+    async with _profile_lock:
+        if node.name in _profile_ready:
+            return
+        client = node.client
+        body = {
+            'description': f'{BOT_NAME} managed VPS profile',
+            'config': CONTAINER_CONFIG,
+            'devices': CONTAINER_DEVICES,
+        }
+        if client.available:
+            try:
+                await client.request('PUT', f"/1.0/profiles/{XELORACLOUD_PROFILE}", json_body=body)
+            except LXDError as e:
+                if e.status_code != 404:
+                    raise
+                await client.request('POST', '/1.0/profiles', json_body={'name': XELORACLOUD_PROFILE, **body})
+        else:
+            # Look before creating so that every failure below is a real one and propagates
+            profiles = {profile['name']: profile
+                        for profile in json.loads(await execute_lxc("lxc profile list --format json"))}
+            if XELORACLOUD_PROFILE not in profiles:
+                await execute_lxc(f"lxc profile create {XELORACLOUD_PROFILE}")
+            existing = (profiles.get(XELORACLOUD_PROFILE) or {}).get('devices') or {}
+            for key, value in CONTAINER_CONFIG.items():
+                await execute_lxc(f"lxc profile set {XELORACLOUD_PROFILE} {key} {shlex.quote(value)}")
+            for device, options in CONTAINER_DEVICES.items():
+                if existing.get(device) == options:
+                    continue
+                if device in existing:
+                    await execute_lxc(f"lxc profile device remove {XELORACLOUD_PROFILE} {device}")
+                await execute_lxc(f"lxc profile device add {XELORACLOUD_PROFILE} {device} {options['type']} "
+                                  + " ".join(f"{k}={v}" for k, v in options.items() if k != 'type'))
+        _profile_ready.add(node.name)
+        logger.info(f"✅ LXD profile '{XELORACLOUD_PROFILE}' is up to date on {node.name}")
+
+def image_source(os_version: str) -> dict:
+    """LXD image source for an OS_OPTIONS value such as 'ubuntu:24.04' or 'images:debian/12'"""
+    remote, _, alias = os_version.partition(':')
+    if not alias:
+        return {'type': 'image', 'alias': remote}
+    return {'type': 'image', 'mode': 'pull', 'protocol': 'simplestreams',
+            'server': IMAGE_REMOTES.get(remote, remote), 'alias': alias}
+
+async def launch_container(container_name: str, os_version: str, ram_gb: float, cpu: int, storage_gb: float,
+                           start: bool = True, config: dict = None):
+    """Create a container with the managed profile attached, so it is fully configured in one step"""
+    node = nodes.node_of(container_name)
+    await ensure_xeloracloud_profile(node)
+    limits = {'limits.memory': f"{ram_gb:g}GB", 'limits.cpu': str(cpu), **(config or {})}
+    if node.client.available:
+        await node.client.request('POST', '/1.0/instances', json_body={
+            'name': container_name,
+            'source': image_source(os_version),
+            'profiles': ['default', XELORACLOUD_PROFILE],
+            'config': limits,
+            'devices': {'root': {'type': 'disk', 'path': '/', 'pool': node.storage_pool,
+                                 'size': f"{storage_gb:g}GB"}},
+        }, timeout=600)
+        if start:
+            await node.client.change_state(container_name, 'start')
+    else:
+        options = " ".join(f"-c {key}={shlex.quote(value)}" for key, value in limits.items())
+        await execute_lxc(f"lxc {'launch' if start else 'init'} {os_version} {container_name} "
+                          f"-p default -p {XELORACLOUD_PROFILE} -s {node.storage_pool} {options} "
+                          f"-d root,size={storage_gb:g}GB", timeout=600)
+    fleet_snapshot.invalidate()
+    logger.info(f"✅ Launched {container_name} ({os_version}) on {node.name}")
+
+GUEST_SYSCTL_PATH = '/etc/sysctl.d/99-xeloracloud.conf'
+GUEST_SYSCTL_CONF = """net.ipv4.ip_unprivileged_port_start=0
+net.ipv4.ping_group_range=0 2147483647
+fs.inotify.max_user_watches=524288
+"""
+
+async def wait_for_guest_ready(container_name: str, timeout: float = GUEST_READY_TIMEOUT) -> float:
+    """Poll until the guest is running and accepts commands; returns the seconds waited"""
+    started = time.monotonic()
+    delay = 0.1
+    last_error = None
+    client = lxd_for(container_name)
+    while True:
+        try:
+            if client.available:
+                state = await client.get_instance_state(container_name)
+                if (state.get('status') or '').lower() == 'running':
+                    code, _, _ = await client.exec(container_name, ['true'], timeout=10)
+                    if code == 0:
+                        return time.monotonic() - started
+            else:
+                await execute_lxc(f"lxc exec {container_name} -- true", timeout=10)
+                return time.monotonic() - started
+        except Exception as e:
+            last_error = e
+        if time.monotonic() - started + delay > timeout:
+            raise asyncio.TimeoutError(f"⏱️ {container_name} was not ready after {timeout:.0f}s"
+                                       + (f": {last_error}" if last_error else ""))
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+async def apply_internal_permissions(container_name) -> Dict[str, float]:
+    """Apply internal container permissions; returns per-step timings in seconds"""
+    timings = {}
+    started = time.monotonic()
+    try:
+        timings['ready'] = await wait_for_guest_ready(container_name)
+
+        step = time.monotonic()
+        pushed = False
+        client = lxd_for(container_name)
+        if client.available:
+            try:
+                await client.push_file(container_name, GUEST_SYSCTL_PATH, GUEST_SYSCTL_CONF.encode())
+                pushed = True
+            except LXDError as e:
+                logger.warning(f"File push to {container_name} failed, writing via exec: {e}")
+        timings['push'] = time.monotonic() - step
+
+        step = time.monotonic()
+        if pushed:
+            script = f"sysctl -p {GUEST_SYSCTL_PATH}"
+        else:
+            # Create the directory and write the file in the same exec as applying it
+            script = (f"mkdir -p /etc/sysctl.d && printf '%s' \"$1\" > {GUEST_SYSCTL_PATH} "
+                      f"&& sysctl -p {GUEST_SYSCTL_PATH}")
+        if client.available:
+            code, _, stderr = await client.exec(container_name, ['sh', '-c', script, 'sh', GUEST_SYSCTL_CONF])
+        else:
+            await execute_lxc(f"lxc exec {container_name} -- sh -c {shlex.quote(script)} sh "
+                              f"{shlex.quote(GUEST_SYSCTL_CONF)}")
+            code, stderr = 0, ''
+        timings['apply'] = time.monotonic() - step
+        if code != 0:
+            # Some keys are read-only in unprivileged guests; the rest still apply
+            logger.warning(f"sysctl in {container_name} exited {code}: {stderr.strip()[:200]}")
+
+        timings['total'] = time.monotonic() - started
+        logger.info(f"✅ Applied internal permissions to {container_name} "
+                    f"({', '.join(f'{name} {value:.2f}s' for name, value in timings.items())})")
+        return timings
     except Exception as e:
-        logger.error(f"Failed to apply LXC config: {e}")
+        logger.error(f"Failed to apply internal permissions to {container_name}: {e}")
+        raise
+
+# ==================== WARM POOL ====================
+POOL_CONFIG_KEY = 'user.xeloracloud.pool'
+
+def os_slug(os_version: str) -> str:
+    return ''.join(ch if ch.isalnum() else '-' for ch in os_version.lower()).strip('-')
+
+class WarmPool:
+    """Keeps stopped, fully configured containers per OS ready to be renamed into a new VPS"""
+
+    def __init__(self, size: int, images: List[str]):
+        self.size = size
+        self.images = images
+        self.ready: Dict[str, deque] = {image: deque() for image in images}
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.active_deploys = 0
+        self.local_aliases: Dict[str, str] = {}
+        self.images_refreshed_at = 0.0
+        self.discovered = False
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total * 100 if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': self.hit_rate,
+            'ready': {image: len(names) for image, names in self.ready.items()},
+        }
+
+    async def discover(self):
+        """Rebuild the pool from containers tagged with POOL_CONFIG_KEY"""
+        snapshot = await fleet_snapshot.get(force=True)
+        for image in self.ready:
+            self.ready[image].clear()
+        for name, instance in snapshot.items():
+            image = instance['config'].get(POOL_CONFIG_KEY)
+            if image in self.ready and instance['status'] == 'stopped' and instance.get('node') == LOCAL_NODE:
+                self.ready[image].append(name)
+        self.discovered = True
+        logger.info(f"♨️ Warm pool discovered: {sum(len(names) for names in self.ready.values())} ready containers")
 
-async def apply_internal_permissions(container_name):
-    """Apply internal container permissions"""
+    async def refresh_images(self):
+        """Pull fresh copies of every pooled image into local aliases (auto-updated by LXD)"""
+        for image in self.images:
+            alias = f"xeloracloud/{os_slug(image)}"
+            try:
+                if lxd.available:
+                    op = await lxd.request('POST', '/1.0/images', json_body={
+                        'source': image_source(image), 'auto_update': True,
+                    }, timeout=1800)
+                    fingerprint = (op.get('metadata') or {}).get('fingerprint')
+                    if not fingerprint:
+                        continue
+                    try:
+                        await lxd.request('POST', '/1.0/images/aliases',
+                                          json_body={'name': alias, 'target': fingerprint})
+                    except LXDError:
+                        await lxd.request('PUT', f"/1.0/images/aliases/{alias}", json_body={'target': fingerprint})
+                else:
+                    try:
+                        await execute_lxc(f"lxc image copy {image} local: --alias {alias} --auto-update", timeout=1800)
+                    except Exception:
+                        await execute_lxc(f"lxc image refresh {alias}", timeout=1800)
+                self.local_aliases[image] = alias
+            except Exception as e:
+                logger.warning(f"Failed to refresh image {image}: {e}")
+        self.images_refreshed_at = time.monotonic()
+
+    async def refill_one(self) -> bool:
+        """Create one pool container for the emptiest OS; returns False if none was needed or it failed"""
+        deficits = [(len(names), image) for image, names in self.ready.items() if len(names) < self.size]
+        if not deficits:
+            return False
+        _, image = min(deficits)
+        name = f"xc-pool-{os_slug(image)}-{random.randrange(16 ** 6):06x}"[:63]
+        defaults = (settings.get('default_ram', 2), settings.get('default_cpu', 2), settings.get('default_storage', 20))
+        try:
+            await launch_container(name, self.local_aliases.get(image, image), *defaults,
+                                   config={POOL_CONFIG_KEY: image})
+            await apply_internal_permissions(name)
+            if lxd.available:
+                await lxd.change_state(name, 'stop', timeout=60)
+            else:
+                await execute_lxc(f"lxc stop {name}")
+            self.ready[image].append(name)
+            logger.info(f"♨️ Warm pool: added {name} for {image}")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Warm pool refill for {image} failed: {e}")
+            try:
+                await execute_lxc(f"lxc delete --force {name}")
+            except Exception:
+                pass
+            return False
+        return True
+
+    async def acquire(self, os_version: str, container_name: str, ram_gb: float, cpu: int,
+                      storage_gb: float) -> bool:
+        """Turn a pooled container into `container_name` (rename, resize, start); False on a miss"""
+        names = self.ready.get(os_version)
+        if not names:
+            self.misses += 1
+            return False
+        pool_name = names.popleft()
+        current = pool_name
+        limits = {'limits.memory': f"{ram_gb:g}GB", 'limits.cpu': str(cpu), POOL_CONFIG_KEY: ''}
+        try:
+            if lxd.available:
+                await lxd.request('POST', f"/1.0/instances/{pool_name}", json_body={'name': container_name})
+                current = container_name
+                await lxd.patch_instance(container_name, {
+                    'config': limits,
+                    'devices': {'root': {'type': 'disk', 'path': '/', 'pool': DEFAULT_STORAGE_POOL,
+                                         'size': f"{storage_gb:g}GB"}},
+                })
+                await lxd.change_state(container_name, 'start')
+            else:
+                await execute_lxc(f"lxc rename {pool_name} {container_name}")
+                current = container_name
+                await execute_lxc(f"lxc config set {container_name} "
+                                  + " ".join(f"{key}={shlex.quote(value)}" for key, value in limits.items()))
+                await execute_lxc(f"lxc config device override {container_name} root size={storage_gb:g}GB")
+                await execute_lxc(f"lxc start {container_name}")
+        except Exception as e:
+            self.errors += 1
+            self.misses += 1
+            logger.error(f"Warm pool handoff {pool_name} -> {container_name} failed: {e}")
+            # Half-handed-off containers can't go back in the pool, and one already renamed would
+            # block the cold launch of `container_name`
+            try:
+                if lxd.available:
+                    # The start may have failed or timed out after the instance came up
+                    try:
+                        await lxd.change_state(current, 'stop', force=True)
+                    except LXDError:
+                        pass  # already stopped
+                    await lxd.request('DELETE', f"/1.0/instances/{current}")
+                else:
+                    await execute_lxc(f"lxc delete --force {current}")
+            except Exception as delete_error:
+                logger.error(f"Failed to delete {current} after warm pool handoff failure: {delete_error}")
+            fleet_snapshot.invalidate()
+            return False
+        self.hits += 1
+        fleet_snapshot.invalidate()
+        return True
+
+warm_pool = WarmPool(WARM_POOL_SIZE, WARM_POOL_IMAGES)
+
+async def deploy_container(container_name: str, os_version: str, ram_gb: float, cpu: int,
+                           storage_gb: float) -> Dict[str, Any]:
+    """Create a running, configured VPS container on the best-fit node, from the warm pool when possible.
+
+    The node reservation ends when this returns, so register the VPS with the
+    returned node before awaiting anything else.
+    """
+    started = time.monotonic()
+    node = await nodes.place(container_name, ram_gb, cpu, storage_gb)
+    warm_pool.active_deploys += 1
     try:
-        await asyncio.sleep(5)
-        
-        commands = [
-            "mkdir -p /etc/sysctl.d/",
-            "echo 'net.ipv4.ip_unprivileged_port_start=0' > /etc/sysctl.d/99-xeloracloud.conf",
-            "echo 'net.ipv4.ping_group_range=0 2147483647' >> /etc/sysctl.d/99-xeloracloud.conf",
-            "echo 'fs.inotify.max_user_watches=524288' >> /etc/sysctl.d/99-xeloracloud.conf",
-            "sysctl -p /etc/sysctl.d/99-xeloracloud.conf || true"
-        ]
-        
-        for cmd in commands:
+        # The warm pool and its cached image aliases live on the local node
+        if node.local and await warm_pool.acquire(os_version, container_name, ram_gb, cpu, storage_gb):
+            source = 'pool'
+        else:
+            image = warm_pool.local_aliases.get(os_version, os_version) if node.local else os_version
+            await launch_container(container_name, image, ram_gb, cpu, storage_gb)
+            await apply_internal_permissions(container_name)
+            source = 'cold'
+    finally:
+        warm_pool.active_deploys -= 1
+        nodes.release(container_name)
+    seconds = time.monotonic() - started
+    logger.info(f"🚀 Deployed {container_name} ({os_version}) on {node.name} from {source} in {seconds:.1f}s")
+    return {'source': source, 'seconds': seconds, 'node': node.name}
+
+# ==================== PORT FORWARDING ====================
+PORT_PROTOCOLS = ('tcp', 'udp', 'both')
+PORT_DEVICE_PREFIX = 'xc-fwd-'
+
+class PortAllocator:
+    """Constant-time host port allocation over [start, end] using a bitmap plus a free list.
+
+    Ports claimed explicitly (reserve) stay in the free list and are skipped
+    lazily when popped, so every operation is O(1) amortised.
+    """
+
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+        self._used = bytearray(end - start + 1)
+        self._free = deque(range(start, end + 1))
+        self.in_use = 0
+
+    def __contains__(self, port: int) -> bool:
+        return self.start <= port <= self.end and bool(self._used[port - self.start])
+
+    @property
+    def capacity(self) -> int:
+        return len(self._used)
+
+    def allocate(self) -> int:
+        while self._free:
+            port = self._free.popleft()
+            if not self._used[port - self.start]:
+                self._used[port - self.start] = 1
+                self.in_use += 1
+                return port
+        raise ValueError("No free host ports left in the forwarding range")
+
+    def reserve(self, port: int) -> int:
+        if not self.start <= port <= self.end:
+            raise ValueError(f"Port {port} is outside the forwarding range {self.start}-{self.end}")
+        if self._used[port - self.start]:
+            raise ValueError(f"Host port {port} is already forwarded")
+        self._used[port - self.start] = 1
+        self.in_use += 1
+        return port
+
+    def release(self, port: int):
+        if port in self:
+            self._used[port - self.start] = 0
+            self._free.append(port)
+            self.in_use -= 1
+
+def proxy_devices(forward: dict) -> Dict[str, dict]:
+    """LXD proxy devices for one forward ('both' becomes a tcp and a udp device)"""
+    protocols = ('tcp', 'udp') if forward['protocol'] == 'both' else (forward['protocol'],)
+    return {
+        f"{PORT_DEVICE_PREFIX}{forward['host_port']}-{protocol}": {
+            'type': 'proxy',
+            'listen': f"{protocol}:0.0.0.0:{forward['host_port']}",
+            'connect': f"{protocol}:127.0.0.1:{forward['vps_port']}",
+        }
+        for protocol in protocols
+    }
+
+class PortForwardManager:
+    """In-memory view of port_forwards with quotas and per-container proxy device sync"""
+
+    def __init__(self, start: int, end: int, concurrency: int = 10):
+        self.allocator = PortAllocator(start, end)
+        self.concurrency = concurrency
+        self.by_port: Dict[int, dict] = {}
+        self.by_container: Dict[str, Dict[int, dict]] = defaultdict(dict)
+        self.per_user: Dict[str, int] = defaultdict(int)
+        self.quotas: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._user_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    def load(self):
+        for row in db.read('SELECT * FROM port_forwards', label='load_port_forwards'):
+            forward = dict(row)
             try:
-                await execute_lxc(f"lxc exec {container_name} -- bash -c \"{cmd}\"")
-            except:
+                self.allocator.reserve(forward['host_port'])
+            except ValueError:
+                # Outside the configured range (the range was narrowed); keep it but don't manage the slot
+                pass
+            self._index(forward)
+        self.quotas = {row['user_id']: row['allocated_ports']
+                       for row in db.read('SELECT * FROM port_allocations', label='load_port_quotas')}
+
+    def _index(self, forward: dict):
+        self.by_port[forward['host_port']] = forward
+        self.by_container[forward['vps_container']][forward['host_port']] = forward
+        self.per_user[forward['user_id']] += 1
+
+    def _unindex(self, forward: dict):
+        self.by_port.pop(forward['host_port'], None)
+        container = self.by_container.get(forward['vps_container'], {})
+        container.pop(forward['host_port'], None)
+        if not container:
+            self.by_container.pop(forward['vps_container'], None)
+        self.per_user[forward['user_id']] -= 1
+        self.allocator.release(forward['host_port'])
+
+    def quota(self, user_id: str) -> int:
+        return self.quotas.get(str(user_id), settings.get('default_port_quota', 5))
+
+    def set_quota(self, user_id: str, quota: int) -> concurrent.futures.Future:
+        self.quotas[str(user_id)] = quota
+        return db.execute('INSERT OR REPLACE INTO port_allocations (user_id, allocated_ports) VALUES (?, ?)',
+                          (str(user_id), quota), label='set_port_quota')
+
+    def desired_devices(self, container: str) -> Dict[str, dict]:
+        devices = {}
+        for forward in self.by_container.get(container, {}).values():
+            devices.update(proxy_devices(forward))
+        return devices
+
+    async def add(self, user_id: str, container: str, vps_port: int, protocol: str = 'both',
+                  host_port: Optional[int] = None, enforce_quota: bool = True) -> dict:
+        protocol = protocol.lower()
+        if protocol not in PORT_PROTOCOLS:
+            raise ValueError(f"Protocol must be one of {', '.join(PORT_PROTOCOLS)}")
+        if not 1 <= vps_port <= 65535:
+            raise ValueError("VPS port must be between 1 and 65535")
+        # The quota count only moves in _index, after the INSERT; hold the user's lock until then
+        async with self._user_locks[str(user_id)]:
+            if enforce_quota and self.per_user[str(user_id)] >= self.quota(user_id):
+                raise ValueError(f"Port quota reached ({self.quota(user_id)} forwards)")
+            port = self.allocator.reserve(host_port) if host_port else self.allocator.allocate()
+            forward = {'user_id': str(user_id), 'vps_container': container, 'vps_port': vps_port,
+                       'host_port': port, 'protocol': protocol, 'created_at': datetime.now().isoformat(),
+                       'last_used': None}
+            try:
+                forward['id'] = await asyncio.wrap_future(db.execute(
+                    '''INSERT INTO port_forwards (user_id, vps_container, vps_port, host_port, protocol, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    (forward['user_id'], container, vps_port, port, protocol, forward['created_at']),
+                    label='add_port_forward'))
+            except Exception:
+                self.allocator.release(port)
+                raise
+            self._index(forward)
+        try:
+            await self.sync_container(container)
+        except Exception:
+            self._unindex(forward)
+            db.execute('DELETE FROM port_forwards WHERE id = ?', (forward['id'],), label='remove_port_forward')
+            raise
+        return forward
+
+    async def remove(self, host_port: int) -> Optional[dict]:
+        forward = self.by_port.get(host_port)
+        if forward is None:
+            return None
+        self._unindex(forward)
+        db.execute('DELETE FROM port_forwards WHERE id = ?', (forward['id'],), label='remove_port_forward')
+        await self.sync_container(forward['vps_container'])
+        return forward
+
+    def forget_container(self, container: str) -> int:
+        """Drop the forwards of a deleted container (its devices went with it)"""
+        forwards = list(self.by_container.get(container, {}).values())
+        for forward in forwards:
+            self._unindex(forward)
+        if forwards:
+            db.execute('DELETE FROM port_forwards WHERE vps_container = ?', (container,),
+                       label='remove_port_forward')
+        return len(forwards)
+
+    def rename_container(self, old_name: str, new_name: str):
+        # Host ports and owners don't change, so only the per-container index moves; going through
+        # the allocator would fail for ports outside a since-narrowed range
+        forwards = self.by_container.pop(old_name, {})
+        for forward in forwards.values():
+            forward['vps_container'] = new_name
+        if forwards:
+            self.by_container[new_name].update(forwards)
+            db.execute('UPDATE port_forwards SET vps_container = ? WHERE vps_container = ?', (new_name, old_name),
+                       label='rename_port_forward')
+
+    async def sync_container(self, container: str, instance: Optional[dict] = None) -> bool:
+        """Make the container's proxy devices match its forwards in one update; True if it changed"""
+        async with self._locks[container]:
+            desired = self.desired_devices(container)
+            client = lxd_for(container)
+            if client.available:
+                instance = instance or await client.get_instance(container)
+                devices = {name: device for name, device in (instance.get('devices') or {}).items()
+                           if not name.startswith(PORT_DEVICE_PREFIX)}
+                current = {name: device for name, device in (instance.get('devices') or {}).items()
+                           if name.startswith(PORT_DEVICE_PREFIX)}
+                if current == desired:
+                    return False
+                # PATCH cannot drop devices, so PUT the whole instance with its device set replaced
+                await client.request('PUT', f"/1.0/instances/{container}", json_body={
+                    'architecture': instance.get('architecture'),
+                    'config': instance.get('config') or {},
+                    'devices': {**devices, **desired},
+                    'ephemeral': instance.get('ephemeral', False),
+                    'profiles': instance.get('profiles') or [],
+                    'stateful': instance.get('stateful', False),
+                    'description': instance.get('description', ''),
+                })
+                return True
+
+            output = await execute_lxc(f"lxc config device list {container}")
+            current = {line.strip() for line in str(output).splitlines()
+                       if line.strip().startswith(PORT_DEVICE_PREFIX)}
+            stale = sorted(current - set(desired))
+            if stale:
+                await execute_lxc(f"lxc config device remove {container} {' '.join(stale)}")
+            for name, device in desired.items():
+                if name not in current:
+                    await execute_lxc(f"lxc config device add {container} {name} proxy "
+                                      f"listen={device['listen']} connect={device['connect']}")
+            return bool(stale) or any(name not in current for name in desired)
+
+    async def resync(self) -> Dict[str, int]:
+        """Recreate every forward (e.g. after a host reboot) from one listing, updating only drifted containers"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        instances = {}
+        listed = [node for node in nodes if node.client.available]
+        listings = await asyncio.gather(*(node.client.list_instances(recursion=1) for node in listed),
+                                        return_exceptions=True)
+        for node, listing in zip(listed, listings):
+            if isinstance(listing, Exception):
+                logger.warning(f"Listing instances on {node.name} failed: {listing}")
                 continue
-        
-        logger.info(f"✅ Applied internal permissions to {container_name}")
-    except Exception as e:
-        logger.error(f"Failed to apply internal permissions: {e}")
+            instances.update((instance['name'], instance) for instance in listing)
+        # Containers that have forwards, plus any still carrying devices for removed forwards
+        targets = set(self.by_container) & set(instances) if instances else set(self.by_container)
+        targets |= {name for name, instance in instances.items()
+                    if any(device.startswith(PORT_DEVICE_PREFIX) for device in instance.get('devices') or {})}
+
+        async def sync(name):
+            async with semaphore:
+                return await self.sync_container(name, instances.get(name))
+
+        results = await asyncio.gather(*(sync(name) for name in targets), return_exceptions=True)
+        failed = [name for name, result in zip(targets, results) if isinstance(result, Exception)]
+        for name in failed:
+            logger.error(f"Failed to sync port forwards for {name}")
+        return {'containers': len(targets), 'updated': sum(1 for result in results if result is True),
+                'failed': len(failed)}
+
+port_forwards = PortForwardManager(PORT_RANGE_START, PORT_RANGE_END)
+
+@metrics.collector
+def collect_port_metrics() -> List[Metric]:
+    in_use = metrics.gauge('port_forwards', 'Active host port forwards', register=False)
+    in_use.set(port_forwards.allocator.in_use)
+    capacity = metrics.gauge('port_range_size', 'Host ports available for forwarding', register=False)
+    capacity.set(port_forwards.allocator.capacity)
+    return [in_use, capacity]
+
+# ==================== JOB SCHEDULER ====================
+JOB_HANDLERS: Dict[str, Any] = {}
+
+def job_handler(kind: str):
+    """Register `async def handler(job) -> str` for a job kind"""
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Parse 'launch=2,export=1' into a dict"""
+    limits = {}
+    for item in spec.split(','):
+        key, _, value = item.partition('=')
+        if key.strip() and value.strip():
+            limits[key.strip()] = int(value)
+    return limits
+
+class Job:
+    """A queued or running long LXD operation"""
+
+    def __init__(self, job_id: int, kind: str, user_id: str, priority: int, payload: dict,
+                 channel_id: Optional[int] = None, message_id: Optional[int] = None):
+        self.id = job_id
+        self.kind = kind
+        self.user_id = user_id
+        self.priority = priority
+        self.payload = payload
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.state = 'queued'
+        self.progress_text: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.result: Any = None  # structured outcome a handler can leave for whoever awaits `finished`
+        self.finished = asyncio.Event()
+        self._last_edit = 0.0
+
+    def __lt__(self, other: 'Job'):
+        return (self.priority, self.id) < (other.priority, other.id)
+
+    async def progress(self, text: str, final: bool = False):
+        """Record progress and edit the originating Discord message (at most every 2s unless final)"""
+        self.progress_text = text
+        db.execute('UPDATE jobs SET progress = ? WHERE id = ?', (text, self.id), label='job_progress')
+        if not self.channel_id or not self.message_id:
+            return
+        if not final and time.monotonic() - self._last_edit < 2:
+            return
+        self._last_edit = time.monotonic()
+        channel = bot.get_channel(self.channel_id)
+        if channel is None:
+            return
+        color = {'done': 'success', 'failed': 'error', 'cancelled': 'warning'}.get(self.state, 'info')
+        embed = create_embed(f"⚙️ Job #{self.id} • {self.kind}", text, color)
+        add_field(embed, "State", self.state.title(), True)
+        try:
+            await channel.get_partial_message(self.message_id).edit(embed=embed)
+        except Exception as e:
+            logger.warning(f"Failed to update progress message for job #{self.id}: {e}")
+
+class JobScheduler:
+    """Priority queue for long LXD operations with global, per-user and per-kind concurrency caps.
+
+    Jobs are persisted in the jobs table; anything queued or interrupted
+    mid-run is re-queued when the bot restarts.
+    """
+
+    def __init__(self, max_concurrent: int, per_user: int, kind_limits: Dict[str, int],
+                 timeouts: Dict[str, int]):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.kind_limits = kind_limits
+        self.timeouts = timeouts
+        self.completed = 0
+        self.failed = 0
+        self._queue: List[Job] = []
+        self.running: Dict[int, Job] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def queued(self) -> List[Job]:
+        return sorted(job for job in self._queue if job.state == 'queued')
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self.running.get(job_id) or next((job for job in self._queue if job.id == job_id), None)
+
+    def start(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        self._wakeup.set()
+
+    async def restore(self):
+        """Re-queue jobs that were queued or running when the bot stopped"""
+        rows = db.read("SELECT * FROM jobs WHERE state IN ('queued', 'running') ORDER BY id", label='restore_jobs')
+        # Startup runs this before commands are served; skipping known ids keeps a second call harmless
+        known = set(self.running) | {job.id for job in self._queue}
+        rows = [row for row in rows if row['id'] not in known]
+        restored = []
+        for row in rows:
+            try:
+                payload = json.loads(row['payload'])
+            except ValueError as e:
+                logger.error(f"Job #{row['id']} has an unreadable payload, marking it failed: {e}")
+                db.execute("UPDATE jobs SET state = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                           (f"Unreadable payload: {e}", datetime.now().isoformat(), row['id']), label='job_state')
+                continue
+            job = Job(row['id'], row['kind'], row['user_id'], row['priority'], payload,
+                      row['channel_id'], row['message_id'])
+            heapq.heappush(self._queue, job)
+            restored.append(row)
+        rows = restored
+        if rows:
+            ids = [(row['id'],) for row in rows]
+            await db.run(lambda conn: conn.executemany("UPDATE jobs SET state = 'queued' WHERE id = ? "
+                                                       "AND state = 'running'", ids), label='restore_jobs')
+            logger.info(f"📋 Restored {len(rows)} queued jobs")
+        self.start()
+
+    async def submit(self, kind: str, user_id: str, payload: dict, priority: int = 5,
+                     message: Optional[discord.Message] = None) -> Job:
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        channel_id = message.channel.id if message else None
+        message_id = message.id if message else None
+        job_id = await asyncio.wrap_future(db.execute(
+            '''INSERT INTO jobs (kind, user_id, priority, state, payload, channel_id, message_id, created_at)
+               VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)''',
+            (kind, str(user_id), priority, json.dumps(payload), channel_id, message_id, datetime.now().isoformat()),
+            label='submit_job'))
+        job = Job(job_id, kind, str(user_id), priority, payload, channel_id, message_id)
+        heapq.heappush(self._queue, job)
+        self.start()
+        return job
+
+    async def cancel(self, job_id: int) -> bool:
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job.state == 'running' and job.task:
+            job.task.cancel()
+            return True
+        job.state = 'cancelled'
+        self._queue.remove(job)
+        heapq.heapify(self._queue)
+        await self._finish(job, 'Cancelled before it started')
+        return True
+
+    def _runnable(self, job: Job) -> bool:
+        running = list(self.running.values())
+        if len(running) >= self.max_concurrent:
+            return False
+        # SYSTEM work (nightly backups) is bounded by the kind limits, not the per-user fairness cap
+        if job.user_id != 'SYSTEM' and sum(1 for other in running if other.user_id == job.user_id) >= self.per_user:
+            return False
+        limit = self.kind_limits.get(job.kind, self.max_concurrent)
+        return sum(1 for other in running if other.kind == job.kind) < limit
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Walk the queue in priority order; blocked jobs keep their place
+            waiting = []
+            while self._queue and len(self.running) < self.max_concurrent:
+                job = heapq.heappop(self._queue)
+                if job.state != 'queued':
+                    continue
+                if self._runnable(job):
+                    job.state = 'running'
+                    self.running[job.id] = job
+                    job.task = asyncio.create_task(self._run(job))
+                else:
+                    waiting.append(job)
+            for job in waiting:
+                heapq.heappush(self._queue, job)
+
+    async def _run(self, job: Job):
+        result = None
+        try:
+            # Inside the try: a cancel during the first progress edit must still free the job's slots
+            db.execute("UPDATE jobs SET state = 'running', started_at = ? WHERE id = ?",
+                       (datetime.now().isoformat(), job.id), label='job_state')
+            await job.progress("⏳ Started", final=True)
+            timeout = self.timeouts.get(job.kind, 1800)
+            result = await asyncio.wait_for(JOB_HANDLERS[job.kind](job), timeout=timeout)
+            job.state = 'done'
+            self.completed += 1
+        except asyncio.CancelledError:
+            job.state = 'cancelled'
+            result = "Cancelled"
+        except asyncio.TimeoutError:
+            job.state = 'failed'
+            self.failed += 1
+            result = f"⏱️ Timed out after {self.timeouts.get(job.kind, 1800)}s"
+        except Exception as e:
+            job.state = 'failed'
+            self.failed += 1
+            result = f"❌ {e}"
+            logger.error(f"Job #{job.id} ({job.kind}) failed: {e}")
+        finally:
+            self.running.pop(job.id, None)
+            self._wakeup.set()
+        await self._finish(job, result or "✅ Done")
+
+    async def _finish(self, job: Job, text: str):
+        db.execute('UPDATE jobs SET state = ?, error = ?, finished_at = ? WHERE id = ?',
+                   (job.state, text if job.state == 'failed' else None, datetime.now().isoformat(), job.id),
+                   label='job_state')
+        try:
+            await job.progress(text, final=True)
+        finally:
+            job.finished.set()
+
+job_scheduler = JobScheduler(
+    JOB_MAX_CONCURRENT, JOB_MAX_PER_USER, parse_limits(JOB_KIND_LIMITS),
+    {'launch': 900, 'export': 3600, 'restore': 3600, 'delete': 300, **parse_limits(JOB_TIMEOUTS)}
+)
+
+@job_handler('launch')
+async def run_launch_job(job: Job) -> str:
+    payload = job.payload
+    name = payload['container_name']
+    if name in vps_registry:
+        return f"✅ `{name}` was already deployed"
+    # A restored job may have been interrupted after the container was created: adopt it
+    instance = await fleet_snapshot.get_instance(name, max_age=0)
+    if instance is not None:
+        await job.progress(f"♻️ Adopting existing container `{name}`")
+        if instance['status'] != 'running':
+            client = nodes.get(instance['node']).client
+            if client.available:
+                await client.change_state(name, 'start')
+            else:
+                await execute_lxc(f"lxc start {name}")
+        result = {'source': 'adopted', 'seconds': 0.0, 'node': instance['node']}
+    else:
+        await job.progress(f"🚀 Deploying `{name}` ({payload['os_version']})")
+        result = await deploy_container(name, payload['os_version'], payload['ram'], payload['cpu'],
+                                        payload['storage'])
+    vps = add_vps(job.user_id, {
+        'container_name': payload['container_name'],
+        'ram': f"{payload['ram']}GB",
+        'cpu': str(payload['cpu']),
+        'storage': f"{payload['storage']}GB",
+        'config': f"{payload['ram']}GB RAM / {payload['cpu']} CPU / {payload['storage']}GB Disk",
+        'os_version': payload['os_version'],
+        'status': 'running',
+        'last_started': datetime.now().isoformat(),
+        'node': result['node'],
+    })
+    log_audit(job.user_id, 'deploy', vps['container_name'],
+              f"{result['source']} on {result['node']} in {result['seconds']:.1f}s")
+    where = f" on `{result['node']}`" if len(nodes) > 1 else ""
+    source = {'pool': 'warm pool', 'adopted': 'adopted after restart'}.get(result['source'], 'fresh image')
+    return f"✅ `{vps['container_name']}` is running{where} ({source}, {result['seconds']:.1f}s)"
+
+@job_handler('delete')
+async def run_delete_job(job: Job) -> str:
+    name = job.payload['container_name']
+    await job.progress(f"🗑️ Deleting `{name}`")
+    client = lxd_for(name)
+    if client.available:
+        try:
+            await client.change_state(name, 'stop', force=True)
+        except LXDError:
+            pass  # already stopped
+        await client.request('DELETE', f"/1.0/instances/{name}")
+    else:
+        await execute_lxc(f"lxc delete --force {name}")
+    fleet_snapshot.invalidate()
+    port_forwards.forget_container(name)
+    remove_vps(name)
+    log_audit(job.user_id, 'delete', name)
+    return f"✅ `{name}` deleted"
+
+# ==================== BACKUPS ====================
+BACKUP_CHUNK_MIN = 256 * 1024
+BACKUP_CHUNK_AVG = 1024 * 1024  # power of two; sets the boundary mask
+BACKUP_CHUNK_MAX = 4 * 1024 * 1024
+BACKUP_HASH_WINDOW = 48
+BACKUP_SCAN_BUFFER = 16 * 1024 * 1024
+BACKUP_SCAN_BLOCK = 1024 * 1024  # bytes hashed per numpy pass; bounds the scan's working memory
+
+if np is not None:
+    # Fixed seed: chunk boundaries must be identical across runs for dedup to work
+    GEAR_TABLE = np.random.RandomState(0x5EED).randint(0, 2 ** 63, size=256, dtype=np.int64).astype(np.uint64)
+    # Only the masked low bits decide a cut, and those are the same in uint32 (sums wrap modulo 2**32)
+    GEAR_TABLE32 = (GEAR_TABLE & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+class Chunker:
+    """Content-defined chunking over a byte stream.
+
+    The rolling hash is a windowed sum of per-byte gear values, computed
+    with numpy cumsums; a cut happens where its low bits are zero, so an
+    insertion only changes the chunks around it. Without numpy the stream
+    is cut into fixed-size chunks instead (still deduplicated, just less
+    resilient to shifted data).
+    """
+
+    def __init__(self, min_size: int = BACKUP_CHUNK_MIN, avg_size: int = BACKUP_CHUNK_AVG,
+                 max_size: int = BACKUP_CHUNK_MAX):
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.mask = np.uint32(avg_size - 1) if np is not None else None
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buffer += data
+        if len(self._buffer) < BACKUP_SCAN_BUFFER:
+            return []
+        return self._emit(final=False)
+
+    def finish(self) -> List[bytes]:
+        return self._emit(final=True)
+
+    def _cuts(self, view: memoryview) -> List[int]:
+        if np is None:
+            return list(range(self.avg_size, len(view) + 1, self.avg_size))
+        data = np.frombuffer(view, dtype=np.uint8)
+        candidates = []
+        for start in range(0, len(data), BACKUP_SCAN_BLOCK):
+            # Each block is rehashed from WINDOW - 1 bytes earlier so its first windows are complete
+            offset = max(start - (BACKUP_HASH_WINDOW - 1), 0)
+            sums = np.cumsum(GEAR_TABLE32[data[offset:start + BACKUP_SCAN_BLOCK]], dtype=np.uint32)
+            window = sums.copy()
+            window[BACKUP_HASH_WINDOW:] -= sums[:-BACKUP_HASH_WINDOW]
+            hits = np.flatnonzero((window[start - offset:] & self.mask) == 0)
+            candidates.extend((hits + start + 1).tolist())
+        cuts = []
+        last = 0
+        for cut in candidates:
+            if cut - last < self.min_size:
+                continue
+            while cut - last > self.max_size:
+                last += self.max_size
+                cuts.append(last)
+            if cut - last < self.min_size:
+                continue  # the forced cuts left too little before this boundary
+            cuts.append(cut)
+            last = cut
+        while len(view) - last > self.max_size:
+            last += self.max_size
+            cuts.append(last)
+        return cuts
+
+    def _emit(self, final: bool) -> List[bytes]:
+        view = memoryview(self._buffer)
+        cuts = self._cuts(view)
+        if final and (not cuts or cuts[-1] != len(view)) and len(view):
+            cuts.append(len(view))
+        chunks = []
+        start = 0
+        for cut in cuts:
+            chunks.append(bytes(view[start:cut]))
+            start = cut
+        view.release()
+        # The tail after the last cut is rescanned with the next data
+        del self._buffer[:start]
+        return chunks
+
+class ChunkStore:
+    """Content-addressed, compressed chunk files plus JSON manifests under BACKUP_DIR"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.codec = 'zst' if zstandard is not None else 'zz'
+        self._local = threading.local()
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == 'zst':
+            if not hasattr(self._local, 'compressor'):
+                self._local.compressor = zstandard.ZstdCompressor(level=BACKUP_ZSTD_LEVEL)
+            return self._local.compressor.compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(path: str, data: bytes) -> bytes:
+        if path.endswith('.zst'):
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to restore this backup")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def _chunk_dir(self, digest: str) -> str:
+        return os.path.join(self.root, 'chunks', digest[:2])
+
+    def find(self, digest: str) -> Optional[str]:
+        for codec in ('zst', 'zz'):
+            path = os.path.join(self._chunk_dir(digest), f"{digest}.{codec}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, data: bytes) -> tuple:
+        """Store a chunk if new; returns (digest, stored bytes, is_new)"""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.find(digest):
+            return digest, 0, False
+        directory = self._chunk_dir(digest)
+        os.makedirs(directory, exist_ok=True)
+        compressed = self._compress(data)
+        path = os.path.join(directory, f"{digest}.{self.codec}")
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp, path)
+        return digest, len(compressed), True
+
+    def get(self, digest: str) -> bytes:
+        path = self.find(digest)
+        if path is None:
+            raise FileNotFoundError(f"Backup chunk {digest} is missing")
+        with open(path, 'rb') as f:
+            data = self._decompress(path, f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Backup chunk {digest} is corrupt")
+        return data
+
+    def scratch(self) -> tempfile.TemporaryDirectory:
+        """Temporary directory on the backup volume for CLI export/import files"""
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.TemporaryDirectory(dir=self.root)
+
+    def manifest_path(self, backup_name: str) -> str:
+        return os.path.join(self.root, 'manifests', f"{backup_name}.json")
+
+    def save_manifest(self, backup_name: str, manifest: dict):
+        path = self.manifest_path(backup_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f"{path}.tmp", path)
+
+    def load_manifest(self, backup_name: str) -> dict:
+        with open(self.manifest_path(backup_name)) as f:
+            return json.load(f)
+
+    def collect_garbage(self) -> tuple:
+        """Delete chunks no manifest references; returns (files, bytes) removed"""
+        referenced = set()
+        manifest_dir = os.path.join(self.root, 'manifests')
+        for entry in os.scandir(manifest_dir) if os.path.isdir(manifest_dir) else ():
+            if entry.name.endswith('.json'):
+                with open(entry.path) as f:
+                    referenced.update(digest for digest, _ in json.load(f)['chunks'])
+        removed = freed = 0
+        for path, _, files in os.walk(os.path.join(self.root, 'chunks')):
+            for name in files:
+                # .tmp files are chunks still being written
+                if not name.endswith('.tmp') and name.split('.', 1)[0] not in referenced:
+                    full = os.path.join(path, name)
+                    freed += os.path.getsize(full)
+                    os.remove(full)
+                    removed += 1
+        return removed, freed
+
+class IOThrottle:
+    """Token bucket shared by all backup streams (bytes per second; 0 disables it)"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._allowance = rate
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def consume(self, amount: int):
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._updated) * self.rate)
+            self._updated = now
+            self._allowance -= amount
+            if self._allowance < 0:
+                await asyncio.sleep(-self._allowance / self.rate)
+
+# VPS fields kept in each manifest so a restore can be registered like the original
+BACKUP_VPS_FIELDS = ('user_id', 'ram', 'cpu', 'storage', 'config', 'os_version')
+
+class BackupManager:
+    """Streams container exports through the chunk store, several containers at a time"""
+
+    def __init__(self, root: str, io_limit_mb: float):
+        self.store = ChunkStore(root)
+        self.throttle = IOThrottle(io_limit_mb * 1024 ** 2)
+        self.running: Dict[str, datetime] = {}
+        self.completed = 0
+        self.failed = 0
+        # Cleared while chunk GC runs: a backup started then could dedup against a chunk being deleted
+        self._gc_idle = asyncio.Event()
+        self._gc_idle.set()
+
+    async def _export(self, container: str):
+        """Yield the uncompressed export tarball of a container"""
+        client = lxd_for(container)
+        if client.available:
+            backup = f"xc-backup-{int(time.time())}"
+            await client.request('POST', f"/1.0/instances/{container}/backups", json_body={
+                'name': backup,
+                'expires_at': (datetime.now() + timedelta(hours=6)).astimezone().isoformat(),
+                'instance_only': True,
+                'optimized_storage': False,
+                'compression_algorithm': 'none',  # compressing here would defeat deduplication
+            }, timeout=BACKUP_TIMEOUT)
+            try:
+                async for data in client.download(f"/1.0/instances/{container}/backups/{backup}/export"):
+                    yield data
+            finally:
+                try:
+                    await client.request('DELETE', f"/1.0/instances/{container}/backups/{backup}")
+                except Exception as e:
+                    logger.warning(f"Failed to remove LXD backup {backup} of {container}: {e}")
+            return
+        with self.store.scratch() as scratch:
+            path = os.path.join(scratch, f"{container}.tar")
+            await execute_lxc(f"lxc export {container} {path} --instance-only --compression=none",
+                              timeout=BACKUP_TIMEOUT)
+            with open(path, 'rb') as f:
+                while True:
+                    data = await asyncio.to_thread(f.read, 4 * 1024 * 1024)
+                    if not data:
+                        break
+                    yield data
+
+    def _store_chunks(self, chunker: Chunker, data: Optional[bytes]) -> List[tuple]:
+        chunks = chunker.finish() if data is None else chunker.feed(data)
+        return [self.store.put(chunk) + (len(chunk),) for chunk in chunks]
+
+    async def backup(self, container: str, created_by: str = 'SYSTEM') -> dict:
+        """Back up one container and record it in the backups table"""
+        await self._gc_idle.wait()
+        if container in self.running:
+            raise ValueError(f"{container} is already being backed up")
+        self.running[container] = datetime.now()
+        started = time.monotonic()
+        backup_name = f"{container}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        chunker = Chunker()
+        entries = []
+        try:
+            async for data in self._export(container):
+                await self.throttle.consume(len(data))
+                entries += await asyncio.to_thread(self._store_chunks, chunker, data)
+            entries += await asyncio.to_thread(self._store_chunks, chunker, None)
+
+            size = sum(entry[3] for entry in entries)
+            stored = sum(entry[1] for entry in entries)
+            new_chunks = sum(1 for entry in entries if entry[2])
+            vps = vps_registry.get(container)
+            self.store.save_manifest(backup_name, {
+                'container': container,
+                'created_at': datetime.now().isoformat(),
+                'size': size,
+                'vps': {field: vps[field] for field in BACKUP_VPS_FIELDS} if vps is not None else None,
+                'chunks': [[digest, length] for digest, _, _, length in entries],
+            })
+            record = {
+                'container_name': container,
+                'backup_name': backup_name,
+                'size_mb': round(size / 1024 ** 2),
+                'size_bytes': size,
+                'stored_bytes': stored,
+                'chunk_count': len(entries),
+                'new_chunks': new_chunks,
+                'dedup_ratio': round(size / stored, 2) if stored else None,
+                'duration_seconds': round(time.monotonic() - started, 1),
+                'created_at': datetime.now().isoformat(),
+                'created_by': str(created_by),
+            }
+            record['id'] = await asyncio.wrap_future(db.execute(
+                f'INSERT INTO backups ({", ".join(record)}) VALUES ({", ".join("?" * len(record))})',
+                tuple(record.values()), label='add_backup'))
+            self.completed += 1
+            backup_bytes.inc(size, kind='logical')
+            backup_bytes.inc(stored, kind='stored')
+            logger.info(f"💾 Backed up {container}: {size / 1024 ** 2:.0f}MB in {len(entries)} chunks, "
+                        f"{stored / 1024 ** 2:.1f}MB new on disk ({record['duration_seconds']}s)")
+            return record
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running.pop(container, None)
+
+    async def run(self, containers: List[str], created_by: str = 'SYSTEM') -> Dict[str, Any]:
+        """Back up several containers as low-priority export jobs; returns {name: record or exception}
+
+        Going through the job scheduler keeps these under the same `export` limit as on-demand backups.
+        """
+        jobs = {container: await job_scheduler.submit('export', created_by, {'container_name': container},
+                                                      priority=9)
+                for container in containers}
+        results = {}
+        for container, job in jobs.items():
+            await job.finished.wait()
+            results[container] = job.result if job.state == 'done' else RuntimeError(job.progress_text or job.state)
+        return results
+
+    async def _chunks(self, manifest: dict):
+        for digest, length in manifest['chunks']:
+            await self.throttle.consume(length)
+            yield await asyncio.to_thread(self.store.get, digest)
+
+    async def restore(self, backup_id: int, target: Optional[str] = None, user_id: Optional[str] = None) -> str:
+        """Stream a backup back into LXD as `target` (default: the original name); returns the name.
+
+        The restore goes to the node that held the original container, or the local node if it is gone,
+        and is registered as a VPS of the original owner (`user_id` for backups that predate owners
+        being recorded and whose container no longer exists).
+        """
+        row = db.read_one('SELECT * FROM backups WHERE id = ?', (backup_id,), label='get_backup')
+        if row is None:
+            raise ValueError(f"Backup #{backup_id} does not exist")
+        target = target or row['container_name']
+        manifest = await asyncio.to_thread(self.store.load_manifest, row['backup_name'])
+        original = vps_registry.get(row['container_name'])
+        spec = manifest.get('vps') or ({field: original[field] for field in BACKUP_VPS_FIELDS} if original else {})
+        owner = spec.pop('user_id', None) or user_id
+        if owner is None:
+            raise ValueError(f"Backup #{backup_id} has no recorded owner; restore it on behalf of a user")
+        node = nodes.node_of(row['container_name'])
+        client = node.client
+        if client.available:
+            await client.request('POST', '/1.0/instances', data=self._chunks(manifest),
+                                 headers={'Content-Type': 'application/octet-stream', 'X-LXD-name': target},
+                                 timeout=BACKUP_TIMEOUT)
+        else:
+            with self.store.scratch() as scratch:
+                path = os.path.join(scratch, f"{target}.tar")
+                with open(path, 'wb') as f:
+                    async for data in self._chunks(manifest):
+                        await asyncio.to_thread(f.write, data)
+                await execute_lxc(f"lxc import {path} {target}", timeout=BACKUP_TIMEOUT)
+        fleet_snapshot.invalidate()
+        add_vps(owner, {**spec, 'container_name': target, 'status': 'stopped', 'node': node.name})
+        logger.info(f"♻️ Restored backup #{backup_id} ({row['backup_name']}) as {target}")
+        return target
+
+    async def prune(self, retention_days: int) -> Dict[str, int]:
+        """Drop backups past retention, then delete chunks nothing references any more"""
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        rows = db.read('SELECT id, backup_name FROM backups WHERE created_at < ?', (cutoff,), label='expired_backups')
+        for row in rows:
+            try:
+                os.remove(self.store.manifest_path(row['backup_name']))
+            except FileNotFoundError:
+                pass
+        if rows:
+            await asyncio.wrap_future(db.executemany('DELETE FROM backups WHERE id = ?',
+                                                     [(row['id'],) for row in rows], label='expire_backups'))
+        if self.running or not self._gc_idle.is_set():
+            # Chunks of in-flight backups aren't in a manifest yet
+            return {'backups': len(rows), 'chunks': 0, 'freed_mb': 0}
+        self._gc_idle.clear()
+        try:
+            removed, freed = await asyncio.to_thread(self.store.collect_garbage)
+        finally:
+            self._gc_idle.set()
+        return {'backups': len(rows), 'chunks': removed, 'freed_mb': round(freed / 1024 ** 2)}
+
+backup_bytes = metrics.counter('backup_bytes_total', 'Bytes backed up (logical) and written (stored)', ('kind',))
+backups = BackupManager(BACKUP_DIR, BACKUP_IO_LIMIT_MB)
+
+@job_handler('export')
+async def run_backup_job(job: Job) -> str:
+    name = job.payload['container_name']
+    await job.progress(f"💾 Backing up `{name}`")
+    record = job.result = await backups.backup(name, job.user_id)
+    log_audit(job.user_id, 'backup', name, record['backup_name'])
+    return (f"✅ Backup `#{record['id']}` of `{name}`: {record['size_mb']}MB, "
+            f"{record['stored_bytes'] / 1024 ** 2:.1f}MB new on disk, dedup {record['dedup_ratio'] or '∞'}x")
+
+@job_handler('restore')
+async def run_restore_job(job: Job) -> str:
+    await job.progress(f"♻️ Restoring backup `#{job.payload['backup_id']}`")
+    name = await backups.restore(job.payload['backup_id'], job.payload.get('target'), job.user_id)
+    log_audit(job.user_id, 'restore', name, f"backup #{job.payload['backup_id']}")
+    return f"✅ Restored as `{name}`"
+
+# ==================== AUTO-SUSPEND ====================
+SUSPEND_THRESHOLD_DEFAULTS = {'cpu': 90, 'ram': 90, 'disk': 85}
+
+def load_usage_window(samples: int, now: Optional[int] = None) -> tuple:
+    """(names, window) of each container's last `samples` usage_stats rows.
+
+    With numpy the window is a (containers, samples, metrics) float array, newest
+    sample last and NaN where a container has fewer samples; without it, a list
+    of per-container [cpu, ram, disk] rows padded with None at the front.
+    """
+    now = int(now if now is not None else time.time())
+    # Missing readings come back as -1 so the numeric columns can be bulk-converted
+    rows = db.read('SELECT container_name, COALESCE(cpu_usage, -1), COALESCE(ram_usage, -1), '
+                   'COALESCE(disk_usage, -1) FROM usage_stats WHERE timestamp > ? ORDER BY timestamp',
+                   (now - (samples + 1) * MONITOR_INTERVAL,), label='usage_window')
+    if np is None:
+        history: Dict[str, List] = {}
+        for row in rows:
+            history.setdefault(row[0], []).append([value if value >= 0 else None for value in (row[1], row[2], row[3])])
+        names = sorted(history)
+        padding = [None] * len(USAGE_METRICS)
+        return names, [[padding] * (samples - len(history[name][-samples:])) + history[name][-samples:]
+                       for name in names]
+
+    if not rows:
+        return [], np.full((0, samples, len(USAGE_METRICS)), np.nan)
+    names, group = np.unique(np.array([row[0] for row in rows]), return_inverse=True)
+    values = np.fromiter((value for row in rows for value in (row[1], row[2], row[3])), dtype=np.float64,
+                         count=len(rows) * len(USAGE_METRICS)).reshape(len(rows), len(USAGE_METRICS))
+    values[values < 0] = np.nan
+    # A stable sort by container keeps each container's rows in time order; a row's age is its distance from the end
+    order = np.argsort(group, kind='stable')
+    ends = np.cumsum(np.bincount(group, minlength=len(names)))
+    age = np.empty(len(rows), dtype=np.int64)
+    age[order] = ends[group[order]] - 1 - np.arange(len(rows))
+    keep = age < samples
+    window = np.full((len(names), samples, len(USAGE_METRICS)), np.nan)
+    window[group[keep], samples - 1 - age[keep]] = values[keep]
+    return names.tolist(), window
+
+def evaluate_breaches(window, thresholds, breaches: int, alpha: float) -> tuple:
+    """Score every container's usage window against per-metric thresholds in one pass.
+
+    Returns (ewma, counts, flagged), each indexed [container][metric]: the EWMA of
+    the window (newest sample weighted `alpha`), how many samples exceeded the
+    threshold, and whether the breach is sustained - at least `breaches` samples
+    over the threshold with the EWMA still above it. Missing samples are ignored.
+    """
+    if np is None:
+        return _evaluate_breaches_python(window, thresholds, breaches, alpha)
+    window = np.asarray(window, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    present = ~np.isnan(window)
+    weights = alpha * (1 - alpha) ** np.arange(window.shape[1] - 1, -1, -1, dtype=np.float64)
+    weighted = present * weights[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ewma = (np.where(present, window, 0.0) * weights[:, None]).sum(axis=1) / weighted.sum(axis=1)
+    counts = (window > thresholds).sum(axis=1)
+    flagged = (counts >= breaches) & (ewma > thresholds)
+    return ewma, counts, flagged
+
+def _evaluate_breaches_python(window, thresholds, breaches: int, alpha: float) -> tuple:
+    ewma, counts, flagged = [], [], []
+    for samples in window:
+        size = len(samples)
+        row_ewma, row_counts, row_flagged = [], [], []
+        for metric, threshold in enumerate(thresholds):
+            pairs = [(alpha * (1 - alpha) ** (size - 1 - i), sample[metric])
+                     for i, sample in enumerate(samples) if sample[metric] is not None]
+            weight = sum(w for w, _ in pairs)
+            average = sum(w * value for w, value in pairs) / weight if weight else float('nan')
+            over = sum(1 for _, value in pairs if value > threshold)
+            row_ewma.append(average)
+            row_counts.append(over)
+            row_flagged.append(over >= breaches and average > threshold)
+        ewma.append(row_ewma)
+        counts.append(row_counts)
+        flagged.append(row_flagged)
+    return ewma, counts, flagged
+
+class AutoSuspender:
+    """Stops containers whose CPU, RAM or disk usage stays over the configured thresholds.
+
+    Each run scores the recent usage window of the whole fleet at once (see
+    evaluate_breaches); whitelisted, already suspended and stopped VPSes are
+    never touched.
+    """
+
+    def __init__(self, samples: int, breaches: int, alpha: float):
+        self.samples = samples
+        self.breaches = min(breaches, samples)
+        self.alpha = alpha
+        self.last_run: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.last_evaluated = 0
+        self.suspended = 0
+
+    @staticmethod
+    def thresholds() -> List[float]:
+        return [settings.get(f'{metric}_threshold', SUSPEND_THRESHOLD_DEFAULTS[metric]) for metric in USAGE_METRICS]
+
+    async def find(self, now: Optional[int] = None) -> List[tuple]:
+        """[(vps, breaches)] of eligible VPSes in sustained breach; breaches maps metric -> details"""
+        started = time.perf_counter()
+        names, window = await asyncio.to_thread(load_usage_window, self.samples, now)
+        thresholds = self.thresholds()
+        ewma, counts, flagged = evaluate_breaches(window, thresholds, self.breaches, self.alpha)
+        if np is not None:
+            hits = np.flatnonzero(flagged.any(axis=1)).tolist()
+        else:
+            hits = [i for i, row in enumerate(flagged) if any(row)]
+
+        found = []
+        for i in hits:
+            vps = vps_registry.get(names[i])
+            if vps is None or vps['whitelisted'] or vps['suspended'] or vps['status'] != 'running':
+                continue
+            found.append((vps, {
+                metric: {'ewma': round(float(ewma[i][m]), 1), 'samples': int(counts[i][m]),
+                         'threshold': thresholds[m]}
+                for m, metric in enumerate(USAGE_METRICS) if flagged[i][m]
+            }))
+        self.last_run = datetime.now()
+        self.last_duration = time.perf_counter() - started
+        self.last_evaluated = len(names)
+        return found
+
+    async def suspend(self, vps: VPSRecord, breaches: dict):
+        name = vps['container_name']
+        client = lxd_for(name)
+        if client.available:
+            await client.change_state(name, 'stop', force=True, timeout=60)
+        else:
+            await execute_lxc(f"lxc stop {name} --force")
+        apply_vps_status(vps, 'stopped')
+        vps['suspended'] = True
+        vps['suspension_history'] = list(vps['suspension_history'] or []) + [{
+            'time': datetime.now().isoformat(),
+            'reason': 'auto',
+            'breaches': breaches,
+        }]
+        self.suspended += 1
+        auto_suspensions_total.inc()
+        summary = ', '.join(f"{metric.upper()} {b['ewma']}% (>{b['threshold']}% in {b['samples']}/{self.samples})"
+                            for metric, b in breaches.items())
+        log_audit('system', 'auto_suspend', name, summary)
+        asyncio.create_task(send_log_to_discord(
+            "⛔ VPS Auto-Suspended", f"`{name}` of <@{vps['user_id']}>: {summary}", 'warning'))
+        logger.warning(f"⛔ Auto-suspended {name}: {summary}")
+
+    async def run(self, now: Optional[int] = None) -> int:
+        """Evaluate the fleet and suspend every VPS in sustained breach; returns how many were suspended"""
+        suspended = 0
+        for vps, breaches in await self.find(now):
+            try:
+                await self.suspend(vps, breaches)
+                suspended += 1
+            except Exception as e:
+                logger.error(f"Auto-suspend of {vps['container_name']} failed: {e}")
+        return suspended
+
+auto_suspensions_total = metrics.counter('auto_suspensions_total', 'VPSes suspended for sustained overuse')
+auto_suspender = AutoSuspender(SUSPEND_WINDOW, SUSPEND_BREACHES, SUSPEND_EWMA_ALPHA)
+
+# ==================== STARTUP ====================
+def preview_names(names, limit: int = 10) -> str:
+    names = sorted(names)
+    shown = ', '.join(f"`{name}`" for name in names[:limit])
+    return shown + (f" +{len(names) - limit} more" if len(names) > limit else '')
+
+class Reconciler:
+    """Brings the DB in line with LXD from one bulk listing of every node.
+
+    Drifted statuses are corrected; containers LXD has but the DB doesn't
+    (orphans) and VPS rows whose container is gone (missing) are only
+    flagged, never deleted. Nodes whose listing failed are left alone. Safe
+    to rerun: only discrepancies new since the previous pass are announced.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.last_run: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.fixed = 0
+        self.orphans: Dict[str, str] = {}  # container_name -> node
+        self.missing: Dict[str, str] = {}  # container_name -> node
+        self.skipped_nodes: List[str] = []
+        self._lock = asyncio.Lock()
+
+    async def run(self) -> Dict[str, int]:
+        async with self._lock:
+            started = time.monotonic()
+            snapshot = await fleet_snapshot.get(force=True)
+            skipped = set(fleet_snapshot.failed_nodes)
+            fixed = 0
+            missing = {}
+            for vps in vps_registry:
+                if vps['node'] in skipped:
+                    continue
+                name = vps['container_name']
+                instance = snapshot.get(name)
+                if instance is None or instance['node'] != vps['node']:
+                    missing[name] = vps['node']
+                elif instance['status'] != vps['status']:
+                    apply_vps_status(vps, instance['status'])
+                    fixed += 1
+            # Warm pool containers and deploys in flight are the bot's own, just not (yet) VPSes
+            orphans = {name: instance['node'] for name, instance in snapshot.items()
+                       if name not in vps_registry and instance['node'] not in skipped
+                       and POOL_CONFIG_KEY not in instance['config'] and not nodes.is_placing(name)}
+
+            new_orphans = orphans.keys() - self.orphans.keys()
+            new_missing = missing.keys() - self.missing.keys()
+            self.orphans, self.missing, self.fixed = orphans, missing, fixed
+            self.skipped_nodes = sorted(skipped)
+            self.runs += 1
+            self.last_run = datetime.now()
+            self.last_duration = time.monotonic() - started
+
+        logger.info(f"🧭 Reconciled {len(vps_registry)} VPS with {len(snapshot)} containers in "
+                    f"{self.last_duration:.2f}s: {fixed} statuses fixed, {len(orphans)} orphaned, "
+                    f"{len(missing)} missing" + (f", skipped {', '.join(self.skipped_nodes)}" if skipped else ''))
+        if new_orphans or new_missing:
+            fields = {}
+            if new_orphans:
+                fields["Orphaned Containers"] = preview_names(new_orphans)
+            if new_missing:
+                fields["Missing Containers"] = preview_names(new_missing)
+            asyncio.create_task(send_log_to_discord(
+                "🧭 DB and LXD Disagree", f"Use `{PREFIX}reconcile` to review", 'warning', fields))
+        return {'fixed': fixed, 'orphans': len(orphans), 'missing': len(missing)}
+
+class Startup:
+    """Loads state and starts background work once, off the gateway's critical path.
+
+    setup_hook only schedules run(), so the gateway handshake overlaps with
+    reading state on a worker thread; commands wait on `loaded`. Timings are
+    seconds since PROCESS_STARTED.
+    """
+
+    def __init__(self, started: float):
+        self.started = started
+        self.loaded = asyncio.Event()
+        self.state_loaded: Optional[float] = None
+        self.gateway_ready: Optional[float] = None
+        self.commands_ready: Optional[float] = None
+        self.first_command: Optional[float] = None
+        self.services_started: Optional[float] = None
+        self.connects = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def begin(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def _check_commands_ready(self):
+        # The first command can be served once both the gateway and state are up
+        if self.commands_ready is None and self.gateway_ready is not None and self.state_loaded is not None:
+            self.commands_ready = self.elapsed()
+            logger.info(f"⚡ Ready for commands {self.commands_ready:.2f}s after start "
+                        f"(gateway {self.gateway_ready:.2f}s, state {self.state_loaded:.2f}s)")
+
+    def gateway_connected(self) -> bool:
+        """Record a gateway (re)connect; True only for the first one"""
+        self.connects += 1
+        if self.gateway_ready is not None:
+            return False
+        self.gateway_ready = self.elapsed()
+        self._check_commands_ready()
+        return True
+
+    def command_invoked(self):
+        if self.first_command is None:
+            self.first_command = self.elapsed()
+            logger.info(f"⚡ First command invoked {self.first_command:.2f}s after start")
+
+    async def run(self):
+        try:
+            await asyncio.to_thread(load_state)
+        except Exception as e:
+            logger.critical(f"Failed to load state: {e}")
+            await bot.close()
+            return
+        # Re-queue interrupted jobs before commands can submit new ones (restore must not pick those up)
+        try:
+            await job_scheduler.restore()
+        except Exception as e:
+            logger.error(f"Failed to restore queued jobs: {e}")
+            job_scheduler.start()
+        self.state_loaded = self.elapsed()
+        self.loaded.set()
+        logger.info(f"🗄️ Loaded {len(vps_registry)} VPS, {len(nodes)} nodes and {len(port_forwards.by_port)} "
+                    f"port forwards in {self.state_loaded:.2f}s")
+        self._check_commands_ready()
+
+        try:
+            await ensure_xeloracloud_profile()
+        except Exception as e:
+            logger.error(f"Failed to prepare LXD profile: {e}")
+
+        try:
+            await start_metrics_server()
+        except OSError as e:
+            logger.error(f"Failed to start metrics server on {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+        nodes.start_events()
+        try:
+            await reconciler.run()
+        except Exception as e:
+            logger.error(f"Failed to reconcile with LXD: {e}")
+
+        try:
+            result = await port_forwards.resync()
+            logger.info(f"🔌 Port forwards checked on {result['containers']} containers "
+                        f"({result['updated']} updated, {result['failed']} failed)")
+        except Exception as e:
+            logger.error(f"Failed to resync port forwards: {e}")
+
+        # Start background tasks
+        resource_monitor_task.start()
+        usage_rollup_task.start()
+        warm_pool_task.start()
+        host_metrics_task.start()
+        update_statistics.start()
+        node_health_task.start()
+        if AUTO_BACKUP_ENABLED:
+            nightly_backup_task.start()
+        self.services_started = self.elapsed()
+        logger.info(f"✅ Background services started {self.services_started:.2f}s after start")
+
+@metrics.collector
+def collect_startup_metrics() -> List[Metric]:
+    stages = metrics.gauge('startup_seconds', 'Seconds from process start to each startup stage', ('stage',),
+                           register=False)
+    for stage in ('gateway_ready', 'state_loaded', 'commands_ready', 'first_command', 'services_started'):
+        value = getattr(startup, stage)
+        if value is not None:
+            stages.set(value, stage=stage)
+    drift = metrics.gauge('reconcile_discrepancies', 'DB/LXD disagreements found by the last reconcile',
+                          ('kind',), register=False)
+    drift.set(len(reconciler.orphans), kind='orphaned')
+    drift.set(len(reconciler.missing), kind='missing')
+    return [stages, drift]
+
+reconciler = Reconciler()
+startup = Startup(PROCESS_STARTED)
 
 # ==================== BOT EVENTS ====================
 @bot.event
 async def on_ready():
+    first = startup.gateway_connected()
     logger.info(f'🚀 {bot.user} connected to Discord!')
     logger.info(f'📊 Servers: {len(bot.guilds)} | Users: {len(bot.users)}')
     
-    # Log to Discord channel if configured
-    if LOG_CHANNEL_ID != 0:
+    if first:
+        # Log to Discord channel if configured
+        await send_log_to_discord("🚀 Bot Started", f"{BOT_NAME} is now online!", 'success', {
+            "Servers": str(len(bot.guilds)),
+            "Users": str(len(bot.users)),
+            "Latency": f"{round(bot.latency * 1000)}ms",
+            "Connected In": f"{startup.gateway_ready:.2f}s",
+        }, priority='high')
+        
+        # Log admin configuration
+        logger.info(f"✅ Main Admin: {MAIN_ADMIN_ID}")
+        if ADDITIONAL_ADMIN_IDS:
+            logger.info(f"✅ Additional Admins: {', '.join(ADDITIONAL_ADMIN_IDS)}")
+    elif startup.services_started is not None:
+        # A fresh session may have missed a lot; background tasks are already running
         try:
-            channel = bot.get_channel(LOG_CHANNEL_ID)
-            if channel:
-                embed = create_embed("🚀 Bot Started", f"{BOT_NAME} is now online!", 'success')
-                add_field(embed, "Servers", str(len(bot.guilds)), True)
-                add_field(embed, "Users", str(len(bot.users)), True)
-                add_field(embed, "Latency", f"{round(bot.latency * 1000)}ms", True)
-                await channel.send(embed=embed)
+            await reconciler.run()
         except Exception as e:
-            logger.error(f"Failed to send startup message to log channel: {e}")
-    
-    # Start background tasks
-    resource_monitor_task.start()
-    update_statistics.start()
-    
-    # Set presence
-    await bot.change_presence(
-        activity=discord.Activity(
-            type=discord.ActivityType.watching,
-            name=f"{len(vps_data)} users • {PREFIX}help"
-        ),
-        status=discord.Status.online
-    )
+            logger.error(f"Failed to reconcile with LXD: {e}")
     
-    # Log admin configuration
-    logger.info(f"✅ Main Admin: {MAIN_ADMIN_ID}")
-    if ADDITIONAL_ADMIN_IDS:
-        logger.info(f"✅ Additional Admins: {', '.join(ADDITIONAL_ADMIN_IDS)}")
+    # Set presence (update_statistics keeps it current once state is loaded)
+    if startup.loaded.is_set():
+        await bot.change_presence(
+            activity=discord.Activity(
+                type=discord.ActivityType.watching,
+                name=f"{len(vps_data)} users • {PREFIX}help"
+            ),
+            status=discord.Status.online
+        )
     
     logger.info(f"✅ {BOT_NAME} is ready!")
 
+@bot.check
+async def wait_for_state(ctx):
+    """Hold commands that arrive while state is still loading"""
+    if not startup.loaded.is_set():
+        try:
+            await asyncio.wait_for(startup.loaded.wait(), STARTUP_COMMAND_WAIT)
+        except asyncio.TimeoutError:
+            raise commands.CheckFailure("⏳ The bot is still starting up, please try again shortly!")
+    return True
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.metrics_started = time.monotonic()
+    startup.command_invoked()
+
+@bot.after_invoke
+async def record_command_timer(ctx):
+    started = getattr(ctx, 'metrics_started', None)
+    if started is not None:
+        command_seconds.observe(time.monotonic() - started, command=ctx.command.qualified_name,
+                                outcome='error' if ctx.command_failed else 'ok')
+
 @bot.event
 async def on_command_error(ctx, error):
     if isinstance(error, commands.CommandNotFound):
@@ -524,29 +4473,257 @@ async def on_command_error(ctx, error):
         await ctx.send(embed=embed)
 
 # ==================== BACKGROUND TASKS ====================
-@tasks.loop(minutes=5)
+monitor_stats = {
+    'cycles': 0,
+    'last_run': None,
+    'last_duration': 0.0,
+    'last_sampled': 0,
+    'last_skipped': 0,
+    'overruns': 0,
+}
+
+# container_name -> (cpu usage in ns, monotonic time) from the previous cycle
+_last_cpu_usage: Dict[str, tuple] = {}
+
+def parse_size_gb(value: Any, default: float = 0.0) -> float:
+    """Parse sizes such as '2', '2GB', '512MB' or '1TiB' into gigabytes"""
+    text = str(value or '').strip().upper().replace('IB', 'B')
+    number = ''.join(ch for ch in text if ch.isdigit() or ch == '.')
+    try:
+        amount = float(number)
+    except ValueError:
+        return default
+    if text.endswith('MB'):
+        return amount / 1024
+    if text.endswith('TB'):
+        return amount * 1024
+    return amount
+
+def build_usage_sample(vps: dict, instance: dict, now: float, timestamp: int) -> tuple:
+    """Turn a snapshot entry into a usage_stats row"""
+    name = vps['container_name']
+    cpu_percent = None
+    previous = _last_cpu_usage.get(name)
+    _last_cpu_usage[name] = (instance['cpu_usage_ns'], now)
+    if previous and now > previous[1] and instance['cpu_usage_ns'] >= previous[0]:
+        cores = max(parse_size_gb(vps.get('cpu'), 1.0), 1.0)
+        cpu_percent = (instance['cpu_usage_ns'] - previous[0]) / ((now - previous[1]) * 1e9 * cores) * 100
+        cpu_percent = round(min(cpu_percent, 100.0), 2)
+
+    ram_total = instance['memory_total'] or parse_size_gb(vps.get('ram')) * 1024 ** 3
+    disk_total = instance['disk_total'] or parse_size_gb(vps.get('storage')) * 1024 ** 3
+    ram_percent = round(instance['memory_usage'] / ram_total * 100, 2) if ram_total else None
+    disk_percent = round(instance['disk_usage'] / disk_total * 100, 2) if disk_total else None
+
+    return (name, timestamp, cpu_percent, ram_percent, disk_percent,
+            instance['network_rx'], instance['network_tx'])
+
+async def sample_container(vps: dict, snapshot: Dict[str, dict], semaphore: asyncio.Semaphore,
+                           timestamp: int) -> Optional[tuple]:
+    """Sample one container, querying LXD directly only if the bulk snapshot missed it"""
+    name = vps['container_name']
+    async with semaphore:
+        instance = snapshot.get(name)
+        if instance is None:
+            client = lxd_for(name)
+            if not client.available:
+                return None
+            state = await asyncio.wait_for(client.get_instance_state(name), timeout=MONITOR_SAMPLE_TIMEOUT)
+            instance = parse_instance_snapshot({'name': name, 'state': state})
+        if instance['status'] != 'running':
+            return None
+        return build_usage_sample(vps, instance, time.monotonic(), timestamp)
+
+async def collect_usage_samples() -> tuple:
+    """Sample every running, non-whitelisted container; returns (rows, skipped)"""
+    targets = [vps for vps in vps_registry.with_status('running') if not vps.get('whitelisted')]
+    if not targets:
+        return [], 0
+
+    snapshot = await fleet_snapshot.get(force=True)
+    semaphore = asyncio.Semaphore(MONITOR_CONCURRENCY)
+    timestamp = int(time.time())
+    results = await asyncio.gather(
+        *(sample_container(vps, snapshot, semaphore, timestamp) for vps in targets),
+        return_exceptions=True
+    )
+
+    rows = []
+    skipped = 0
+    for vps, result in zip(targets, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to sample {vps['container_name']}: {result}")
+            skipped += 1
+        elif result is None:
+            skipped += 1
+        else:
+            rows.append(result)
+
+    # Forget CPU baselines of containers that are gone
+    live = {vps['container_name'] for vps in targets}
+    for name in list(_last_cpu_usage):
+        if name not in live:
+            del _last_cpu_usage[name]
+    return rows, skipped
+
+class HostMetrics:
+    """Ring buffer of host CPU/RAM/disk/load/network samples taken off the event loop"""
+
+    def __init__(self, interval: int, window: int):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=max(1, window // interval))
+        self._last_net = None
+
+    def _sample(self) -> dict:
+        # cpu_percent(interval=None) measures since the previous call, so it never sleeps
+        now = time.time()
+        net = psutil.net_io_counters()
+        rx_rate = tx_rate = 0.0
+        if self._last_net:
+            last_time, last_rx, last_tx = self._last_net
+            elapsed = max(now - last_time, 1e-6)
+            rx_rate = max(net.bytes_recv - last_rx, 0) / elapsed
+            tx_rate = max(net.bytes_sent - last_tx, 0) / elapsed
+        self._last_net = (now, net.bytes_recv, net.bytes_sent)
+        return {
+            'time': now,
+            'cpu': psutil.cpu_percent(interval=None),
+            'ram': psutil.virtual_memory().percent,
+            'disk': psutil.disk_usage('/').percent,
+            'load': os.getloadavg()[0] if hasattr(os, 'getloadavg') else 0.0,
+            'rx_rate': rx_rate,
+            'tx_rate': tx_rate,
+        }
+
+    async def collect(self):
+        self.samples.append(await asyncio.to_thread(self._sample))
+
+    @property
+    def latest(self) -> Optional[dict]:
+        return self.samples[-1] if self.samples else None
+
+    def average(self, key: str, seconds: int) -> Optional[float]:
+        """Mean of `key` over the last `seconds`, or None without samples"""
+        cutoff = time.time() - seconds
+        values = [sample[key] for sample in reversed(self.samples) if sample['time'] >= cutoff]
+        return sum(values) / len(values) if values else None
+
+    def trend(self, key: str) -> str:
+        """'1m / 5m / 15m' averages for display"""
+        return ' / '.join('-' if value is None else f"{value:.1f}"
+                          for value in (self.average(key, window) for window in (60, 300, 900)))
+
+host_metrics = HostMetrics(HOST_SAMPLE_INTERVAL, HOST_SAMPLE_WINDOW)
+psutil.cpu_percent(interval=None)  # prime the CPU counter so the first sample is meaningful
+
+@tasks.loop(seconds=MONITOR_INTERVAL)
+@timed_task('resource_monitor', MONITOR_INTERVAL)
 async def resource_monitor_task():
-    """Monitor resources every 5 minutes"""
+    """Sample container resources every MONITOR_INTERVAL seconds (5 minutes by default)"""
     try:
-        auto_suspend = get_setting('auto_suspend_enabled', 'false') == 'true'
-        
-        for user_id, vps_list in vps_data.items():
-            for vps in vps_list:
-                if vps['status'] == 'running' and not vps['whitelisted']:
-                    container = vps['container_name']
-                    # Collect stats
-                    # (Implementation would go here)
-                    pass
+        started = time.monotonic()
+        auto_suspend = settings.get('auto_suspend_enabled', False)
+
+        rows, skipped = await collect_usage_samples()
+        if rows:
+            await asyncio.wrap_future(save_usage_samples(rows))
+        if auto_suspend:
+            await auto_suspender.run()
+
+        duration = time.monotonic() - started
+        monitor_stats.update(
+            cycles=monitor_stats['cycles'] + 1,
+            last_run=datetime.now(),
+            last_duration=duration,
+            last_sampled=len(rows),
+            last_skipped=skipped,
+        )
+        if duration > MONITOR_INTERVAL * 0.5:
+            monitor_stats['overruns'] += 1
+            logger.warning(f"⚠️ Resource monitor is falling behind: cycle took {duration:.1f}s "
+                           f"of a {MONITOR_INTERVAL}s interval")
+        logger.info(f"📈 Resource monitor: sampled {len(rows)}, skipped {skipped} in {duration:.2f}s")
     except Exception as e:
         logger.error(f"Resource monitor error: {e}")
 
+@tasks.loop(seconds=HOST_SAMPLE_INTERVAL)
+@timed_task('host_metrics', HOST_SAMPLE_INTERVAL)
+async def host_metrics_task():
+    """Sample host resources into the dashboard ring buffer"""
+    try:
+        await host_metrics.collect()
+    except Exception as e:
+        logger.error(f"Host metrics error: {e}")
+
+@tasks.loop(seconds=NODE_HEALTH_INTERVAL)
+@timed_task('node_health', NODE_HEALTH_INTERVAL)
+async def node_health_task():
+    """Refresh every node's live capacity and reachability for placement"""
+    try:
+        await asyncio.gather(*(node.refresh() for node in nodes))
+    except Exception as e:
+        logger.error(f"Node health error: {e}")
+
+@tasks.loop(seconds=60)
+@timed_task('usage_rollups', 60)
+async def usage_rollup_task():
+    """Compact usage samples into rollup tiers and expire old history"""
+    try:
+        started = time.monotonic()
+        written = await db.run(run_usage_rollups, label='usage_rollups')
+        if any(written.values()):
+            summary = ', '.join(f"{tier}: {count}" for tier, count in written.items())
+            logger.info(f"🗜️ Usage rollups written ({summary}) in {time.monotonic() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"Usage rollup error: {e}")
+
+@tasks.loop(seconds=WARM_POOL_REFILL_INTERVAL)
+@timed_task('warm_pool', WARM_POOL_REFILL_INTERVAL)
+async def warm_pool_task():
+    """Top up the warm pool one container at a time, yielding to live deploys"""
+    try:
+        if warm_pool.size <= 0:
+            return
+        if not warm_pool.discovered:
+            await warm_pool.discover()
+        if time.monotonic() - warm_pool.images_refreshed_at > IMAGE_REFRESH_HOURS * 3600 \
+                or not warm_pool.images_refreshed_at:
+            await warm_pool.refresh_images()
+        while warm_pool.active_deploys == 0 and not job_scheduler.running and await warm_pool.refill_one():
+            await asyncio.sleep(1)
+    except Exception as e:
+        logger.error(f"Warm pool error: {e}")
+
+@tasks.loop(time=datetime.strptime(BACKUP_TIME, '%H:%M').time())
+@timed_task('nightly_backups', 86400)
+async def nightly_backup_task():
+    """Back up every VPS, then expire backups past BACKUP_RETENTION_DAYS"""
+    try:
+        started = time.monotonic()
+        results = await backups.run([vps['container_name'] for vps in vps_registry])
+        done = [result for result in results.values() if not isinstance(result, Exception)]
+        failed = [name for name, result in results.items() if isinstance(result, Exception)]
+        pruned = await backups.prune(BACKUP_RETENTION_DAYS)
+        logical = sum(record['size_bytes'] for record in done)
+        stored = sum(record['stored_bytes'] for record in done)
+        await send_log_to_discord("💾 Nightly Backups", f"Backed up {len(done)} of {len(results)} containers",
+                                  'warning' if failed else 'success', {
+            "Data": f"{logical / 1024 ** 3:.1f}GB",
+            "Written": f"{stored / 1024 ** 3:.2f}GB",
+            "Duration": f"{(time.monotonic() - started) / 60:.1f} min",
+            "Expired": f"{pruned['backups']} backups, {pruned['freed_mb']}MB",
+            "Failed": ", ".join(failed[:10]) or "None",
+        })
+    except Exception as e:
+        logger.error(f"Nightly backup error: {e}")
+
 @tasks.loop(hours=1)
+@timed_task('update_statistics', 3600)
 async def update_statistics():
     """Update bot statistics hourly"""
     try:
-        total_vps = sum(len(vps_list) for vps_list in vps_data.values())
-        running_vps = sum(1 for vps_list in vps_data.values() 
-                         for vps in vps_list if vps['status'] == 'running')
+        total_vps = len(vps_registry)
+        running_vps = vps_registry.count('running')
         
         await bot.change_presence(
             activity=discord.Activity(
@@ -587,8 +4764,11 @@ async def show_config(ctx):
     
     # Admin Configuration
     admin_count = len(admin_data.get('admins', []))
-    main_admin = await bot.fetch_user(MAIN_ADMIN_ID)
-    admin_info = f"```yaml\nMain Admin: {main_admin.name}\nTotal Admins: {admin_count + 1}\nLog Channel: {'Configured' if LOG_CHANNEL_ID != 0 else 'Not Set'}```"
+    try:
+        main_admin = await user_resolver.resolve(MAIN_ADMIN_ID)
+    except discord.HTTPException:
+        main_admin = None
+    admin_info = f"```yaml\nMain Admin: {main_admin.name if main_admin else MAIN_ADMIN_ID}\nTotal Admins: {admin_count + 1}\nLog Channel: {'Configured' if LOG_CHANNEL_ID != 0 else 'Not Set'}```"
     add_field(embed, "👑 Admin Configuration", admin_info, False)
     
     # Resource Settings
@@ -596,28 +4776,51 @@ async def show_config(ctx):
     add_field(embed, "📊 Resource Limits", resource_info, True)
     
     # VPS Defaults
-    default_ram = get_setting('default_ram', '2')
-    default_cpu = get_setting('default_cpu', '2')
-    default_storage = get_setting('default_storage', '20')
-    max_vps = get_setting('max_vps_per_user', '5')
+    default_ram = settings.get('default_ram', 2)
+    default_cpu = settings.get('default_cpu', 2)
+    default_storage = settings.get('default_storage', 20)
+    max_vps = settings.get('max_vps_per_user', 5)
     
     vps_info = f"```yaml\nDefault RAM: {default_ram}GB\nDefault CPU: {default_cpu} cores\nDefault Storage: {default_storage}GB\nMax VPS/User: {max_vps}```"
     add_field(embed, "☁️ VPS Defaults", vps_info, True)
     
     await ctx.send(embed=embed)
 
+@bot.command(name='setconfig', aliases=['setsetting'])
+@is_admin()
+async def set_config(ctx, key: str, value: str):
+    """Change a bot setting; takes effect immediately"""
+    key = key.lower()
+    if key not in SETTING_TYPES:
+        embed = create_embed("Unknown Setting",
+                             f"❌ `{key}` is not a setting.\n\nAvailable: {', '.join(f'`{k}`' for k in SETTING_TYPES)}",
+                             'error')
+        await ctx.send(embed=embed)
+        return
+    try:
+        old_value = settings.get_raw(key)
+        settings.set(key, value)
+    except ValueError as e:
+        await ctx.send(embed=create_embed("Invalid Value", f"❌ {e}", 'error'))
+        return
+
+    log_audit(str(ctx.author.id), 'set_setting', key, f"{old_value} -> {settings.get_raw(key)}")
+    await send_log_to_discord("⚙️ Setting Changed", f"{ctx.author.mention} updated `{key}`", 'info',
+                              {"Old": old_value, "New": settings.get_raw(key)})
+    embed = create_embed("Setting Updated", f"✅ `{key}` is now `{settings.get_raw(key)}`", 'success')
+    await ctx.send(embed=embed)
+
 @bot.command(name='dashboard', aliases=['stats', 'status'])
 async def dashboard(ctx):
     """Show XeloraCloud dashboard"""
-    total_vps = sum(len(vps_list) for vps_list in vps_data.values())
-    running_vps = sum(1 for vps_list in vps_data.values() 
-                     for vps in vps_list if vps['status'] == 'running')
-    total_users = len(vps_data)
+    total_vps = len(vps_registry)
+    running_vps = vps_registry.count('running')
+    total_users = vps_registry.user_count
     
-    # System stats
-    cpu_percent = psutil.cpu_percent(interval=1)
-    ram = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
+    # System stats come from the background sampler so the command never blocks
+    if host_metrics.latest is None:
+        await host_metrics.collect()
+    latest = host_metrics.latest
     
     embed = create_embed("📊 XeloraCloud Dashboard", color='primary')
     
@@ -626,9 +4829,15 @@ async def dashboard(ctx):
     add_field(embed, "☁️ VPS Statistics", vps_stats, False)
     
     # System Stats
-    sys_stats = f"```yaml\nCPU: {cpu_percent}%\nRAM: {ram.percent}%\nDisk: {disk.percent}%```"
+    sys_stats = (f"```yaml\nCPU: {latest['cpu']:.1f}%\nRAM: {latest['ram']:.1f}%\nDisk: {latest['disk']:.1f}%\n"
+                 f"Load: {latest['load']:.2f}\nNet In: {latest['rx_rate'] / 1024 ** 2:.2f} MB/s\n"
+                 f"Net Out: {latest['tx_rate'] / 1024 ** 2:.2f} MB/s```")
     add_field(embed, "💻 System Resources", sys_stats, True)
     
+    trends = (f"```yaml\nCPU %: {host_metrics.trend('cpu')}\nRAM %: {host_metrics.trend('ram')}\n"
+              f"Load: {host_metrics.trend('load')}```")
+    add_field(embed, "📉 Trends (1m / 5m / 15m)", trends, True)
+    
     # Bot Stats
     bot_stats = f"```yaml\nServers: {len(bot.guilds)}\nLatency: {round(bot.latency * 1000)}ms\nUptime: {get_bot_uptime()}```"
     add_field(embed, "🤖 Bot Status", bot_stats, True)
@@ -641,23 +4850,25 @@ async def list_admins(ctx):
     """List all administrators"""
     embed = create_embed("👑 Administrator List", color='premium')
     
+    admins = admin_data.get("admins", [])
+    users = await user_resolver.resolve_many([MAIN_ADMIN_ID, *admins])
+    
     # Main Admin
-    try:
-        main_admin = await bot.fetch_user(MAIN_ADMIN_ID)
+    main_admin = users.get(MAIN_ADMIN_ID)
+    if main_admin:
         main_info = f"**{main_admin.name}** ({main_admin.mention})\n`ID: {MAIN_ADMIN_ID}`\n*Main Administrator*"
         add_field(embed, "👑 Main Admin", main_info, False)
-    except:
+    else:
         add_field(embed, "👑 Main Admin", f"`ID: {MAIN_ADMIN_ID}`", False)
     
     # Additional Admins
-    admins = admin_data.get("admins", [])
     if admins:
         admin_list = []
         for i, admin_id in enumerate(admins, 1):
-            try:
-                admin_user = await bot.fetch_user(int(admin_id))
+            admin_user = users.get(int(admin_id))
+            if admin_user:
                 admin_list.append(f"**{i}.** {admin_user.name} ({admin_user.mention})\n   `ID: {admin_id}`")
-            except:
+            else:
                 admin_list.append(f"**{i}.** Unknown User\n   `ID: {admin_id}`")
         
         add_field(embed, f"🛡️ Additional Admins ({len(admins)})", "\n\n".join(admin_list), False)
@@ -665,12 +4876,418 @@ async def list_admins(ctx):
         add_field(embed, "🛡️ Additional Admins", "*No additional admins configured*", False)
     
     # Statistics
-    total_vps = sum(len(vps_list) for vps_list in vps_data.values())
-    stats = f"```yaml\nTotal Admins: {len(admins) + 1}\nTotal VPS: {total_vps}\nTotal Users: {len(vps_data)}```"
+    stats = f"```yaml\nTotal Admins: {len(admins) + 1}\nTotal VPS: {len(vps_registry)}\nTotal Users: {vps_registry.user_count}```"
     add_field(embed, "📊 Statistics", stats, False)
     
     await ctx.send(embed=embed)
 
+@bot.command(name='perf', aliases=['internals'])
+@is_admin()
+async def show_perf(ctx):
+    """Show internal performance counters"""
+    embed = create_embed("⏱️ Performance Internals", color='info')
+
+    last_run = monitor_stats['last_run'].strftime('%H:%M:%S') if monitor_stats['last_run'] else 'Never'
+    monitor_info = (f"```yaml\nLast Run: {last_run}\nCycle Time: {monitor_stats['last_duration']:.2f}s\n"
+                    f"Sampled: {monitor_stats['last_sampled']}\nSkipped: {monitor_stats['last_skipped']}\n"
+                    f"Overruns: {monitor_stats['overruns']}```")
+    add_field(embed, "📈 Resource Monitor", monitor_info, True)
+
+    age = fleet_snapshot.age
+    cache_info = (f"```yaml\nContainers: {len(fleet_snapshot)}\n"
+                  f"Age: {'Empty' if age == float('inf') else f'{age:.1f}s'}\n"
+                  f"TTL: {fleet_snapshot.ttl:.0f}s\nRefreshes: {fleet_snapshot.refreshes}```")
+    add_field(embed, "🗂️ Status Cache", cache_info, True)
+
+    slowest = sorted(db.query_stats.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:5]
+    db_lines = [f"{label[:28]}: {stat['count']}x avg {stat['total_ms'] / stat['count']:.1f}ms "
+                f"max {stat['max_ms']:.1f}ms" for label, stat in slowest]
+    db_info = f"```yaml\nWrite Queue: {db.pending}\n" + "\n".join(db_lines) + "```"
+    add_field(embed, "🗄️ Database (by total time)", db_info, False)
+
+    log_stats = log_sender.stats()
+    log_info = (f"```yaml\nQueued: {log_stats['queued']}\nMessages: {log_stats['sent_messages']}\n"
+                f"Embeds: {log_stats['sent_embeds']}\nDropped: {log_stats['dropped']}\n"
+                f"Failed: {log_stats['failed']}\n429s: {log_stats['rate_limited']}```")
+    add_field(embed, "📨 Log Channel", log_info, True)
+
+    listeners = [node.events for node in nodes]
+    last_at = max((listener.last_event_at for listener in listeners if listener.last_event_at), default=None)
+    last_event = last_at.strftime('%H:%M:%S') if last_at else 'Never'
+    events_info = (f"```yaml\nConnected: {sum(listener.connected for listener in listeners)}/{len(listeners)} nodes\n"
+                   f"Events: {sum(listener.events for listener in listeners)}\nLast Event: {last_event}\n"
+                   f"Reconnects: {sum(listener.reconnects for listener in listeners)}```")
+    add_field(embed, "📡 LXD Events", events_info, True)
+
+    pool_stats = warm_pool.stats()
+    pool_info = (f"```yaml\nReady: {sum(pool_stats['ready'].values())}\nHits: {pool_stats['hits']}\n"
+                 f"Misses: {pool_stats['misses']}\nHit Rate: {pool_stats['hit_rate']:.0f}%\n"
+                 f"Errors: {pool_stats['errors']}```")
+    add_field(embed, "♨️ Warm Pool", pool_info, True)
+
+    jobs_info = (f"```yaml\nRunning: {len(job_scheduler.running)}\nQueued: {len(job_scheduler.queued)}\n"
+                 f"Completed: {job_scheduler.completed}\nFailed: {job_scheduler.failed}```")
+    add_field(embed, "📋 Jobs", jobs_info, True)
+
+    last_check = auto_suspender.last_run.strftime('%H:%M:%S') if auto_suspender.last_run else 'Never'
+    suspend_info = (f"```yaml\nLast Run: {last_check}\nEvaluated: {auto_suspender.last_evaluated}\n"
+                    f"Eval Time: {auto_suspender.last_duration * 1000:.1f}ms\nSuspended: {auto_suspender.suspended}```")
+    add_field(embed, "⛔ Auto-Suspend", suspend_info, True)
+
+    def timing(value: Optional[float]) -> str:
+        return f"{value:.2f}s" if value is not None else 'Pending'
+
+    startup_info = (f"```yaml\nGateway: {timing(startup.gateway_ready)}\nState: {timing(startup.state_loaded)}\n"
+                    f"Commands: {timing(startup.commands_ready)}\nFirst Cmd: {timing(startup.first_command)}\n"
+                    f"Services: {timing(startup.services_started)}\nConnects: {startup.connects}```")
+    add_field(embed, "🚀 Startup", startup_info, True)
+
+    last_pass = reconciler.last_run.strftime('%H:%M:%S') if reconciler.last_run else 'Never'
+    reconcile_info = (f"```yaml\nLast Run: {last_pass}\nTook: {reconciler.last_duration:.2f}s\n"
+                      f"Fixed: {reconciler.fixed}\nOrphaned: {len(reconciler.orphans)}\n"
+                      f"Missing: {len(reconciler.missing)}```")
+    add_field(embed, "🧭 Reconcile", reconcile_info, True)
+
+    await ctx.send(embed=embed)
+
+def parse_time_spec(value: str) -> datetime:
+    """Parse '30m', '24h', '7d' (relative to now) or an ISO date/time, as naive local time"""
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+    if not value:
+        raise ValueError("Empty time")
+    if value[:-1].isdigit() and value[-1].lower() in units:
+        return datetime.now() - timedelta(**{units[value[-1].lower()]: int(value[:-1])})
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        # Audit timestamps are stored in naive local time
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+@bot.command(name='auditlog', aliases=['audit'])
+@is_admin()
+async def show_audit_log(ctx, *filters):
+    """Search the audit log: user:<id> action:<name> target:<name> since:<7d> until:<1h> before:<id>"""
+    options = {}
+    try:
+        for item in filters:
+            key, _, value = item.partition(':')
+            key = key.lower()
+            if key == 'user':
+                options['user_id'] = value.strip('<@!>')
+            elif key in ('action', 'target'):
+                options[key] = value
+            elif key in ('since', 'until'):
+                options[key] = parse_time_spec(value)
+            elif key == 'before':
+                options['before_id'] = int(value)
+            elif key == 'limit':
+                options['limit'] = max(1, min(int(value), 50))
+            else:
+                raise ValueError(item)
+    except ValueError:
+        raise commands.BadArgument("Invalid audit filter")
+
+    # Make sure events still sitting in the buffer are searchable
+    pending = audit_log.flush()
+    if pending:
+        await asyncio.wrap_future(pending)
+    rows = query_audit_log(**options)
+
+    embed = create_embed("📜 Audit Log", color='info')
+    if not rows:
+        embed.description = "*No matching audit events*"
+        await ctx.send(embed=embed)
+        return
+
+    lines = []
+    for row in rows:
+        mark = '✅' if row['success'] else '❌'
+        target = f" → `{row['target']}`" if row['target'] else ''
+        lines.append(f"{mark} `#{row['id']}` {row['timestamp'][:19].replace('T', ' ')} "
+                     f"<@{row['user_id']}> **{row['action']}**{target}")
+    embed.description = "\n".join(lines)[:4000]
+    if len(rows) == options.get('limit', 25):
+        next_filters = [f for f in filters if not f.startswith('before:')] + [f"before:{rows[-1]['id']}"]
+        add_field(embed, "Next Page", f"`{PREFIX}auditlog {' '.join(next_filters)}`", False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='deploy', aliases=['create'])
+@is_admin()
+async def deploy_vps(ctx, user: discord.Member, os_version: str = OS_OPTIONS[0]['value'], ram: int = None,
+                     cpu: int = None, storage: int = None):
+    """Queue a VPS deployment for a user"""
+    if os_version not in [option['value'] for option in OS_OPTIONS]:
+        raise commands.BadArgument(f"Unknown OS: {os_version}")
+    ram = ram or settings.get('default_ram', 2)
+    cpu = cpu or settings.get('default_cpu', 2)
+    storage = storage or settings.get('default_storage', 20)
+    container_name = f"xc-{user.id}-{uuid.uuid4().hex[:8]}"
+
+    embed = create_embed("⚙️ Deployment Queued", f"`{container_name}` for {user.mention}", 'info')
+    message = await ctx.send(embed=embed)
+    job = await job_scheduler.submit('launch', str(user.id), {
+        'container_name': container_name, 'os_version': os_version,
+        'ram': ram, 'cpu': cpu, 'storage': storage,
+    }, priority=1 if ctx.author.id == MAIN_ADMIN_ID else 5, message=message)
+    await job.progress(f"📋 Queued at position {len(job_scheduler.queued)}", final=True)
+
+@bot.command(name='delete', aliases=['destroy'])
+@is_admin()
+async def delete_vps(ctx, container_name: str):
+    """Queue the deletion of a VPS and its container"""
+    vps = vps_registry.get(container_name)
+    if vps is None:
+        await ctx.send(embed=create_embed("VPS Not Found", f"❌ No VPS named `{container_name}`", 'error'))
+        return
+    message = await ctx.send(embed=create_embed("🗑️ Deletion Queued", f"`{container_name}`", 'warning'))
+    job = await job_scheduler.submit('delete', vps['user_id'], {'container_name': container_name},
+                                     priority=1 if ctx.author.id == MAIN_ADMIN_ID else 5, message=message)
+    await job.progress(f"📋 Queued at position {len(job_scheduler.queued)}", final=True)
+
+@bot.command(name='jobs', aliases=['queue'])
+@is_admin()
+async def list_jobs(ctx):
+    """Show running and queued jobs"""
+    embed = create_embed("📋 Job Queue", color='info')
+    running = [f"`#{job.id}` **{job.kind}** <@{job.user_id}> — {job.progress_text or 'starting'}"
+               for job in job_scheduler.running.values()]
+    queued = [f"`#{job.id}` **{job.kind}** <@{job.user_id}> (priority {job.priority})"
+              for job in job_scheduler.queued[:15]]
+    add_field(embed, f"⚙️ Running ({len(running)})", "\n".join(running) or "*Idle*", False)
+    add_field(embed, f"⏳ Queued ({len(job_scheduler.queued)})", "\n".join(queued) or "*Empty*", False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='canceljob')
+@is_admin()
+async def cancel_job(ctx, job_id: int):
+    """Cancel a queued or running job"""
+    if await job_scheduler.cancel(job_id):
+        log_audit(str(ctx.author.id), 'cancel_job', str(job_id))
+        embed = create_embed("Job Cancelled", f"✅ Job `#{job_id}` was cancelled", 'success')
+    else:
+        embed = create_embed("Job Not Found", f"❌ Job `#{job_id}` is not queued or running", 'error')
+    await ctx.send(embed=embed)
+
+def can_manage_vps(ctx, vps: Optional[VPSRecord]) -> bool:
+    user_id = str(ctx.author.id)
+    if vps is None:
+        return False
+    return vps['user_id'] == user_id or user_id == str(MAIN_ADMIN_ID) or user_id in admin_data.get("admins", [])
+
+@bot.command(name='forward', aliases=['portforward'])
+async def add_port_forward(ctx, container_name: str, vps_port: int, protocol: str = 'both'):
+    """Forward a free host port to a port on your VPS (tcp, udp or both)"""
+    vps = vps_registry.get(container_name)
+    if not can_manage_vps(ctx, vps):
+        await ctx.send(embed=create_embed("VPS Not Found", f"❌ You don't have a VPS named `{container_name}`", 'error'))
+        return
+    try:
+        forward = await port_forwards.add(vps['user_id'], container_name, vps_port, protocol)
+    except ValueError as e:
+        await ctx.send(embed=create_embed("Port Forward Failed", f"❌ {e}", 'error'))
+        return
+    except LXDError as e:
+        await ctx.send(embed=create_embed("Port Forward Failed",
+                                          f"❌ Couldn't apply the forward to `{container_name}`: {e}", 'error'))
+        return
+
+    log_audit(str(ctx.author.id), 'port_forward', container_name, f"{forward['host_port']} -> {vps_port}/{protocol}")
+    embed = create_embed("Port Forward Created",
+                         f"✅ `{nodes.node_of(container_name).public_ip}:{forward['host_port']}` → "
+                         f"`{container_name}:{vps_port}` "
+                         f"({forward['protocol']})", 'success')
+    await ctx.send(embed=embed)
+
+@bot.command(name='unforward', aliases=['removeforward'])
+async def remove_port_forward(ctx, host_port: int):
+    """Remove one of your port forwards"""
+    forward = port_forwards.by_port.get(host_port)
+    if forward is None or (forward['user_id'] != str(ctx.author.id)
+                           and not can_manage_vps(ctx, vps_registry.get(forward['vps_container']))):
+        await ctx.send(embed=create_embed("Port Forward Not Found", f"❌ No port forward on host port `{host_port}`",
+                                          'error'))
+        return
+    await port_forwards.remove(host_port)
+    log_audit(str(ctx.author.id), 'port_unforward', forward['vps_container'], str(host_port))
+    embed = create_embed("Port Forward Removed", f"✅ Host port `{host_port}` is free again", 'success')
+    await ctx.send(embed=embed)
+
+@bot.command(name='ports', aliases=['forwards'])
+async def list_port_forwards(ctx, user: discord.Member = None):
+    """List your port forwards (admins can pass a user)"""
+    target = user or ctx.author
+    if target != ctx.author and str(ctx.author.id) != str(MAIN_ADMIN_ID) \
+            and str(ctx.author.id) not in admin_data.get("admins", []):
+        raise commands.CheckFailure("⛔ You need admin permissions to view other users' ports!")
+    user_id = str(target.id)
+    forwards = sorted((forward for forward in port_forwards.by_port.values() if forward['user_id'] == user_id),
+                      key=lambda forward: forward['host_port'])
+    embed = create_embed(f"🔌 Port Forwards • {target.name}", color='info')
+    lines = [f"`{forward['host_port']}` → `{forward['vps_container']}:{forward['vps_port']}` ({forward['protocol']})"
+             for forward in forwards[:30]]
+    embed.description = "\n".join(lines) or "*No port forwards*"
+    add_field(embed, "📊 Quota", f"{len(forwards)} / {port_forwards.quota(user_id)}", True)
+    await ctx.send(embed=embed)
+
+@bot.command(name='portquota')
+@is_admin()
+async def set_port_quota(ctx, user: discord.Member, quota: int):
+    """Set how many port forwards a user may create"""
+    if quota < 0:
+        raise commands.BadArgument("Quota can't be negative")
+    await asyncio.wrap_future(port_forwards.set_quota(str(user.id), quota))
+    log_audit(str(ctx.author.id), 'port_quota', str(user.id), str(quota))
+    embed = create_embed("Port Quota Updated", f"✅ {user.mention} can now create `{quota}` port forwards", 'success')
+    await ctx.send(embed=embed)
+
+@bot.command(name='resyncports')
+@is_admin()
+async def resync_port_forwards(ctx):
+    """Recreate every port forward's proxy devices (e.g. after a host reboot)"""
+    result = await port_forwards.resync()
+    embed = create_embed("Port Forwards Resynced",
+                         f"✅ Checked `{result['containers']}` containers, updated `{result['updated']}`"
+                         + (f", `{result['failed']}` failed" if result['failed'] else ""),
+                         'warning' if result['failed'] else 'success')
+    await ctx.send(embed=embed)
+
+@bot.command(name='backup')
+async def backup_vps(ctx, container_name: str):
+    """Queue a deduplicated backup of your VPS"""
+    vps = vps_registry.get(container_name)
+    if not can_manage_vps(ctx, vps):
+        await ctx.send(embed=create_embed("VPS Not Found", f"❌ You don't have a VPS named `{container_name}`", 'error'))
+        return
+    message = await ctx.send(embed=create_embed("💾 Backup Queued", f"`{container_name}`", 'info'))
+    await job_scheduler.submit('export', str(ctx.author.id), {'container_name': container_name}, message=message)
+
+@bot.command(name='backups')
+async def list_backups(ctx, container_name: str):
+    """List the backups of your VPS"""
+    if not can_manage_vps(ctx, vps_registry.get(container_name)):
+        await ctx.send(embed=create_embed("VPS Not Found", f"❌ You don't have a VPS named `{container_name}`", 'error'))
+        return
+    rows = db.read('SELECT * FROM backups WHERE container_name = ? ORDER BY id DESC LIMIT 15', (container_name,),
+                   label='list_backups')
+    embed = create_embed(f"💾 Backups • {container_name}", color='info')
+    lines = []
+    for row in rows:
+        stored = f", {row['stored_bytes'] / 1024 ** 2:.1f}MB new" if row['stored_bytes'] is not None else ''
+        lines.append(f"`#{row['id']}` {row['created_at'][:16].replace('T', ' ')} • {row['size_mb']}MB{stored}")
+    embed.description = "\n".join(lines) or "*No backups yet*"
+    await ctx.send(embed=embed)
+
+@bot.command(name='restore')
+@is_admin()
+async def restore_backup(ctx, backup_id: int, new_name: str = None):
+    """Restore a backup as a new container (defaults to the original name if it no longer exists)"""
+    row = db.read_one('SELECT container_name FROM backups WHERE id = ?', (backup_id,), label='get_backup')
+    if row is None:
+        await ctx.send(embed=create_embed("Backup Not Found", f"❌ Backup `#{backup_id}` does not exist", 'error'))
+        return
+    target = new_name or row['container_name']
+    if target in vps_registry or target in await fleet_snapshot.get():
+        await ctx.send(embed=create_embed("Name In Use", f"❌ `{target}` already exists; pass a new name", 'error'))
+        return
+    message = await ctx.send(embed=create_embed("♻️ Restore Queued", f"Backup `#{backup_id}` → `{target}`", 'info'))
+    await job_scheduler.submit('restore', str(ctx.author.id), {'backup_id': backup_id, 'target': target},
+                               priority=1, message=message)
+
+@bot.command(name='suspendcheck', aliases=['overuse'])
+@is_admin()
+async def suspend_check(ctx):
+    """Show which VPSes auto-suspend would stop right now, without stopping them"""
+    found = await auto_suspender.find()
+    enabled = settings.get('auto_suspend_enabled', False)
+    embed = create_embed("⛔ Sustained Overuse",
+                         f"Evaluated `{auto_suspender.last_evaluated}` containers in "
+                         f"`{auto_suspender.last_duration * 1000:.1f}ms` • auto-suspend is "
+                         f"**{'on' if enabled else 'off'}**", 'warning' if found else 'success')
+    lines = [f"`{vps['container_name']}` <@{vps['user_id']}> • " +
+             ', '.join(f"{metric.upper()} {b['ewma']}% ({b['samples']}/{auto_suspender.samples})"
+                       for metric, b in breaches.items())
+             for vps, breaches in found[:20]]
+    add_field(embed, f"Over Threshold ({len(found)})", "\n".join(lines) or "None", False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='reconcile', aliases=['drift'])
+@is_admin()
+async def reconcile_fleet(ctx):
+    """Compare the DB with LXD: fix drifted statuses, list orphaned and missing containers"""
+    result = await reconciler.run()
+    embed = create_embed("🧭 Reconcile", f"Fixed `{result['fixed']}` statuses in "
+                                        f"`{reconciler.last_duration:.2f}s`",
+                         'warning' if result['orphans'] or result['missing'] else 'success')
+    add_field(embed, f"Orphaned Containers ({result['orphans']})",
+              "\n".join(f"`{name}` on {node}" for name, node in sorted(reconciler.orphans.items())[:20]) or "None",
+              False)
+    add_field(embed, f"Missing Containers ({result['missing']})",
+              "\n".join(f"`{name}` on {node}" for name, node in sorted(reconciler.missing.items())[:20]) or "None",
+              False)
+    if reconciler.skipped_nodes:
+        add_field(embed, "Skipped (unreachable)", ', '.join(reconciler.skipped_nodes), False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='nodes')
+@is_admin()
+async def list_nodes(ctx):
+    """Show every LXD node with its capacity, allocation and health"""
+    embed = create_embed(f"🖥️ Nodes ({len(nodes)})", color='info')
+    for node in nodes:
+        capacity, allocated = node.capacity(), node.allocated()
+        usage = "\n".join(f"{label}: {used:g}/{total:g}{unit}" if total > 0 else f"{label}: {used:g}{unit}"
+                          for label, unit, total, used in zip(('RAM', 'CPU', 'Disk'), ('GB', '', 'GB'),
+                                                              capacity, allocated))
+        state = 'online' if node.online else f"offline ({node.error})"
+        add_field(embed, f"{'🟢' if node.online else '🔴'} {node.name}{'' if node.enabled else ' (no new VPS)'}",
+                  f"```yaml\nEndpoint: {node.endpoint}\nIP: {node.public_ip}\nPool: {node.storage_pool}\n"
+                  f"State: {state}\nVPS: {len(vps_registry.on_node(node.name))}\n{usage}```", True)
+    await ctx.send(embed=embed)
+
+@bot.command(name='addnode')
+@is_admin()
+async def add_node(ctx, name: str, endpoint: str, storage_pool: str = 'default', public_ip: str = None,
+                   ram_gb: float = 0, cpu_cores: float = 0, storage_gb: float = 0):
+    """Add an LXD host (https://host:8443 or a unix socket); zero capacity means use its live totals"""
+    try:
+        node = await nodes.add(name, endpoint, storage_pool, public_ip, ram_gb, cpu_cores, storage_gb)
+    except ValueError as e:
+        await ctx.send(embed=create_embed("Node Not Added", f"❌ {e}", 'error'))
+        return
+    log_audit(str(ctx.author.id), 'add_node', name, endpoint)
+    ram, cpu, storage = node.capacity()
+    embed = create_embed("Node Added", f"✅ `{name}` is online with {ram:g}GB RAM, {cpu:g} CPU "
+                                       f"(overcommitted) and {storage:g}GB disk", 'success')
+    if node.client.remote:
+        add_field(embed, "🔐 Pinned Certificate", f"`{cert_fingerprint(node.client.server_cert)}`\n"
+                                                 f"Check it matches `lxc info` on the node", False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='removenode')
+@is_admin()
+async def remove_node(ctx, name: str):
+    """Remove a node that no longer hosts any VPS"""
+    try:
+        await nodes.remove(name)
+    except ValueError as e:
+        await ctx.send(embed=create_embed("Node Not Removed", f"❌ {e}", 'error'))
+        return
+    log_audit(str(ctx.author.id), 'remove_node', name)
+    await ctx.send(embed=create_embed("Node Removed", f"✅ `{name}` was removed", 'success'))
+
+@bot.command(name='nodeenable')
+@is_admin()
+async def enable_node(ctx, name: str, enabled: bool):
+    """Allow (true) or stop (false) new VPSes being placed on a node"""
+    try:
+        nodes.set_enabled(name, enabled)
+    except ValueError as e:
+        await ctx.send(embed=create_embed("Node Not Found", f"❌ {e}", 'error'))
+        return
+    log_audit(str(ctx.author.id), 'node_enable', name, str(enabled))
+    await ctx.send(embed=create_embed("Node Updated", f"✅ New VPSes {'can' if enabled else 'will not'} be placed "
+                                                      f"on `{name}`", 'success'))
+
 # This is just a portion of the enhanced bot - I'll create the install script next!
 # The full bot would be too long for one artifact, but this shows the enhanced structure
 
@@ -319,6 +319,8 @@ create_requirements() {
 discord.py>=2.3.0
 aiohttp>=3.9.0
 psutil>=5.9.0
+zstandard>=0.22.0
+numpy>=1.24.0
 python-dotenv>=1.0.0
 colorama>=0.4.6
 tabulate>=0.9.0
@@ -776,6 +778,8 @@ install_python_packages() {
         discord.py \
         aiohttp \
         psutil \
+        zstandard \
+        numpy \
         python-dotenv \
         colorama \
         tabulate